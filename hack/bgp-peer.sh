@@ -0,0 +1,65 @@
+#!/bin/bash -e
+# Local BGP peer stand-in for testing the Cilium BGP control plane on kind.
+#
+# Starts an FRR container on the kind docker network which accepts sessions
+# from every node and installs ECMP routes for advertised LoadBalancer IPs.
+#
+# Usage:
+#   ./hack/bgp-peer.sh [start|status|stop]
+#
+# Point the stack at the printed address, e.g.:
+#   pulumi config set --path 'cilium.bgp.enabled' true
+#   pulumi config set --path 'cilium.bgp.peers[0].address' <peer-address>
+#   pulumi config set --path 'cilium.bgp.peers[0].asn' 64500
+
+NAME="${BGP_PEER_NAME:-kargo-bgp-peer}"
+NETWORK="${BGP_PEER_NETWORK:-kind}"
+PEER_ASN="${BGP_PEER_ASN:-64500}"
+CILIUM_ASN="${BGP_CILIUM_ASN:-64512}"
+IMAGE="${BGP_PEER_IMAGE:-quay.io/frrouting/frr:9.1.0}"
+
+start() {
+  local subnet
+  subnet="$(docker network inspect "${NETWORK}" -f '{{range .IPAM.Config}}{{if .Gateway}}{{.Subnet}} {{end}}{{end}}' | awk '{print $1}')"
+
+  local conf_dir
+  conf_dir="$(mktemp -d)"
+  echo "bgpd=yes" > "${conf_dir}/daemons"
+  cat > "${conf_dir}/frr.conf" <<FRR
+frr defaults datacenter
+router bgp ${PEER_ASN}
+ no bgp ebgp-requires-policy
+ bgp bestpath as-path multipath-relax
+ neighbor cilium peer-group
+ neighbor cilium remote-as ${CILIUM_ASN}
+ bgp listen range ${subnet} peer-group cilium
+ address-family ipv4 unicast
+  maximum-paths 16
+ exit-address-family
+FRR
+
+  docker run -d --rm --privileged \
+    --name "${NAME}" \
+    --network "${NETWORK}" \
+    -v "${conf_dir}/daemons:/etc/frr/daemons:ro" \
+    -v "${conf_dir}/frr.conf:/etc/frr/frr.conf:ro" \
+    "${IMAGE}" >/dev/null
+
+  echo "BGP peer ${NAME} (ASN ${PEER_ASN}) listening for ${subnet}"
+  echo "Peer address: $(docker inspect "${NAME}" -f "{{(index .NetworkSettings.Networks \"${NETWORK}\").IPAddress}}")"
+}
+
+status() {
+  docker exec "${NAME}" vtysh -c "show bgp summary" -c "show ip route bgp"
+}
+
+stop() {
+  docker rm -f "${NAME}" >/dev/null && echo "Stopped ${NAME}"
+}
+
+case "${1:-start}" in
+  start) start ;;
+  status) status ;;
+  stop) stop ;;
+  *) echo "Usage: $0 [start|status|stop]" && exit 1 ;;
+esac
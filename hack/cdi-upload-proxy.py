@@ -0,0 +1,74 @@
+#!/usr/bin/env python3
+"""
+Local stand-in for the CDI upload proxy, for testing image uploads without a cluster.
+
+Accepts POST /v1beta1/upload with a bearer token, writes each body to the
+output directory and logs its size, sha256 and throughput.
+
+Usage:
+    ./hack/cdi-upload-proxy.py --port 8443 --token test --dir /tmp/uploads
+    cd pulumi && python -m src.containerized_data_importer.upload --url http://127.0.0.1:8443 --token test image.raw
+"""
+import os
+import time
+import hashlib
+import argparse
+import itertools
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+UPLOAD_PATHS = ("/v1beta1/upload", "/v1beta1/upload-async")
+counter = itertools.count(1)
+
+
+class UploadHandler(BaseHTTPRequestHandler):
+    token = None
+    directory = "."
+
+    def do_POST(self):
+        if self.path not in UPLOAD_PATHS:
+            self.send_error(404)
+            return
+        if self.token and self.headers.get("Authorization") != f"Bearer {self.token}":
+            self.send_error(401)
+            return
+
+        remaining = int(self.headers.get("Content-Length", 0))
+        path = os.path.join(self.directory, f"upload-{next(counter)}.img")
+        digest = hashlib.sha256()
+        started = time.monotonic()
+        with open(path, "wb") as f:
+            while remaining > 0:
+                data = self.rfile.read(min(remaining, 4 * 1024 * 1024))
+                if not data:
+                    break
+                f.write(data)
+                digest.update(data)
+                remaining -= len(data)
+
+        if remaining:
+            self.send_error(400, "Short upload")
+            return
+
+        size = os.path.getsize(path)
+        elapsed = max(time.monotonic() - started, 1e-6)
+        self.log_message(f"{path}: {size} bytes sha256={digest.hexdigest()} {size / 1048576 / elapsed:.1f} MiB/s")
+        self.send_response(200)
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--port", type=int, default=8443)
+    parser.add_argument("--token", help="Required bearer token (default: accept any)")
+    parser.add_argument("--dir", default=".", help="Directory uploads are written to")
+    args = parser.parse_args()
+
+    os.makedirs(args.dir, exist_ok=True)
+    UploadHandler.token = args.token
+    UploadHandler.directory = args.dir
+    ThreadingHTTPServer(("127.0.0.1", args.port), UploadHandler).serve_forever()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,25 +1,43 @@
 import os
+import yaml
 import requests
 import pulumi
 import pulumi_kubernetes as k8s
 from pulumi_kubernetes import Provider
 
 from src.lib.kubernetes_api_endpoint import KubernetesApiEndpointIp
+from src.lib.inventory import load_inventory, capture_talos_inventory, get_disk_roles, role_classes
 from src.cilium.deploy import deploy_cilium
 from src.cert_manager.deploy import deploy_cert_manager
-from src.kubevirt.deploy import deploy_kubevirt
+from src.node_prep.deploy import deploy_node_prep, get_node_prep_config
+from src.kubevirt.deploy import deploy_kubevirt, get_migration_config, deploy_migration_network
+from src.kubevirt.deploy import get_profile_config as get_kubevirt_profile_config
 from src.containerized_data_importer.deploy import deploy_cdi
 from src.cluster_network_addons.deploy import deploy_cnao
 from src.multus.deploy import deploy_multus
 from src.hostpath_provisioner.deploy import deploy as deploy_hostpath_provisioner
+from src.hostpath_provisioner.deploy import get_storage_pools
 from src.openunison.deploy import deploy_openunison
 from src.prometheus.deploy import deploy_prometheus
+from src.prometheus.deploy import get_profile_config as get_prometheus_profile_config
 from src.kubernetes_dashboard.deploy import deploy_kubernetes_dashboard
 from src.kv_manager.deploy import deploy_ui_for_kubevirt
-from src.ceph.deploy import deploy_rook_operator
+from src.ceph.deploy import deploy_rook_operator, deploy_ceph_cluster
 from src.vm.ubuntu import deploy_ubuntu_vm
-from src.vm.talos import deploy_talos_cluster
+from src.vm.talos import deploy_talos_cluster, get_talos_config, get_worker_pool_configs
+from src.vm.capacity import get_capacity_config, load_cluster_capacity, load_capacity_file
+from src.vm.capacity import inventory_storage, check_vm_capacity
+from src.vm.talos_bootstrap import get_bootstrap_config
 from src.ingress_nginx.deploy import deploy_ingress_nginx
+from src.node_local_dns.deploy import deploy_node_local_dns
+from src.registry_cache.deploy import deploy_registry_cache, get_registry_cache_config, node_mirrors
+from src.lib.images import ImageResolver, pin_images_transformation
+from src.lib.sizing import get_sizing_config, get_scale, compute_sizing
+from src.vpa.deploy import deploy_vpa, get_vpa_config, list_workloads
+from src.metrics_server.deploy import deploy_metrics_server
+from src.lib.autoscaling import get_hpa_config
+from src.lib.priority import get_priority_config, create_priority_classes
+from src.lib.placement import get_placement_config
 from src.kv_manager.deploy import deploy_ui_for_kubevirt
 
 ##################################################################################
@@ -52,6 +70,18 @@ k8s_provider = Provider(
 
 versions = {}
 
+##################################################################################
+# Load the host hardware inventory (disks and links per node)
+config_inventory = config.get_object("inventory") or {}
+inventory_path = config_inventory.get("path")
+inventory = None
+if inventory_path:
+    inventory_node_names = config_inventory.get("node_names") or {}
+    # Refresh the inventory files from live Talos nodes when requested
+    if str(config_inventory.get("refresh")).lower() == "true":
+        capture_talos_inventory(config_inventory.get("talos_nodes") or [], inventory_path)
+    inventory = load_inventory(inventory_path, tuple(sorted(inventory_node_names.items())))
+
 ##################################################################################
 ## Enable/Disable Kargo Kubevirt PaaS Infrastructure Modules
 ##################################################################################
@@ -84,22 +114,132 @@ config_kubevirt_manager, kubevirt_manager_enabled = get_module_config(
 )
 config_vm, vm_enabled = get_module_config("vm")
 config_talos, talos_cluster_enabled = get_module_config("talos")
+config_node_local_dns, node_local_dns_enabled = get_module_config("node_local_dns")
+config_ceph, ceph_enabled = get_module_config("ceph")
+config_node_prep, node_prep_enabled = get_module_config("node_prep")
+config_capacity, capacity_enabled = get_module_config("capacity")
+config_registry_cache, registry_cache_enabled = get_module_config("registry_cache")
+config_sizing, sizing_enabled = get_module_config("sizing")
+config_vpa, vpa_enabled = get_module_config("vpa")
+config_metrics_server, metrics_server_enabled = get_module_config("metrics_server")
+config_hpa, hpa_enabled = get_module_config("hpa")
+config_priority, priority_enabled = get_module_config("priority")
+config_placement, placement_enabled = get_module_config("placement")
+
+# Mirror endpoints are known from config alone, so nodes are pointed at the
+# cache before it exists and fall back to the upstream registries until then
+registry_cache = get_registry_cache_config(config_registry_cache) if registry_cache_enabled else None
+
+# HorizontalPodAutoscaler settings per component, applied by each module
+hpa_config = get_hpa_config(config_hpa) if hpa_enabled else None
+if hpa_enabled and not metrics_server_enabled:
+    pulumi.log.warn("hpa needs the resource metrics API, enable metrics_server unless the cluster runs one")
+
+# Infra and workload node tiers every module places its controllers and node agents on
+placement_config = get_placement_config(config_placement) if placement_enabled else None
+if placement_config:
+    versions["placement"] = {"enabled": placement_enabled, **placement_config}
+
+# Each inventory data disk class is either a hostpath-provisioner pool or Ceph OSDs
+disk_roles = get_disk_roles(config_inventory.get("disk_roles") or {}, ceph_enabled)
+
+# Pin every workload image to the digest recorded in the lockfile, must be
+# registered before the first Kubernetes resource
+config_image_digests, image_digests_enabled = get_module_config("image_digests")
+if image_digests_enabled:
+    image_resolver = ImageResolver(
+        config_image_digests.get("lockfile") or "image-digests.lock.json",
+        str(config_image_digests.get("refresh")).lower() == "true",
+    )
+    pulumi.runtime.register_stack_transformation(pin_images_transformation(image_resolver))
 
 ##################################################################################
 ## Core Kargo Kubevirt PaaS Infrastructure
 ##################################################################################
 
+##################################################################################
+# Size platform components for the node count and the planned VMs and pods
+def run_sizing():
+    if sizing_enabled:
+        sizing = get_sizing_config(config_sizing)
+
+        nodes = len(inventory.nodes) if inventory and inventory.nodes else None
+        if not nodes and not sizing["nodes"]:
+            capacity = get_capacity_config(config_capacity)
+            if capacity["source"] == "file":
+                capacity_nodes = load_capacity_file(capacity["file"])
+            else:
+                capacity_nodes = load_cluster_capacity(
+                    kubeconfig, kubernetes_context, capacity["cache_path"], capacity["cache_ttl"]
+                )
+            if capacity_nodes:
+                nodes = len(capacity_nodes)
+            else:
+                pulumi.log.warn("Node count unknown, sizing for a single node. Set sizing.nodes to override")
+
+        # Autoscaled Talos pools are sized for their maximum
+        vms = 1 if vm_enabled else 0
+        if talos_cluster_enabled:
+            vms += sum(
+                talos_config.get("max_replicas", talos_config["replicas"])
+                for talos_config in [
+                    get_talos_config(config_talos.get("controlplane", {}), "controlplane"),
+                    *get_worker_pool_configs(config_talos),
+                ]
+            )
+
+        scale = get_scale(sizing, nodes, vms)
+        sizing_plan = compute_sizing(sizing, scale)
+
+        pulumi.export("sizing_plan", {"scale": scale, "components": sizing_plan})
+
+        return sizing_plan
+    return None
+
+
+sizing_plan = run_sizing()
+
 depends = []
 
 # defining a separate depends list for openunison to avoid circular dependencies
 openunison_depends = []
 
+# StorageClasses that cannot back live migrating VM disks, None marks an RWO-only default class
+rwo_storage_classes = []
+
+# Normalized hostpath-provisioner storage pools, node local capacity for the VM capacity planner
+hostpath_storage_pools = []
+hostpath_default_path = config_hostpath_provisioner.get("default_path") or "/var/mnt/hostpath-provisioner"
+
 
 def safe_append(depends, resource):
     if resource:
         depends.append(resource)
 
 
+##################################################################################
+# Create the PriorityClasses modules are tiered with
+def run_priority():
+    if priority_enabled:
+        priority = get_priority_config(config_priority)
+        priority_classes = create_priority_classes(priority, k8s_provider)
+
+        # Pods are rejected until their PriorityClass exists
+        depends.extend(priority_classes)
+
+        versions["priority"] = {
+            "enabled": priority_enabled,
+            "classes": {tier_name: tier["name"] for tier_name, tier in priority["tiers"].items()},
+            "guaranteed": priority["guaranteed"],
+        }
+
+        return priority, priority_classes
+    return None, []
+
+
+priority_config, priority_classes = run_priority()
+
+
 ##################################################################################
 # Fetch the Cilium Version
 # Deploy Cilium
@@ -107,11 +247,21 @@ def run_cilium():
     if cilium_enabled:
         namespace = "kube-system"
         l2announcements = config_cilium.get("l2announcements") or "192.168.1.70/28"
-        l2_bridge_name = config_cilium.get("l2_bridge_name") or "br0"
+        l2_bridge_name = (
+            config_cilium.get("l2_bridge_name")
+            or (inventory and inventory.bridge_name())
+            or "br0"
+        )
+        cilium_devices = config_cilium.get("devices") or (
+            inventory.cilium_devices() if inventory else None
+        )
         cilium_version = config_cilium.get("version")  # or "1.14.7"
         kubernetes_endpoint_service_address = (
             config_cilium.get("kubernetes_endpoint_service_address") or "localhost"
         )
+        cilium_profile = config_cilium.get("profile") or "dev"
+        cilium_datapath = config_cilium.get("datapath") or {}
+        cilium_bgp = config_cilium.get("bgp") or {}
 
         cilium = deploy_cilium(
             "cilium-cni",
@@ -123,13 +273,24 @@ def run_cilium():
             cilium_version,
             l2_bridge_name,
             l2announcements,
+            cilium_profile,
+            cilium_datapath,
+            cilium_bgp,
+            cilium_devices,
+            sizing_plan,
+            priority_config,
+            placement_config,
         )
         cilium_version = cilium[0]
         cilium_release = cilium[1]
 
         safe_append(depends, cilium_release)
 
-        versions["cilium"] = {"enabled": cilium_enabled, "version": cilium_version}
+        versions["cilium"] = {
+            "enabled": cilium_enabled,
+            "version": cilium_version,
+            "profile": cilium_profile,
+        }
 
         return cilium_version, cilium_release
 
@@ -139,6 +300,87 @@ def run_cilium():
 cilium_version, cilium_release = run_cilium()
 
 
+##################################################################################
+# Deploy metrics-server
+def run_metrics_server():
+    if metrics_server_enabled:
+        ns_name = "kube-system"
+        metrics_server_version = config_metrics_server.get("version") or None
+        # Talos and kind kubelets serve self-signed certificates by default
+        kubelet_insecure_tls = str(config_metrics_server.get("kubelet_insecure_tls", True)).lower() == "true"
+
+        custom_depends = []
+        safe_append(custom_depends, cilium_release)
+
+        metrics_server = deploy_metrics_server(
+            custom_depends,
+            ns_name,
+            metrics_server_version,
+            kubelet_insecure_tls,
+            k8s_provider,
+            sizing_plan,
+            placement_config,
+        )
+
+        versions["metrics_server"] = {
+            "enabled": metrics_server_enabled,
+            "version": metrics_server[0],
+        }
+        metrics_server_release = metrics_server[1]
+
+        safe_append(depends, metrics_server_release)
+
+        return metrics_server_release
+    return None
+
+
+metrics_server_release = run_metrics_server()
+
+
+##################################################################################
+# Deploy NodeLocal DNS Cache
+def run_node_local_dns():
+    if node_local_dns_enabled:
+        if not cilium_enabled:
+            msg = "NodeLocal DNS requires Cilium Local Redirect Policy. Please enable Cilium and try again."
+            pulumi.log.error(msg)
+            return None, None
+
+        ns_name = "kube-system"
+        node_local_dns_version = config_node_local_dns.get("version") or "1.23.1"
+        cluster_dns_ip = config_node_local_dns.get("cluster_dns_ip") or "10.96.0.10"
+        autoscaler_config = config_node_local_dns.get("autoscaler") or {}
+
+        custom_depends = []
+        safe_append(custom_depends, cilium_release)
+
+        node_local_dns = deploy_node_local_dns(
+            custom_depends,
+            ns_name,
+            node_local_dns_version,
+            cluster_dns_ip,
+            autoscaler_config,
+            k8s_provider,
+            sizing_plan,
+            priority_config,
+            placement_config,
+        )
+
+        versions["node_local_dns"] = {
+            "enabled": node_local_dns_enabled,
+            "version": node_local_dns[0],
+        }
+        node_local_dns_release = node_local_dns[1]
+
+        safe_append(depends, node_local_dns_release)
+
+        return node_local_dns, node_local_dns_release
+    return None, None
+
+
+node_local_dns, node_local_dns_release = run_node_local_dns()
+
+
 ##################################################################################
 # Fetch the Cert Manager Version
 # Deploy Cert Manager
@@ -153,6 +395,10 @@ def run_cert_manager():
             kubernetes_distribution,
             depends,
             k8s_provider,
+            sizing_plan,
+            hpa_config,
+            priority_config,
+            placement_config,
         )
 
         versions["cert_manager"] = {
@@ -173,6 +419,45 @@ def run_cert_manager():
 cert_manager, cert_manager_release, cert_manager_selfsigned_cert = run_cert_manager()
 
 
+##################################################################################
+# Prepare nodes (SELinux workaround, sysctls, hugepages, kernel modules, registry mirrors)
+def run_node_prep():
+    # KubeVirt depends on the SELinux workaround, so preparation follows it by default
+    if node_prep_enabled or kubevirt_enabled or registry_cache_enabled:
+        ns_name = "kube-system"
+        node_prep = get_node_prep_config(config_node_prep, node_mirrors(registry_cache))
+
+        if kubernetes_distribution == "talos":
+            # Talos patches are applied per node address with talosctl
+            node_names = config_node_prep.get("nodes") or (
+                inventory and sorted(node.address for node in inventory.nodes)
+            ) or []
+        else:
+            # The label check covers every node unless restricted
+            node_names = config_node_prep.get("nodes") or []
+
+        custom_depends = []
+        safe_append(custom_depends, cilium_release)
+
+        node_prep_resources = deploy_node_prep(
+            custom_depends,
+            ns_name,
+            node_prep,
+            node_names,
+            k8s_provider,
+            kubernetes_distribution,
+            inventory,
+        )
+
+        versions["node_prep"] = {"enabled": True, "nodes": node_names}
+
+        return node_prep_resources
+    return []
+
+
+node_prep_resources = run_node_prep()
+
+
 ##################################################################################
 # Deploy KubeVirt
 def run_kubevirt():
@@ -180,10 +465,22 @@ def run_kubevirt():
         ns_name = "kubevirt"
         kubevirt_version = config_kubevirt.get("version") or None
         kubevirt_emulation = config_kubevirt.get("emulation") or False
+        kubevirt_migration = get_migration_config(
+            config_kubevirt.get("migration"),
+            (inventory and inventory.bridge_name()) or "br0",
+        )
+        kubevirt_profile = config_kubevirt.get("profile") or "development"
+        kubevirt_tuning = get_kubevirt_profile_config(
+            kubevirt_profile, config_kubevirt.get("tuning") or {}
+        )
+        # Sized virt-handler resources replace the profile's unless set in kubevirt.tuning
+        if sizing_plan and not (config_kubevirt.get("tuning") or {}).get("virt_handler_resources"):
+            kubevirt_tuning["virt_handler_resources"] = sizing_plan["virt_handler"]["resources"]
 
         custom_depends = []
         safe_append(custom_depends, cilium_release)
         safe_append(custom_depends, cert_manager_release)
+        custom_depends.extend(node_prep_resources)
 
         kubevirt = deploy_kubevirt(
             custom_depends,
@@ -192,18 +489,25 @@ def run_kubevirt():
             kubevirt_emulation,
             k8s_provider,
             kubernetes_distribution,
+            kubevirt_migration,
+            kubevirt_tuning,
+            placement_config,
         )
 
-        versions["kubevirt"] = {"enabled": kubevirt_enabled, "version": kubevirt[0]}
+        versions["kubevirt"] = {
+            "enabled": kubevirt_enabled,
+            "version": kubevirt[0],
+            "profile": kubevirt_profile,
+        }
         kubevirt_operator = kubevirt[1]
 
         safe_append(openunison_depends, kubevirt_operator)
 
-        return kubevirt, kubevirt_operator
-    return None, None
+        return kubevirt, kubevirt_operator, kubevirt_migration, kubevirt_tuning
+    return None, None, None, None
 
 
-kubevirt, kubevirt_operator = run_kubevirt()
+kubevirt, kubevirt_operator, kubevirt_migration, kubevirt_tuning = run_kubevirt()
 
 
 ##################################################################################
@@ -212,7 +516,12 @@ def run_multus():
     if multus_enabled:
         ns_name = "multus"
         multus_version = config_multus.get("version") or "master"
-        bridge_name = config_multus.get("bridge_name") or "br0"
+        bridge_name = (
+            config_multus.get("bridge_name")
+            or (inventory and inventory.bridge_name())
+            or "br0"
+        )
+        multus_networks = config_multus.get("networks") or []
 
         custom_depends = []
 
@@ -222,7 +531,13 @@ def run_multus():
             safe_append(custom_depends, cert_manager_release)
 
         multus = deploy_multus(
-            custom_depends, multus_version, bridge_name, k8s_provider
+            custom_depends,
+            multus_version,
+            bridge_name,
+            k8s_provider,
+            multus_networks,
+            sizing_plan,
+            priority_config,
         )
 
         versions["multus"] = {"enabled": multus_enabled, "version": multus[0]}
@@ -237,6 +552,26 @@ def run_multus():
 multus, multus_release = run_multus()
 
 
+##################################################################################
+# Deploy the dedicated KubeVirt live migration network
+def run_kubevirt_migration_network():
+    if kubevirt_enabled and kubevirt_migration["network"]:
+        if not multus_enabled:
+            raise ValueError("kubevirt.migration.network requires multus, enable multus and try again")
+
+        custom_depends = []
+        safe_append(custom_depends, kubevirt_operator)
+        safe_append(custom_depends, multus_release)
+
+        return deploy_migration_network(
+            custom_depends, "kubevirt", kubevirt_migration, k8s_provider
+        )
+    return None
+
+
+kubevirt_migration_network = run_kubevirt_migration_network()
+
+
 ##################################################################################
 # Deploy Cluster Network Addons Operator (CNAO)
 def run_cnao():
@@ -252,7 +587,19 @@ def run_cnao():
         if cert_manager_enabled:
             safe_append(custom_depends, cert_manager_release)
 
-        cnao = deploy_cnao(custom_depends, cnao_version, k8s_provider)
+        cnao_components = config_cnao.get("components") or {}
+        if (
+            str(cnao_components.get("multus_dynamic_networks")).lower() == "true"
+            and not multus_enabled
+        ):
+            msg = "CNAO multus_dynamic_networks requires Multus. Please enable Multus and try again."
+            pulumi.log.error(msg)
+            return None, None
+
+        if multus_enabled:
+            safe_append(custom_depends, multus_release)
+
+        cnao = deploy_cnao(custom_depends, cnao_version, k8s_provider, config_cnao, placement_config)
 
         versions["cnao"] = {"enabled": cnao_enabled, "version": cnao[0]}
         cnao_release = cnao[1]
@@ -275,13 +622,44 @@ def run_hostpath_provisioner():
             pulumi.log.error(msg)
             return None, None
 
-        hostpath_default_path = (
-            config_hostpath_provisioner.get("default_path")
-            or "/var/mnt/hostpath-provisioner"
-        )
         hostpath_default_storage_class = (
             config_hostpath_provisioner.get("default_storage_class") or False
         )
+        hostpath_storage_pools_config = config_hostpath_provisioner.get("storage_pools") or (
+            inventory.storage_pools(
+                hostpath_default_path,
+                role_classes(disk_roles, "hostpath"),
+                str(hostpath_default_storage_class).lower() == "true",
+            ) if inventory else []
+        )
+
+        # Inventory pools are directories on the root filesystem until their disks are mounted
+        if inventory and not config_hostpath_provisioner.get("storage_pools"):
+            disk_patches = inventory.talos_disk_patches(hostpath_default_path, role_classes(disk_roles, "hostpath"))
+            if disk_patches and kubernetes_distribution == "talos":
+                pulumi.export(
+                    "hostpath_talos_disk_patches",
+                    {address: yaml.safe_dump(patch, sort_keys=False) for address, patch in disk_patches.items()},
+                )
+                pulumi.log.warn(
+                    "hostpath_provisioner: apply each hostpath_talos_disk_patches entry with "
+                    "`talosctl patch machineconfig --nodes <address> --patch @<file>`, Talos formats "
+                    "and mounts the pool disks on the next boot"
+                )
+            elif disk_patches:
+                pulumi.log.warn(
+                    "hostpath_provisioner: mount one disk of each device class at "
+                    f"{hostpath_default_path}/<class> on every node, the pools are plain directories until then"
+                )
+
+        # HPP volumes are node local and ReadWriteOnce only
+        for pool in get_storage_pools(
+            hostpath_storage_pools_config, hostpath_default_path, hostpath_default_storage_class
+        ):
+            hostpath_storage_pools.append(pool)
+            rwo_storage_classes.append(pool["storage_class"])
+            if pool["default"]:
+                rwo_storage_classes.append(None)
         ns_name = "hostpath-provisioner"
         hostpath_provisioner_version = (
             config_hostpath_provisioner.get("version") or None
@@ -295,6 +673,7 @@ def run_hostpath_provisioner():
             safe_append(custom_depends, cert_manager_release)
         if kubevirt_enabled:
             safe_append(custom_depends, kubevirt_operator)
+        custom_depends.extend(priority_classes)
 
         hostpath_provisioner = deploy_hostpath_provisioner(
             custom_depends,
@@ -303,6 +682,9 @@ def run_hostpath_provisioner():
             hostpath_default_path,
             hostpath_default_storage_class,
             k8s_provider,
+            hostpath_storage_pools_config,
+            priority_config,
+            placement_config,
         )
 
         versions["hostpath_provisioner"] = {
@@ -320,6 +702,31 @@ def run_hostpath_provisioner():
 hostpath_provisioner, hostpath_provisioner_release = run_hostpath_provisioner()
 
 
+##################################################################################
+# Deploy the pull-through registry cache
+def run_registry_cache():
+    if registry_cache_enabled:
+        registry_cache_deployment = deploy_registry_cache(
+            depends,
+            registry_cache,
+            k8s_provider,
+            sizing_plan,
+            priority_config,
+            placement_config,
+        )
+
+        versions["registry_cache"] = {
+            "enabled": registry_cache_enabled,
+            "mirrors": node_mirrors(registry_cache),
+        }
+
+        return registry_cache_deployment
+    return None
+
+
+registry_cache_deployment = run_registry_cache()
+
+
 ##################################################################################
 # Deploy Containerized Data Importer (CDI)
 def run_cdi():
@@ -327,7 +734,15 @@ def run_cdi():
         ns_name = "cdi"
         cdi_version = config_cdi.get("version") or None
 
-        cdi = deploy_cdi(depends, cdi_version, k8s_provider)
+        cdi = deploy_cdi(
+            depends,
+            cdi_version,
+            k8s_provider,
+            config_cdi,
+            registry_cache,
+            priority_config,
+            placement_config,
+        )
 
         versions["cdi"] = {"enabled": cdi_enabled, "version": cdi[0]}
         cdi_release = cdi[1]
@@ -347,15 +762,29 @@ def run_prometheus():
     if prometheus_enabled:
         ns_name = "monitoring"
         prometheus_version = config_prometheus.get("version") or None
+        prometheus_profile = config_prometheus.get("profile") or "development"
+        prometheus_tuning = get_prometheus_profile_config(
+            prometheus_profile, config_prometheus.get("tuning") or {}
+        )
+        pulumi.log.info(f"Using Prometheus profile: {prometheus_profile}")
 
         prometheus = deploy_prometheus(
-            depends, ns_name, prometheus_version, k8s_provider, openunison_enabled
+            depends,
+            ns_name,
+            prometheus_version,
+            k8s_provider,
+            openunison_enabled,
+            sizing_plan,
+            priority_config,
+            placement_config,
+            prometheus_tuning,
         )
 
         versions["prometheus"] = {
             "enabled": prometheus_enabled,
             "version": prometheus[0],
             "release": prometheus[1],
+            "profile": prometheus_profile,
         }
         prometheus_release = prometheus[1]
 
@@ -386,6 +815,10 @@ def run_kubernetes_dashboard():
             kubernetes_dashboard_version,
             k8s_provider,
             openunison_enabled,
+            sizing_plan,
+            hpa_config,
+            priority_config,
+            placement_config,
         )
 
         versions["kubernetes_dashboard"] = {
@@ -412,6 +845,8 @@ def run_kubevirt_manager():
         kubevirt_manager = deploy_ui_for_kubevirt(
             "kargo",
             k8s_provider,
+            priority_config,
+            placement_config,
         )
 
         versions["kubevirt_manager"] = {
@@ -451,7 +886,13 @@ def run_openunison():
 
         # Assume ingress-nginx for OpenUnison
         nginx_release, nginx_version = deploy_ingress_nginx(
-            None, "ingress-nginx", k8s_provider
+            None,
+            "ingress-nginx",
+            k8s_provider,
+            sizing_plan,
+            hpa_config,
+            priority_config,
+            placement_config,
         )
         versions["nginx"] = {"enabled": openunison_enabled, "version": nginx_version}
 
@@ -472,6 +913,9 @@ def run_openunison():
             openunison_github_client_secret,
             openunison_github_teams,
             versions,
+            hpa_config,
+            priority_config,
+            placement_config,
         )
 
         versions["openunison"] = {
@@ -479,25 +923,55 @@ def run_openunison():
             "version": openunison[0],
         }
         openunison_release = openunison[1]
+        orchestra_release = openunison[2]
 
         safe_append(depends, openunison_release)
 
-        return openunison, openunison_release
+        return openunison, openunison_release, orchestra_release, nginx_release
 
-    return None, None
+    return None, None, None, None
 
 
-openunison, openunison_release = run_openunison()
+openunison, openunison_release, orchestra_release, nginx_release = run_openunison()
 
 
 ##################################################################################
 # Deploy Rook Ceph
 def run_rook_ceph():
-    deploy_ceph = config.get_bool("ceph.enabled") or False
-    if deploy_ceph:
+    if ceph_enabled:
+        ns_name = "rook-ceph"
+        ceph_version = config_ceph.get("version") or None
+
+        custom_depends = []
+        safe_append(custom_depends, cilium_release)
+        custom_depends.extend(priority_classes)
+
         rook_operator = deploy_rook_operator(
-            "kargo", k8s_provider, kubernetes_distribution, "kargo", "rook-ceph"
+            custom_depends,
+            ns_name,
+            ceph_version,
+            k8s_provider,
+            kubernetes_distribution,
+            project_name,
+            priority_config,
+            placement_config,
+        )
+        rook_operator_release = rook_operator[1]
+
+        ceph_cluster, ceph_storage_class = deploy_ceph_cluster(
+            config_ceph,
+            ns_name,
+            k8s_provider,
+            rook_operator_release,
+            inventory,
+            priority_config,
+            role_classes(disk_roles, "ceph"),
         )
+
+        versions["ceph"] = {"enabled": ceph_enabled, "version": rook_operator[0]}
+
+        safe_append(depends, ceph_storage_class)
+
         return rook_operator
     return None
 
@@ -505,6 +979,91 @@ def run_rook_ceph():
 rook_operator = run_rook_ceph()
 
 
+##################################################################################
+# Deploy the Vertical Pod Autoscaler in recommendation-only mode
+def run_vpa():
+    if vpa_enabled:
+        vpa = get_vpa_config(config_vpa)
+
+        # VPAs target the workloads of the modules deployed above
+        workloads = list_workloads(
+            {
+                "cilium": cilium_release,
+                "metrics_server": metrics_server_release,
+                "node_local_dns": node_local_dns_release,
+                "cert_manager": cert_manager_release,
+                "kubevirt": kubevirt_operator,
+                "multus": multus_release,
+                "hostpath_provisioner": hostpath_provisioner_release,
+                "registry_cache": registry_cache_deployment,
+                "cdi": cdi_release,
+                "prometheus": prometheus_release,
+                "kubernetes_dashboard": kubernetes_dashboard_release,
+                "ingress_nginx": nginx_release,
+                "openunison": orchestra_release,
+            },
+            vpa["modules"],
+            {"registry_cache": registry_cache["namespace"]} if registry_cache_enabled else None,
+        )
+
+        vpa_deployment = deploy_vpa(depends, vpa, workloads, k8s_provider, placement_config)
+
+        versions["vpa"] = {"enabled": vpa_enabled, "version": vpa_deployment[0]}
+
+        return vpa_deployment[1]
+    return None
+
+
+vpa_release = run_vpa()
+
+
+##################################################################################
+# Check that the requested VMs and DataVolumes fit on the nodes before creating them
+def run_capacity_check():
+    if capacity_enabled and (vm_enabled or talos_cluster_enabled):
+        capacity = get_capacity_config(config_capacity)
+
+        if capacity["source"] == "file":
+            nodes = load_capacity_file(capacity["file"])
+        else:
+            nodes = load_cluster_capacity(
+                kubeconfig, kubernetes_context, capacity["cache_path"], capacity["cache_ttl"]
+            )
+        if not nodes:
+            pulumi.log.warn("No node capacity data, skipping the VM capacity check")
+            return None
+
+        talos_configs = []
+        if talos_cluster_enabled:
+            talos_configs = [
+                get_talos_config(config_talos.get("controlplane", {}), "controlplane"),
+                *get_worker_pool_configs(config_talos),
+            ]
+
+        default_pools = [pool for pool in hostpath_storage_pools if pool["default"]]
+
+        capacity_plan = check_vm_capacity(
+            capacity,
+            nodes,
+            inventory_storage(
+                inventory, hostpath_storage_pools, role_classes(disk_roles, "hostpath"), hostpath_default_path
+            ),
+            talos_configs,
+            config_vm if vm_enabled else None,
+            (config_cdi.get("golden_images") or []) if cdi_enabled else [],
+            kubevirt_tuning,
+            default_pools[0]["storage_class"] if default_pools else None,
+        )
+
+        pulumi.export("capacity_plan", capacity_plan)
+
+        return capacity_plan
+    return None
+
+
+capacity_plan = run_capacity_check()
+
+
 ##################################################################################
 # Deploy Ubuntu VM
 def run_ubuntu_vm():
@@ -566,12 +1125,23 @@ def run_talos_cluster():
         if cdi_enabled:
             safe_append(custom_depends, cdi_release)
 
+        # Generate, apply and bootstrap the nested cluster machine configs when enabled
+        config_bootstrap = config_talos.get("bootstrap") or {}
+        talos_bootstrap_config = None
+        if str(config_bootstrap.get("enabled")).lower() == "true":
+            talos_bootstrap_config = get_bootstrap_config(config_bootstrap, project_name)
+
         # Deploy the Talos cluster (controlplane and workers)
-        controlplane_vm_pool, worker_vm_pool = deploy_talos_cluster(
+        controlplane_vm_pool, worker_vm_pools, talos_bootstrap = deploy_talos_cluster(
             config_talos=config_talos,
             k8s_provider=k8s_provider,
             depends_on=custom_depends,
             parent=kubevirt_operator,
+            rwo_storage_classes=rwo_storage_classes,
+            bootstrap=talos_bootstrap_config,
+            kubeconfig=kubeconfig,
+            kubernetes_context=kubernetes_context,
+            registry_cache=registry_cache,
         )
 
         # Export the Talos configuration and versions
@@ -580,15 +1150,17 @@ def run_talos_cluster():
             "running": config_talos.get("running", True),
             "controlplane": config_talos.get("controlplane", {}),
             "workers": config_talos.get("workers", {}),
+            "worker_pools": config_talos.get("worker_pools", []),
+            "bootstrap": talos_bootstrap_config is not None,
         }
 
-        return controlplane_vm_pool, worker_vm_pool
+        return controlplane_vm_pool, worker_vm_pools
     else:
-        return None, None
+        return None, []
 
 
 # Run the Talos cluster deployment
-talos_controlplane_vm_pool, talos_worker_vm_pool = run_talos_cluster()
+talos_controlplane_vm_pool, talos_worker_vm_pools = run_talos_cluster()
 
 # Export the component versions
 pulumi.export("versions", versions)
@@ -1,46 +1,118 @@
 import pulumi
+import pulumi_kubernetes as k8s
 from pulumi_kubernetes import helm, Provider
+from pulumi_kubernetes.apiextensions import CustomResource
+from pulumi_kubernetes.meta.v1 import ObjectMetaArgs
+from pulumi_kubernetes.storage.v1 import StorageClass
 from src.lib.namespace import create_namespace
 from src.lib.helm_chart_versions import get_latest_helm_chart_version
+from src.lib.inventory import Inventory
+from src.lib.priority import priority_class_name
+from src.lib.placement import node_placement
 
-def deploy_rook_operator(name: str, k8s_provider: Provider, kubernetes_distribution: str, project_name: str, namespace: str):
+
+def deploy_rook_operator(
+    depends,
+    ns_name: str,
+    version: str,
+    k8s_provider: Provider,
+    kubernetes_distribution: str,
+    project_name: str,
+    priority: dict = None,
+    placement: dict = None,
+):
     """
-    Deploy Ceph Operator using the Helm chart.
+    Deploy the Rook Ceph Operator using the Helm chart.
 
     Args:
-        name (str): The name of the release.
+        depends (list): Resources this deployment depends on.
+        ns_name (str): The namespace to deploy Rook Ceph into.
+        version (str): The rook-ceph chart version, latest stable if None.
         k8s_provider (Provider): The Kubernetes provider.
         kubernetes_distribution (str): The Kubernetes distribution.
         project_name (str): The name of the project.
-        kubernetes_endpoint_ip_string (str): The IP address of the Kubernetes endpoint.
-        namespace (str): The namespace to deploy Rook Ceph into.
+        priority (dict): Priority tiers from get_priority_config, storage for the operator and CSI pods.
+        placement (dict): Node placement from get_placement_config, infra for the operator.
 
     Returns:
-        pulumi.helm.v3.Release: The deployed Rook Ceph Helm release.
+        Tuple containing:
+        - Rook Ceph chart version deployed
+        - Rook Ceph operator Helm release
+        - Rook Ceph namespace
     """
-    namespace = create_namespace("rook-ceph", k8s_provider)
+    # Rook OSD and CSI pods need privileged host access
+    ns_retain = True
+    ns_protect = False
+    ns_annotations = {}
+    ns_labels = {
+        "kubernetes.io/metadata.name": ns_name,
+        "pod-security.kubernetes.io/enforce": "privileged",
+    }
+    namespace = create_namespace(
+        depends,
+        ns_name,
+        ns_retain,
+        ns_protect,
+        k8s_provider,
+        custom_labels=ns_labels,
+        custom_annotations=ns_annotations,
+    )
 
     # Determine Helm values based on the Kubernetes distribution
     helm_values = gen_helm_values(kubernetes_distribution, project_name)
 
+    if priority:
+        storage_priority = priority_class_name(priority, "storage")
+        helm_values["priorityClassName"] = storage_priority
+        helm_values["csi"] = {
+            **helm_values["csi"],
+            "pluginPriorityClassName": storage_priority,
+            "provisionerPriorityClassName": storage_priority,
+        }
+
+    # The CSI node plugin mounts VM disks on every tier
+    if placement:
+        helm_values.update(node_placement(placement, "infra"))
+        plugin_tolerations = [*placement["infra"]["tolerations"], *placement["workloads"]["tolerations"]]
+        if plugin_tolerations:
+            helm_values["csi"] = {**helm_values["csi"], "pluginTolerations": plugin_tolerations}
+
     # Fetch the latest version from the helm chart index
-    chart_url = "https://charts.rook.io/master/index.yaml"
     chart_name = "rook-ceph"
-    chart_version = get_latest_helm_chart_version(chart_url, chart_name)
+    chart_url = "https://charts.rook.io/release"
+    chart_index_url = f"{chart_url}/index.yaml"
+    if version is None:
+        version = get_latest_helm_chart_version(chart_index_url, chart_name)
+        version = version.lstrip("v")
+        pulumi.log.info(f"Setting helm release version to latest stable: {chart_name}/{version}")
+    else:
+        pulumi.log.info(f"Using helm release version: {chart_name}/{version}")
 
     # Deploy Rook Ceph Operator using the Helm chart
     release = helm.v3.Release(
-        name,
-        chart="rook-ceph",
-        version=chart_version,
-        #values=helm_values,
-        values={},
-        namespace=namespace,
-        repository_opts={"repo": "https://charts.rook.io/release"},
-        opts=pulumi.ResourceOptions(provider=k8s_provider)
+        "rook-ceph-operator",
+        helm.v3.ReleaseArgs(
+            chart=chart_name,
+            version=version,
+            values=helm_values,
+            namespace=ns_name,
+            skip_await=False,
+            repository_opts=helm.v3.RepositoryOptsArgs(repo=chart_url),
+        ),
+        opts=pulumi.ResourceOptions(
+            provider=k8s_provider,
+            parent=namespace,
+            depends_on=depends,
+            custom_timeouts=pulumi.CustomTimeouts(
+                create="10m",
+                update="10m",
+                delete="10m"
+            )
+        )
     )
 
-    return(release, chart_version)
+    return version, release, namespace
+
 
 def gen_helm_values(kubernetes_distribution: str, project_name: str):
     """
@@ -49,7 +121,6 @@ def gen_helm_values(kubernetes_distribution: str, project_name: str):
     Args:
         kubernetes_distribution (str): The Kubernetes distribution (e.g., 'kind', 'talos').
         project_name (str): The name of the project.
-        kubernetes_endpoint_ip_string (str): The IP address of the Kubernetes endpoint.
 
     Returns:
         dict: The Helm values for installing Rook Ceph.
@@ -58,6 +129,14 @@ def gen_helm_values(kubernetes_distribution: str, project_name: str):
         ValueError: If the specified Kubernetes distribution is not supported.
     """
     common_values = {
+        "crds": {"enabled": True},
+        # VM disks only need RBD, skip the CephFS provisioner and plugin pods
+        "csi": {
+            "enableRbdDriver": True,
+            "enableCephfsDriver": False,
+        },
+        # OSDs are declared explicitly from the disk inventory
+        "enableDiscoveryDaemon": False,
     }
 
     if kubernetes_distribution == 'kind':
@@ -65,6 +144,7 @@ def gen_helm_values(kubernetes_distribution: str, project_name: str):
         return {
             **common_values,
             "csi": {
+                **common_values["csi"],
                 "clusterName": project_name,
             },
             "logLevel": "INFO",
@@ -76,3 +156,197 @@ def gen_helm_values(kubernetes_distribution: str, project_name: str):
         }
     else:
         raise ValueError(f"Unsupported Kubernetes distribution: {kubernetes_distribution}")
+
+
+def gen_network_spec(network: dict) -> dict:
+    """
+    Build the CephCluster network block for a dedicated replication network.
+
+    Args:
+        network (dict): `provider` (host or multus), `public` and `cluster`.
+            For host networking `public`/`cluster` are CIDRs, for multus they
+            are NetworkAttachmentDefinitions ("namespace/name").
+
+    Returns:
+        dict: CephCluster network spec.
+    """
+    provider = network.get("provider")
+    if not provider:
+        return {}
+
+    if provider == "host":
+        address_ranges = {}
+        if network.get("public"):
+            address_ranges["public"] = [network["public"]]
+        if network.get("cluster"):
+            address_ranges["cluster"] = [network["cluster"]]
+        return {"provider": "host", "addressRanges": address_ranges}
+    elif provider == "multus":
+        selectors = {}
+        if network.get("public"):
+            selectors["public"] = network["public"]
+        if network.get("cluster"):
+            selectors["cluster"] = network["cluster"]
+        return {"provider": "multus", "selectors": selectors}
+    else:
+        raise ValueError(f"Unsupported Ceph network provider: {provider}")
+
+
+def deploy_ceph_cluster(
+    config_ceph: dict,
+    ns_name: str,
+    k8s_provider: Provider,
+    operator,
+    inventory: Inventory,
+    priority: dict = None,
+    device_classes: list = None,
+):
+    """
+    Deploy a CephCluster, an RBD block pool and a VM disk StorageClass.
+
+    Args:
+        config_ceph (dict): The `ceph` stack config.
+        ns_name (str): The Rook Ceph namespace.
+        k8s_provider (Provider): The Kubernetes provider.
+        operator: The Rook Ceph operator Helm release.
+        inventory (Inventory): Host hardware inventory providing OSD devices.
+        priority (dict): Priority tiers from get_priority_config, storage for the mons, mgrs and OSDs.
+        device_classes (list): Device classes assigned to Ceph in inventory.disk_roles.
+
+    Returns:
+        Tuple containing:
+        - CephCluster resource
+        - RBD StorageClass
+    """
+    if inventory is None:
+        raise ValueError("Ceph requires a hardware inventory, set inventory.path")
+
+    storage_nodes = inventory.ceph_storage_nodes(
+        osds_per_device=config_ceph.get("osds_per_device") or {"nvme": 2, "ssd": 1, "hdd": 1},
+        min_size_gb=int(config_ceph.get("min_device_size_gb") or 100),
+        device_classes=device_classes if device_classes is not None else ["nvme", "ssd", "hdd"],
+    )
+    if not storage_nodes:
+        raise ValueError(
+            "Ceph requires at least one OSD device in the hardware inventory of a class inventory.disk_roles assigns to ceph"
+        )
+
+    mon_count = int(config_ceph.get("mon_count") or min(3, len(storage_nodes)))
+    replicas = int(config_ceph.get("replicas") or min(3, len(storage_nodes)))
+
+    # BlueStore sizes its caches to fit within osd_memory_target
+    osd_memory_target_gb = int(config_ceph.get("osd_memory_target_gb") or 4)
+    osd_memory_target = str(osd_memory_target_gb * 1024 * 1024 * 1024)
+
+    ceph_cluster_spec = {
+        "cephVersion": {
+            "image": config_ceph.get("image") or "quay.io/ceph/ceph:v18.2.4",
+        },
+        "dataDirHostPath": "/var/lib/rook",
+        "mon": {"count": mon_count, "allowMultiplePerNode": False},
+        "mgr": {"count": min(2, mon_count), "modules": [{"name": "rook", "enabled": True}]},
+        "dashboard": {"enabled": True, "ssl": True},
+        "crashCollector": {"disable": False},
+        "cephConfig": {
+            "osd": {
+                "osd_memory_target": osd_memory_target,
+                "bluestore_cache_autotune": "true",
+            },
+        },
+        "resources": {
+            "osd": {
+                "requests": {"cpu": "500m", "memory": f"{osd_memory_target_gb}Gi"},
+                "limits": {"memory": f"{osd_memory_target_gb * 2}Gi"},
+            },
+        },
+        "storage": {
+            "useAllNodes": False,
+            "useAllDevices": False,
+            "nodes": storage_nodes,
+        },
+    }
+
+    if priority:
+        ceph_cluster_spec["priorityClassNames"] = {"all": priority_class_name(priority, "storage")}
+
+    network_spec = gen_network_spec(config_ceph.get("network") or {})
+    if network_spec:
+        ceph_cluster_spec["network"] = network_spec
+
+    ceph_cluster = CustomResource(
+        "rook-ceph-cluster",
+        api_version="ceph.rook.io/v1",
+        kind="CephCluster",
+        metadata=ObjectMetaArgs(name=ns_name, namespace=ns_name),
+        spec=ceph_cluster_spec,
+        opts=pulumi.ResourceOptions(
+            provider=k8s_provider,
+            parent=operator,
+            depends_on=[operator],
+            custom_timeouts=pulumi.CustomTimeouts(
+                create="30m",
+                update="30m",
+                delete="10m"
+            )
+        )
+    )
+
+    block_pool_spec = {
+        "failureDomain": "host",
+        "replicated": {"size": replicas},
+        "parameters": {"compression_mode": "none"},
+    }
+    if config_ceph.get("device_class"):
+        block_pool_spec["deviceClass"] = config_ceph["device_class"]
+
+    block_pool = CustomResource(
+        "rook-ceph-block-pool",
+        api_version="ceph.rook.io/v1",
+        kind="CephBlockPool",
+        metadata=ObjectMetaArgs(name="vm-block", namespace=ns_name),
+        spec=block_pool_spec,
+        opts=pulumi.ResourceOptions(
+            provider=k8s_provider,
+            parent=ceph_cluster,
+            depends_on=[ceph_cluster],
+        )
+    )
+
+    # RBD volumes in Block mode are RWX capable, which KubeVirt live migration needs.
+    # CDI picks ReadWriteMany/Block for this provisioner from its StorageProfile.
+    default_storage_class = str(config_ceph.get("default_storage_class")).lower() == "true"
+    storage_class = StorageClass(
+        "rook-ceph-block-storage-class",
+        metadata=ObjectMetaArgs(
+            name=config_ceph.get("storage_class") or "ceph-block",
+            annotations={
+                "storageclass.kubernetes.io/is-default-class": (
+                    "true" if default_storage_class else "false"
+                )
+            },
+        ),
+        provisioner=f"{ns_name}.rbd.csi.ceph.com",
+        reclaim_policy="Delete",
+        allow_volume_expansion=True,
+        volume_binding_mode="Immediate",
+        parameters={
+            "clusterID": ns_name,
+            "pool": "vm-block",
+            "imageFormat": "2",
+            "imageFeatures": "layering,fast-diff,object-map,deep-flatten,exclusive-lock",
+            "csi.storage.k8s.io/provisioner-secret-name": "rook-csi-rbd-provisioner",
+            "csi.storage.k8s.io/provisioner-secret-namespace": ns_name,
+            "csi.storage.k8s.io/controller-expand-secret-name": "rook-csi-rbd-provisioner",
+            "csi.storage.k8s.io/controller-expand-secret-namespace": ns_name,
+            "csi.storage.k8s.io/node-stage-secret-name": "rook-csi-rbd-node",
+            "csi.storage.k8s.io/node-stage-secret-namespace": ns_name,
+            "csi.storage.k8s.io/fstype": "ext4",
+        },
+        opts=pulumi.ResourceOptions(
+            provider=k8s_provider,
+            parent=block_pool,
+            depends_on=[block_pool],
+        )
+    )
+
+    return ceph_cluster, storage_class
@@ -3,13 +3,21 @@ import pulumi_kubernetes as k8s
 from pulumi_kubernetes.apiextensions.CustomResource import CustomResource
 from src.lib.namespace import create_namespace
 from src.lib.helm_chart_versions import get_latest_helm_chart_version
+from src.lib.sizing import component_values
+from src.lib.autoscaling import create_hpa
+from src.lib.priority import priority_class_name
+from src.lib.placement import node_placement
 
 def deploy_cert_manager(
         ns_name: str,
         version: str,
         kubernetes_distribution: str,
         depends: pulumi.Resource,
-        k8s_provider: k8s.Provider
+        k8s_provider: k8s.Provider,
+        sizing: dict = None,
+        hpa: dict = None,
+        priority: dict = None,
+        placement: dict = None
     ):
 
     # Create namespace
@@ -44,6 +52,25 @@ def deploy_cert_manager(
     # Deploy cert-manager using the Helm release with updated custom values
     helm_values = gen_helm_values(kubernetes_distribution)
 
+    # Sized requests, limits and controller replicas replace the static defaults
+    helm_values.update(component_values(sizing, "cert_manager", "replicaCount"))
+
+    # KubeVirt, CDI and hostpath-provisioner webhooks rely on the issued certificates
+    if priority:
+        helm_values["global"] = {"priorityClassName": priority_class_name(priority, "virtualization")}
+
+    # Controller, webhook, cainjector and the startup check Job on infra nodes
+    if placement:
+        infra = node_placement(placement, "infra")
+        helm_values.update(infra)
+        for component in ("webhook", "cainjector", "startupapicheck"):
+            helm_values[component] = {**helm_values.get(component, {}), **infra}
+
+    # An autoscaled webhook takes its replicas from the HPA, a value set here
+    # would reset them on every release upgrade
+    if (hpa or {}).get("cert_manager_webhook"):
+        helm_values.get("webhook", {}).pop("replicaCount", None)
+
     # Deploy cert-manager using the Helm release with custom values
     release = k8s.helm.v3.Release(
         chart_name,
@@ -69,6 +96,16 @@ def deploy_cert_manager(
         )
     )
 
+    # The controller is leader elected, the admission webhook takes the API bursts
+    create_hpa(
+        "cert-manager-webhook",
+        ns_name,
+        release.name.apply(lambda name: f"{name}-webhook"),
+        (hpa or {}).get("cert_manager_webhook"),
+        k8s_provider,
+        release,
+    )
+
     # Create a self-signed ClusterIssuer resource
     cluster_issuer_root = CustomResource(
         "cluster-selfsigned-issuer-root",
@@ -1,7 +1,11 @@
+import yaml
 import pulumi
 import pulumi_kubernetes as k8s
 from pulumi_kubernetes.apiextensions import CustomResource
 from src.lib.helm_chart_versions import get_latest_helm_chart_version
+from src.lib.sizing import component_values, merge_values
+from src.lib.priority import priority_class_name, qos_resources
+from src.lib.placement import node_placement
 
 
 def deploy_cilium(
@@ -14,9 +18,16 @@ def deploy_cilium(
     version: str,
     l2_bridge_name: str,
     l2announcements: str,
+    profile: str = "dev",
+    datapath_overrides: dict = None,
+    bgp_config: dict = None,
+    devices: list = None,
+    sizing: dict = None,
+    priority: dict = None,
+    placement: dict = None,
 ):
     """
-    Deploy Cilium CNI with L2 Announcements enabled
+    Deploy Cilium CNI with L2 Announcements or the BGP control plane enabled
 
     Args:
         name: Name for the Cilium deployment
@@ -28,6 +39,13 @@ def deploy_cilium(
         version: Version of Cilium to deploy
         l2_bridge_name: Name of the L2 bridge interface (e.g. br0)
         l2announcements: CIDR block for L2 announcements (e.g. 192.168.1.70/28)
+        profile: Datapath performance profile (dev, throughput, low-latency)
+        datapath_overrides: Per-key overrides applied on top of the profile
+        bgp_config: BGP control plane config, replaces L2 announcements when enabled
+        devices: Host interfaces Cilium attaches to (default: br+ bond+ thunderbolt+)
+        sizing: Sizing plan from compute_sizing for the agent, operator and Hubble relay
+        priority: Priority tiers from get_priority_config, datapath for the agent and envoy
+        placement: Node placement from get_placement_config, infra for the operator and Hubble
 
     Returns:
         Tuple containing:
@@ -57,9 +75,28 @@ def deploy_cilium(
         opts=pulumi.ResourceOptions(provider=k8s_provider),
     )
 
-    # 3. Prepare Helm values
+    # 3. Resolve and validate the datapath profile before touching the cluster
+    datapath = get_datapath_config(profile, datapath_overrides)
+    validate_datapath_config(kubernetes_distribution, datapath)
+    pulumi.log.info(f"Using Cilium datapath profile: {profile}")
+    if kubernetes_distribution == "talos":
+        talos_patch = gen_talos_dns_patch(datapath)
+        pulumi.export("cilium_talos_patch", yaml.safe_dump(talos_patch, sort_keys=False))
+        # Talos forwards kube-dns to the host by default
+        if not datapath["host_dns_forwarding"]:
+            pulumi.log.warn(
+                "cilium: apply cilium_talos_patch with `talosctl patch machineconfig --nodes <address> "
+                "--patch @<file>` on every node, eBPF host routing breaks DNS while Talos forwards kube-dns"
+            )
+    bgp = get_bgp_config(bgp_config, l2announcements)
+
+    # 4. Prepare Helm values
     base_values = get_helm_values(
-        kubernetes_distribution, project_name, kubernetes_endpoint_service_address
+        kubernetes_distribution,
+        project_name,
+        kubernetes_endpoint_service_address,
+        datapath,
+        devices,
     )
 
     helm_values = {
@@ -85,7 +122,42 @@ def deploy_cilium(
         },
     }
 
-    # 4. Deploy Cilium with Helm (depends on CRDs)
+    # BGP advertises every LB IP from every node so no per-service leases are needed
+    if bgp["enabled"]:
+        helm_values["bgpControlPlane"] = {"enabled": True}
+        helm_values["l2announcements"] = {"enabled": False}
+
+    # Sized agent resources, operator and Hubble relay resources and replicas
+    if sizing:
+        helm_values = merge_values(helm_values, {
+            **component_values(sizing, "cilium_agent"),
+            "operator": component_values(sizing, "cilium_operator", "replicas"),
+            "hubble": {"relay": component_values(sizing, "hubble_relay", "replicas")},
+        })
+
+    # Node agents run in the datapath tier, the operator keeps the chart's
+    # system-cluster-critical class
+    if priority:
+        helm_values = merge_values(helm_values, {
+            "priorityClassName": priority_class_name(priority, "datapath"),
+            "envoy": {"priorityClassName": priority_class_name(priority, "datapath")},
+        })
+        # Init containers count towards the pod QoS class, they get the agent's resources
+        agent_resources = qos_resources(priority, "cilium_agent", helm_values.get("resources"))
+        if agent_resources and agent_resources != helm_values.get("resources"):
+            helm_values["resources"] = agent_resources
+            helm_values["initResources"] = agent_resources
+
+    # Agents run on every node. The operator and Hubble keep the chart's
+    # tolerations, the operator must schedule before the CNI is ready.
+    if placement:
+        infra_selector = {"nodeSelector": node_placement(placement, "infra").get("nodeSelector") or {}}
+        helm_values = merge_values(helm_values, {
+            "operator": infra_selector,
+            "hubble": {"relay": infra_selector, "ui": infra_selector},
+        })
+
+    # 5. Deploy Cilium with Helm (depends on CRDs)
     release = k8s.helm.v3.Release(
         name,
         chart="cilium",
@@ -102,7 +174,97 @@ def deploy_cilium(
         ),
     )
 
-    # 5. Create L2 announcement resources (depends on Cilium release)
+    # 6. Create load balancer announcement resources (depends on Cilium release)
+    if bgp["enabled"]:
+        lb_resources = create_bgp_control_plane_resources(
+            name=name,
+            namespace=namespace,
+            k8s_provider=k8s_provider,
+            bgp=bgp,
+            depends_on=[release],
+        )
+        lb_cidr = bgp["pools"][0]
+    else:
+        lb_resources = create_l2_announcement_resources(
+            name=name,
+            namespace=namespace,
+            k8s_provider=k8s_provider,
+            l2_bridge_name=l2_bridge_name,
+            l2announcements=l2announcements,
+            depends_on=[release],
+        )
+        lb_cidr = l2announcements
+
+    # 7. Create Hubble Gateway resources (depends on Cilium and LB resources)
+    gateway, http_route = create_hubble_gateway(
+        name=name,
+        namespace=namespace,
+        k8s_provider=k8s_provider,
+        l2announcements=lb_cidr,
+        depends_on=[release, *lb_resources],
+    )
+
+    return version, release, gateway, http_route
+
+
+def get_bgp_config(bgp_config: dict, l2announcements: str) -> dict:
+    """
+    Normalize the BGP control plane stack config and apply defaults
+
+    Args:
+        bgp_config: Raw `cilium.bgp` stack config
+        l2announcements: L2 announcement CIDR used as the default advertised pool
+
+    Returns:
+        Dict of resolved BGP settings
+    """
+    bgp_config = bgp_config or {}
+    enabled = str(bgp_config.get("enabled")).lower() == "true"
+
+    bgp = {
+        "enabled": enabled,
+        "local_asn": int(bgp_config.get("local_asn") or 64512),
+        "peers": bgp_config.get("peers") or [],
+        "pools": bgp_config.get("pools") or [l2announcements],
+        "node_selector": bgp_config.get("node_selector") or {},
+        "hold_time_seconds": int(bgp_config.get("hold_time_seconds") or 9),
+        "keepalive_time_seconds": int(bgp_config.get("keepalive_time_seconds") or 3),
+    }
+
+    if not enabled:
+        return bgp
+
+    if not bgp["peers"]:
+        raise ValueError("Cilium BGP control plane requires at least one peer")
+    for peer in bgp["peers"]:
+        if not peer.get("address") or not peer.get("asn"):
+            raise ValueError(f"Cilium BGP peer requires address and asn: {peer}")
+
+    return bgp
+
+
+def create_l2_announcement_resources(
+    name: str,
+    namespace: str,
+    k8s_provider: k8s.Provider,
+    l2_bridge_name: str,
+    l2announcements: str,
+    depends_on: list = None,
+):
+    """
+    Create the L2 announcement IP pool and policy
+
+    Args:
+        name: Name for the Cilium deployment
+        namespace: Namespace Cilium is deployed into
+        k8s_provider: Kubernetes provider instance
+        l2_bridge_name: Name of the L2 bridge interface (e.g. br0)
+        l2announcements: CIDR block for L2 announcements
+        depends_on: List of resources to depend on
+
+    Returns:
+        List of created resources
+    """
     cilium_load_balancer_ip_pool = k8s.apiextensions.CustomResource(
         "cilium-l2-ip-pool",
         api_version="cilium.io/v2alpha1",
@@ -118,7 +280,7 @@ def deploy_cilium(
         spec={"blocks": [{"cidr": l2announcements}]},
         opts=pulumi.ResourceOptions(
             provider=k8s_provider,
-            depends_on=[release],
+            depends_on=depends_on,
             custom_timeouts=pulumi.CustomTimeouts(
                 create="8m", update="8m", delete="2m"
             ),
@@ -145,33 +307,309 @@ def deploy_cilium(
         },
         opts=pulumi.ResourceOptions(
             provider=k8s_provider,
-            depends_on=[release, cilium_load_balancer_ip_pool],
+            depends_on=[*(depends_on or []), cilium_load_balancer_ip_pool],
             custom_timeouts=pulumi.CustomTimeouts(
                 create="8m", update="8m", delete="2m"
             ),
         ),
     )
 
-    # 6. Create Hubble Gateway resources (depends on Cilium and L2 resources)
-    gateway, http_route = create_hubble_gateway(
-        name=name,
-        namespace=namespace,
-        k8s_provider=k8s_provider,
-        l2announcements=l2announcements,
-        depends_on=[
-            release,
-            cilium_load_balancer_ip_pool,
-            cilium_l2_announcement_policy,
-        ],
+    return [cilium_load_balancer_ip_pool, cilium_l2_announcement_policy]
+
+
+def create_bgp_control_plane_resources(
+    name: str,
+    namespace: str,
+    k8s_provider: k8s.Provider,
+    bgp: dict,
+    depends_on: list = None,
+):
+    """
+    Create the BGP IP pool, peer, advertisement and cluster config resources
+
+    Every selected node peers with every configured router and advertises all
+    LoadBalancer IPs, so upstream routers can ECMP-spread service traffic.
+
+    Args:
+        name: Name for the Cilium deployment
+        namespace: Namespace Cilium is deployed into
+        k8s_provider: Kubernetes provider instance
+        bgp: Resolved BGP settings from get_bgp_config
+        depends_on: List of resources to depend on
+
+    Returns:
+        List of created resources
+    """
+    labels = {
+        "app.kubernetes.io/managed-by": "pulumi",
+        "app.kubernetes.io/name": name,
+    }
+    opts = pulumi.ResourceOptions(
+        provider=k8s_provider,
+        depends_on=depends_on,
+        custom_timeouts=pulumi.CustomTimeouts(create="8m", update="8m", delete="2m"),
     )
 
-    return version, release, gateway, http_route
+    cilium_load_balancer_ip_pool = CustomResource(
+        "cilium-bgp-ip-pool",
+        api_version="cilium.io/v2alpha1",
+        kind="CiliumLoadBalancerIPPool",
+        metadata={"name": "bgp-default", "namespace": namespace, "labels": labels},
+        spec={"blocks": [{"cidr": cidr} for cidr in bgp["pools"]]},
+        opts=opts,
+    )
+
+    cilium_bgp_advertisement = CustomResource(
+        "cilium-bgp-advertisement",
+        api_version="cilium.io/v2alpha1",
+        kind="CiliumBGPAdvertisement",
+        metadata={
+            "name": "bgp-default",
+            "labels": {**labels, "kargo.ccio.io/bgp-advertise": "default"},
+        },
+        spec={
+            "advertisements": [
+                {
+                    "advertisementType": "Service",
+                    "service": {"addresses": ["LoadBalancerIP"]},
+                    # Match every service, an empty selector matches none
+                    "selector": {
+                        "matchExpressions": [
+                            {
+                                "key": "kargo.ccio.io/bgp-exclude",
+                                "operator": "DoesNotExist",
+                            }
+                        ]
+                    },
+                }
+            ]
+        },
+        opts=opts,
+    )
+
+    cilium_bgp_peer_config = CustomResource(
+        "cilium-bgp-peer-config",
+        api_version="cilium.io/v2alpha1",
+        kind="CiliumBGPPeerConfig",
+        metadata={"name": "bgp-default", "labels": labels},
+        spec={
+            "timers": {
+                "holdTimeSeconds": bgp["hold_time_seconds"],
+                "keepAliveTimeSeconds": bgp["keepalive_time_seconds"],
+            },
+            "gracefulRestart": {"enabled": True, "restartTimeSeconds": 15},
+            "families": [
+                {
+                    "afi": "ipv4",
+                    "safi": "unicast",
+                    "advertisements": {
+                        "matchLabels": {"kargo.ccio.io/bgp-advertise": "default"}
+                    },
+                }
+            ],
+        },
+        opts=opts,
+    )
+
+    cilium_bgp_cluster_config = CustomResource(
+        "cilium-bgp-cluster-config",
+        api_version="cilium.io/v2alpha1",
+        kind="CiliumBGPClusterConfig",
+        metadata={"name": "bgp-default", "labels": labels},
+        spec={
+            "nodeSelector": {"matchLabels": bgp["node_selector"]},
+            "bgpInstances": [
+                {
+                    "name": f"instance-{bgp['local_asn']}",
+                    "localASN": bgp["local_asn"],
+                    "peers": [
+                        {
+                            "name": peer.get("name") or f"peer-{index}",
+                            "peerASN": int(peer["asn"]),
+                            "peerAddress": peer["address"],
+                            "peerConfigRef": {"name": "bgp-default"},
+                        }
+                        for index, peer in enumerate(bgp["peers"])
+                    ],
+                }
+            ],
+        },
+        opts=pulumi.ResourceOptions.merge(
+            opts, pulumi.ResourceOptions(depends_on=[cilium_bgp_peer_config])
+        ),
+    )
+
+    return [
+        cilium_load_balancer_ip_pool,
+        cilium_bgp_advertisement,
+        cilium_bgp_peer_config,
+        cilium_bgp_cluster_config,
+    ]
+
+
+# Named datapath performance profiles
+# Every profile sets every key so that overrides are always a partial update
+CILIUM_DATAPATH_PROFILES = {
+    # Matches the historical hard-coded values: verbose and conservative
+    "dev": {
+        "debug": True,
+        "host_legacy_routing": True,
+        "host_dns_forwarding": True,
+        "bandwidth_manager": False,
+        "bbr": False,
+        "big_tcp": False,
+        "device_mode": "veth",
+        "xdp_acceleration": "disabled",
+        "load_balancer_mode": "snat",
+    },
+    # Bulk east-west and VM traffic: eBPF host routing, BBR and BIG TCP
+    "throughput": {
+        "debug": False,
+        "host_legacy_routing": False,
+        "host_dns_forwarding": False,
+        "bandwidth_manager": True,
+        "bbr": True,
+        "big_tcp": True,
+        "device_mode": "netkit",
+        "xdp_acceleration": "native",
+        "load_balancer_mode": "snat",
+    },
+    # Request/response traffic: skip BIG TCP GSO batching, keep XDP and netkit
+    "low-latency": {
+        "debug": False,
+        "host_legacy_routing": False,
+        "host_dns_forwarding": False,
+        "bandwidth_manager": True,
+        "bbr": True,
+        "big_tcp": False,
+        "device_mode": "netkit",
+        "xdp_acceleration": "native",
+        "load_balancer_mode": "snat",
+    },
+}
+
+CILIUM_DEVICE_MODES = ("veth", "netkit", "netkit-l2")
+CILIUM_XDP_ACCELERATION_MODES = ("disabled", "native", "best-effort")
+# Every profile uses snat, dsr degraded throughput severely on these clusters
+CILIUM_LOAD_BALANCER_MODES = ("snat", "dsr", "hybrid")
+
+
+def get_datapath_config(profile: str, overrides: dict = None) -> dict:
+    """
+    Resolve a named datapath profile merged with per-key stack config overrides
+
+    Args:
+        profile: Name of the datapath profile (dev, throughput, low-latency)
+        overrides: Dict of datapath keys overriding the profile defaults
+
+    Returns:
+        Dict of resolved datapath settings
+    """
+    if profile not in CILIUM_DATAPATH_PROFILES:
+        raise ValueError(
+            f"Unsupported Cilium datapath profile: {profile}. "
+            f"Expected one of: {', '.join(CILIUM_DATAPATH_PROFILES)}"
+        )
+
+    datapath = dict(CILIUM_DATAPATH_PROFILES[profile])
+    for key, value in (overrides or {}).items():
+        if key not in datapath:
+            raise ValueError(f"Unknown Cilium datapath setting: {key}")
+        if value is not None:
+            datapath[key] = value
+
+    return datapath
+
+
+def validate_datapath_config(kubernetes_distribution: str, datapath: dict):
+    """
+    Reject datapath combinations known to break on the kind/talos deployment paths
+
+    Args:
+        kubernetes_distribution: Type of k8s distribution (kind, talos)
+        datapath: Resolved datapath settings from get_datapath_config
+
+    Raises:
+        ValueError: If the combination is not supported
+    """
+    errors = []
+
+    if datapath["device_mode"] not in CILIUM_DEVICE_MODES:
+        errors.append(f"device_mode must be one of {CILIUM_DEVICE_MODES}")
+    if datapath["xdp_acceleration"] not in CILIUM_XDP_ACCELERATION_MODES:
+        errors.append(
+            f"xdp_acceleration must be one of {CILIUM_XDP_ACCELERATION_MODES}"
+        )
+    if datapath["load_balancer_mode"] not in CILIUM_LOAD_BALANCER_MODES:
+        errors.append(
+            f"load_balancer_mode must be one of {CILIUM_LOAD_BALANCER_MODES}"
+        )
+
+    # BBR is implemented by the bandwidth manager
+    if datapath["bbr"] and not datapath["bandwidth_manager"]:
+        errors.append("bbr requires bandwidth_manager to be enabled")
+
+    # BBR pacing and BIG TCP GSO/GRO sizes only survive the eBPF host routing path
+    if datapath["bbr"] and datapath["host_legacy_routing"]:
+        errors.append("bbr requires host_legacy_routing to be disabled")
+    if datapath["big_tcp"] and datapath["host_legacy_routing"]:
+        errors.append("big_tcp requires host_legacy_routing to be disabled")
+
+    # netkit devices are only wired up by eBPF host routing
+    if datapath["device_mode"] != "veth" and datapath["host_legacy_routing"]:
+        errors.append(
+            f"device_mode {datapath['device_mode']} requires "
+            "host_legacy_routing to be disabled"
+        )
+
+    if kubernetes_distribution == "kind":
+        # kind nodes are containers attached to a docker veth bridge which has
+        # no native XDP driver and no GSO/GRO support for BIG TCP
+        if datapath["xdp_acceleration"] != "disabled":
+            errors.append("xdp_acceleration is not supported on kind")
+        if datapath["big_tcp"]:
+            errors.append("big_tcp is not supported on kind")
+    elif kubernetes_distribution == "talos":
+        # Talos forwards kube-dns to the host resolver by default which
+        # requires legacy host routing: https://github.com/cilium/cilium/pull/36852
+        if datapath["host_dns_forwarding"] and not datapath["host_legacy_routing"]:
+            errors.append(
+                "eBPF host routing requires host_dns_forwarding to be disabled "
+                "on talos (machine.features.hostDNS.forwardKubeDNSToHost: false)"
+            )
+
+    if errors:
+        raise ValueError(
+            f"Invalid Cilium datapath configuration for {kubernetes_distribution}: "
+            + "; ".join(errors)
+        )
+
+
+def gen_talos_dns_patch(datapath: dict) -> dict:
+    """
+    Talos machine config patch matching host_dns_forwarding
+
+    Cilium cannot change the node config, so the kube-dns forwarding to the
+    Talos host resolver is rendered as a patch applied with talosctl.
+    """
+    return {
+        "machine": {
+            "features": {
+                "hostDNS": {
+                    "enabled": True,
+                    "forwardKubeDNSToHost": bool(datapath["host_dns_forwarding"]),
+                }
+            }
+        }
+    }
 
 
 def get_helm_values(
     kubernetes_distribution: str,
     project_name: str,
     kubernetes_endpoint_service_address: str,
+    datapath: dict = None,
+    devices: list = None,
 ):
     """
     Get Helm values for Cilium deployment based on k8s distribution
@@ -180,26 +618,39 @@ def get_helm_values(
         kubernetes_distribution: Type of k8s distribution (kind, talos)
         project_name: Name of the Pulumi project
         kubernetes_endpoint_service_address: K8s API endpoint address
+        datapath: Resolved datapath settings (defaults to the dev profile)
+        devices: Host interfaces Cilium attaches to
 
     Returns:
         Dict of Helm values for Cilium deployment
     """
+    if datapath is None:
+        datapath = get_datapath_config("dev")
+
+    # Masquerade on the first concrete device, the inventory lists the uplink first
+    masquerade_interface = next((device for device in devices or [] if not device.endswith("+")), "br0")
+
     # Common Cilium Helm Chart Values
     common_values = {
         "autoDirectNodeRoutes": True,
         "bpf": {
             "masquerade": True,
-            "masqueradeInterface": "br0",
-            "masqueradeEgressInterface": "br0",
-            # bug: https://github.com/cilium/cilium/pull/36852
-            # https://docs.cilium.io/en/latest/installation/k8s-install-helm/#install-cilium
-            # TODO: bpf bug requires hostLegacyRouting to be true as a workaround for now
-            "hostLegacyRouting": True,
+            "masqueradeInterface": masquerade_interface,
+            "masqueradeEgressInterface": masquerade_interface,
+            # Set by the datapath profile, see validate_datapath_config for the
+            # combinations that require legacy host routing
+            "hostLegacyRouting": datapath["host_legacy_routing"],
+            "datapathMode": datapath["device_mode"],
+        },
+        "bandwidthManager": {
+            "enabled": datapath["bandwidth_manager"],
+            "bbr": datapath["bbr"],
         },
+        "enableIPv4BIGTCP": datapath["big_tcp"],
         "cgroup": {"autoMount": {"enabled": False}, "hostRoot": "/sys/fs/cgroup"},
         "cluster": {"name": "pulumi"},
         "cni": {"exclusive": False, "install": True},
-        "devices": "br+ bond+ thunderbolt+",
+        "devices": " ".join(devices) if devices else "br+ bond+ thunderbolt+",
         "enableRuntimeDeviceDetection": True,
         "endpointRoutes": {"enabled": True},
         "externalIPs": {"enabled": True},
@@ -241,8 +692,12 @@ def get_helm_values(
             "leaseRenewDeadline": "5s",
             "leaseRetryPeriod": "2s",
         },
-        # Use snat, do not use dsr due to extreme performance degredation
-        "loadBalancer": {"algorithm": "maglev", "mode": "snat"},
+        # Mode and acceleration come from CILIUM_DATAPATH_PROFILES
+        "loadBalancer": {
+            "algorithm": "maglev",
+            "mode": datapath["load_balancer_mode"],
+            "acceleration": datapath["xdp_acceleration"],
+        },
         "localRedirectPolicy": True,
         "nodePort": {"enabled": True},
         "operator": {"replicas": 1, "rollOutPods": True},
@@ -272,7 +727,7 @@ def get_helm_values(
         },
         "tunnelProtocol": "vxlan",
         "metrics": {"enabled": True},
-        "debug": {"enabled": True},
+        "debug": {"enabled": datapath["debug"]},
     }
 
     # For the kind distribution, we only need to override the k8s service endpoint
@@ -291,60 +746,6 @@ def get_helm_values(
         )
 
 
-# Deploy test loadbalancer service
-def deploy_test_service(namespace: str, k8s_provider: k8s.Provider):
-    """
-    Deploy test nginx pod and LoadBalancer service to validate L2 announcements
-
-    Args:
-        namespace: Namespace to deploy test service into
-        k8s_provider: Kubernetes provider instance
-
-    Returns:
-        Tuple containing:
-        - Nginx Pod
-        - Nginx LoadBalancer Service
-    """
-
-    # Development only:
-    # nginx pod and loadbalancer service resources are being committed
-    # to test the Cilium L2 announcement policy and LoadBalancerIPPool
-    # These resources will be removed before MVP release.
-    # Define nginx Pod resource
-    nginx_pod = k8s.core.v1.Pod(
-        "nginx_pod",
-        namespace=namespace,
-        metadata={"name": "nginx", "labels": {"app": "nginx"}},
-        spec=k8s.core.v1.PodSpecArgs(
-            containers=[
-                k8s.core.v1.ContainerArgs(
-                    name="nginx",
-                    image="nginx:latest",
-                    ports=[k8s.core.v1.ContainerPortArgs(container_port=80)],
-                )
-            ]
-        ),
-        opts=pulumi.ResourceOptions(provider=k8s_provider),
-    )
-
-    # Define nginx LoadBalancer Service resource
-    nginx_load_balancer_service = k8s.core.v1.Service(
-        "nginx_load_balancer",
-        namespace=namespace,
-        metadata={"name": "nginx-loadbalancer"},
-        spec=k8s.core.v1.ServiceSpecArgs(
-            type="LoadBalancer",
-            selector={"app": "nginx"},
-            ports=[
-                k8s.core.v1.ServicePortArgs(protocol="TCP", port=80, target_port=80)
-            ],
-        ),
-        opts=pulumi.ResourceOptions(provider=k8s_provider),
-    )
-
-    return nginx_pod, nginx_load_balancer_service
-
-
 def create_hubble_gateway(
     name: str,
     namespace: str,
@@ -1,14 +1,145 @@
 import os
+import json
 import requests
 import pulumi
 import pulumi_kubernetes as k8s
 from pulumi_kubernetes.apiextensions.CustomResource import CustomResource
 from src.lib.namespace import create_namespace
+from src.lib.placement import placement_transformation
+
+# NetworkAddonsConfig component keys by stack config name
+CNAO_COMPONENTS = {
+    "linux_bridge": "linuxBridge",
+    "macvtap": "macvtap",
+    "ovs": "ovs",
+    "kube_mac_pool": "kubeMacPool",
+    "multus_dynamic_networks": "multusDynamicNetworks",
+}
+
+CNAO_NETWORK_TYPES = ("macvtap", "ovs")
+
+
+def get_cnao_config(config: dict) -> dict:
+    """
+    Normalize and validate the CNAO stack config
+
+    Args:
+        config: Raw `cnao` stack config
+
+    Returns:
+        Dict with enabled components, kubeMacPool range, macvtap devices,
+        secondary networks and placement
+    """
+    config = config or {}
+    components_config = config.get("components") or {}
+
+    unknown = set(components_config) - set(CNAO_COMPONENTS)
+    if unknown:
+        raise ValueError(f"Unknown CNAO components: {', '.join(sorted(unknown))}")
+
+    # linuxBridge stays on by default, everything else is opt-in
+    components = {
+        name: str(components_config.get(name, name == "linux_bridge")).lower() == "true"
+        for name in CNAO_COMPONENTS
+    }
+
+    mac_pool_config = config.get("kube_mac_pool") or {}
+    macvtap_devices = (config.get("macvtap") or {}).get("devices") or []
+    networks = config.get("networks") or []
+
+    for network in networks:
+        if network.get("type") not in CNAO_NETWORK_TYPES:
+            raise ValueError(
+                f"CNAO network {network.get('name')} type must be one of {CNAO_NETWORK_TYPES}"
+            )
+        if not components[network["type"]]:
+            raise ValueError(
+                f"CNAO network {network.get('name')} requires cnao.components.{network['type']}"
+            )
+        if network["type"] == "macvtap" and not network.get("device"):
+            raise ValueError(f"CNAO macvtap network {network.get('name')} requires a device")
+        if network["type"] == "ovs" and not network.get("bridge"):
+            raise ValueError(f"CNAO ovs network {network.get('name')} requires a bridge")
+
+    return {
+        "components": components,
+        "kube_mac_pool": {
+            "rangeStart": mac_pool_config.get("range_start") or "02:00:00:00:00:00",
+            "rangeEnd": mac_pool_config.get("range_end") or "FD:FF:FF:FF:FF:FF",
+        },
+        "macvtap_devices": macvtap_devices,
+        "networks": networks,
+        "placement": config.get("placement") or {},
+    }
+
+
+def gen_placement_configuration(placement: dict) -> dict:
+    """
+    Render the NetworkAddonsConfig placementConfiguration block
+
+    Args:
+        placement: Dict with optional `infra` and `workloads` entries, each
+            holding `node_selector`, `tolerations` and `affinity`
+
+    Returns:
+        placementConfiguration dict, empty when nothing is configured
+    """
+    placement_configuration = {}
+    for tier in ("infra", "workloads"):
+        tier_config = placement.get(tier) or {}
+        rendered = {}
+        if tier_config.get("node_selector"):
+            rendered["nodeSelector"] = tier_config["node_selector"]
+        if tier_config.get("tolerations"):
+            rendered["tolerations"] = tier_config["tolerations"]
+        if tier_config.get("affinity"):
+            rendered["affinity"] = tier_config["affinity"]
+        if rendered:
+            placement_configuration[tier] = rendered
+    return placement_configuration
+
+
+def gen_network_attachment_definition(network: dict):
+    """
+    Render the resource annotation and CNI config for a macvtap or OVS network
+
+    Args:
+        network: CNAO network dict (name, type, device/bridge, vlan, mtu)
+
+    Returns:
+        Tuple of (annotations, CNI config JSON string)
+    """
+    if network["type"] == "macvtap":
+        resource_name = f"macvtap.network.kubevirt.io/{network['device']}"
+        cni_config = {
+            "cniVersion": "0.3.1",
+            "name": network["name"],
+            "type": "macvtap",
+        }
+    else:
+        resource_name = f"ovs-cni.network.kubevirt.io/{network['bridge']}"
+        cni_config = {
+            "cniVersion": "0.4.0",
+            "name": network["name"],
+            "type": "ovs",
+            "bridge": network["bridge"],
+        }
+        if network.get("vlan") is not None:
+            cni_config["vlan"] = int(network["vlan"])
+
+    if network.get("mtu") is not None:
+        cni_config["mtu"] = int(network["mtu"])
+
+    annotations = {"k8s.v1.cni.cncf.io/resourceName": resource_name}
+    return annotations, json.dumps(cni_config)
+
 
 def deploy_cnao(
         depends,
         version: str,
-        k8s_provider: k8s.Provider
+        k8s_provider: k8s.Provider,
+        config: dict = None,
+        placement: dict = None
     ):
 
     # Create namespace
@@ -60,6 +191,7 @@ def deploy_cnao(
     nado_operator_resource = k8s.yaml.ConfigFile(
         "network-addons-operator",
         file=operator_manifest_url,
+        transformations=[placement_transformation(placement, "infra")],
         opts=pulumi.ResourceOptions(
             parent=nado_crd_resource,
             depends_on=depends,
@@ -72,6 +204,57 @@ def deploy_cnao(
         )
     )
 
+    cnao_config = get_cnao_config(config)
+    components = cnao_config["components"]
+
+    network_addons_spec = {
+        "imagePullPolicy": "IfNotPresent",
+        "selfSignConfiguration": {
+            "caRotateInterval": "168h",
+            "caOverlapInterval": "24h",
+            "certRotateInterval": "24h",
+            "certOverlapInterval": "8h",
+        }
+    }
+    for name, key in CNAO_COMPONENTS.items():
+        if components[name]:
+            network_addons_spec[key] = {}
+
+    # Stable MACs across VM restarts and migrations at fleet scale
+    if components["kube_mac_pool"]:
+        network_addons_spec["kubeMacPool"] = cnao_config["kube_mac_pool"]
+
+    # cnao.placement replaces the stack wide placement policy
+    placement_configuration = gen_placement_configuration(cnao_config["placement"] or placement or {})
+    if placement_configuration:
+        network_addons_spec["placementConfiguration"] = placement_configuration
+
+    # The macvtap device plugin only advertises lower devices listed here
+    nac_depends = list(depends)
+    if components["macvtap"]:
+        macvtap_devices = [
+            {
+                "name": device["name"],
+                "lowerDevice": device.get("lower_device") or device["name"],
+                "mode": device.get("mode") or "bridge",
+                "capacity": int(device.get("capacity") or 50),
+            }
+            for device in cnao_config["macvtap_devices"]
+        ]
+        macvtap_config = k8s.core.v1.ConfigMap(
+            "macvtap-deviceplugin-config",
+            metadata=k8s.meta.v1.ObjectMetaArgs(
+                name="macvtap-deviceplugin-config",
+                namespace=ns_name,
+            ),
+            data={"DP_MACVTAP_CONF": json.dumps(macvtap_devices)},
+            opts=pulumi.ResourceOptions(
+                parent=namespace,
+                provider=k8s_provider,
+            )
+        )
+        nac_depends.append(macvtap_config)
+
     network_addons_config = CustomResource(
         "network-addons-config",
         api_version="networkaddonsoperator.network.kubevirt.io/v1",
@@ -81,7 +264,7 @@ def deploy_cnao(
         },
         opts=pulumi.ResourceOptions(
             parent=namespace,
-            depends_on=depends,
+            depends_on=nac_depends,
             provider=k8s_provider,
             custom_timeouts=pulumi.CustomTimeouts(
                 create="8m",
@@ -89,45 +272,33 @@ def deploy_cnao(
                 delete="2m"
             )
         ),
-        spec={
-            "linuxBridge": {},
-            "imagePullPolicy": "IfNotPresent",
-            "selfSignConfiguration": {
-                "caRotateInterval": "168h",
-                "caOverlapInterval": "24h",
-                "certRotateInterval": "24h",
-                "certOverlapInterval": "8h",
-            }
-        }
+        spec=network_addons_spec
     )
-            #"multus": {},
-            #"macvtap": {},
-            #"multusDynamicNetworks": {},
-            #"kubeSecondaryDNS": {},
-            #"kubeMacPool": {},
-            #"ovs": {},
-            #},
-            #"placementConfiguration": {
-            #    "workloads": {
-            #        "nodeSelector": {
-            #            "node-role.kubernetes.io/worker": "",
-            #        }
-            #    },
-            #    "infra": {
-            #        "affinity": {
-            #            "nodeAffinity": {
-            #                "requiredDuringSchedulingIgnoredDuringExecution": {
-            #                    "nodeSelectorTerms": [{
-            #                        "matchExpressions": [{
-            #                            "key": "node-role.kubernetes.io/worker",
-            #                            "operator": "Exists",
-            #                        }]
-            #                    }]
-            #                }
-            #            }
-            #        }
-            #    }
-            #},
+
+    # Secondary macvtap and OVS networks usable from the VM builders
+    for network in cnao_config["networks"]:
+        network_namespace = network.get("namespace") or "default"
+        annotations, cni_config = gen_network_attachment_definition(network)
+        CustomResource(
+            f"cnao-net-attach-def-{network_namespace}-{network['name']}",
+            api_version="k8s.cni.cncf.io/v1",
+            kind="NetworkAttachmentDefinition",
+            metadata={
+                "name": network["name"],
+                "namespace": network_namespace,
+                "annotations": annotations,
+            },
+            spec={"config": cni_config},
+            opts=pulumi.ResourceOptions(
+                parent=network_addons_config,
+                provider=k8s_provider,
+                custom_timeouts=pulumi.CustomTimeouts(
+                    create="5m",
+                    update="5m",
+                    delete="5m"
+                )
+            )
+        )
 
     return version, nado_operator_resource
 
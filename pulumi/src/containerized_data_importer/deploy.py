@@ -3,11 +3,138 @@ import pulumi
 import pulumi_kubernetes as k8s
 from pulumi_kubernetes.apiextensions.CustomResource import CustomResource
 from pulumi_kubernetes.meta.v1 import ObjectMetaArgs
+from src.registry_cache.deploy import mirror_image
+from src.lib.priority import priority_class_name
+from src.lib.placement import node_placement
+
+def gen_cdi_config(config_cdi: dict, registry_cache: dict = None) -> dict:
+    """
+    Build the CDI CR spec.config block from the `cdi` stack config
+
+    Importer/uploader/cloner pods share podResourceRequirements, scratch
+    space is placed on a dedicated (fast, local) storage class and the
+    filesystem overhead reserved on Filesystem volumes is tunable.
+    Importers may pull from the plain HTTP registry cache when one is set.
+    """
+    cdi_config = {
+        "featureGates": [
+            "HonorWaitForFirstConsumer",
+        ],
+    }
+
+    pod_resources = config_cdi.get("pod_resources") or {}
+    if pod_resources:
+        cdi_config["podResourceRequirements"] = {
+            "requests": pod_resources.get("requests") or {},
+            "limits": pod_resources.get("limits") or {},
+        }
+
+    if config_cdi.get("scratch_space_storage_class"):
+        cdi_config["scratchSpaceStorageClass"] = config_cdi["scratch_space_storage_class"]
+
+    filesystem_overhead = config_cdi.get("filesystem_overhead") or {}
+    if filesystem_overhead:
+        cdi_config["filesystemOverhead"] = {}
+        if filesystem_overhead.get("global") is not None:
+            cdi_config["filesystemOverhead"]["global"] = str(filesystem_overhead["global"])
+        if filesystem_overhead.get("storage_classes"):
+            cdi_config["filesystemOverhead"]["storageClass"] = {
+                name: str(value)
+                for name, value in filesystem_overhead["storage_classes"].items()
+            }
+
+    if config_cdi.get("upload_proxy_url"):
+        cdi_config["uploadProxyURLOverride"] = config_cdi["upload_proxy_url"]
+
+    if config_cdi.get("preallocation") is not None:
+        cdi_config["preallocation"] = str(config_cdi["preallocation"]).lower() == "true"
+
+    if registry_cache:
+        cdi_config["insecureRegistries"] = [mirror["cluster_endpoint"] for mirror in registry_cache["mirrors"]]
+
+    return cdi_config
+
+
+def deploy_golden_images(
+        golden_images: list,
+        cdi_resource,
+        k8s_provider: k8s.Provider,
+        registry_cache: dict = None,
+        priority: dict = None
+    ):
+    """
+    Deploy a DataImportCron per golden image
+
+    Each cron keeps a PVC of the latest image digest and publishes it as a
+    DataSource, so VM DataVolumes clone in-cluster instead of re-importing
+    from the registry. Node pulls use the node registry mirrors, pod pulls
+    are pointed at registry_cache directly.
+    """
+    crons = []
+    for image in golden_images:
+        name = image["name"]
+        namespace = image.get("namespace") or "default"
+        pull_method = image.get("pull_method") or "node"
+        pull_image = image["image"] if pull_method == "node" else mirror_image(image["image"], registry_cache)
+
+        storage = {
+            "resources": {
+                "requests": {"storage": f"{image.get('size') or '32'}Gi"},
+            },
+        }
+        if image.get("storage_class"):
+            storage["storageClassName"] = image["storage_class"]
+
+        data_volume_spec = {
+            "source": {
+                "registry": {
+                    "url": f"docker://{pull_image}",
+                    # Reuse the node container image cache for the pull
+                    "pullMethod": pull_method,
+                },
+            },
+            "storage": storage,
+        }
+        # Importer pods of the virtualization tier
+        if priority:
+            data_volume_spec["priorityClassName"] = priority_class_name(priority, "virtualization")
+
+        cron = CustomResource(
+            f"cdi-golden-image-{name}",
+            api_version="cdi.kubevirt.io/v1beta1",
+            kind="DataImportCron",
+            metadata={
+                "name": f"{name}-image-cron",
+                "namespace": namespace,
+            },
+            spec={
+                "template": {
+                    "spec": data_volume_spec,
+                },
+                "schedule": image.get("schedule") or "0 */12 * * *",
+                "garbageCollect": "Outdated",
+                "importsToKeep": int(image.get("imports_to_keep") or 2),
+                "managedDataSource": name,
+            },
+            opts=pulumi.ResourceOptions(
+                provider=k8s_provider,
+                parent=cdi_resource,
+                depends_on=[cdi_resource]
+            )
+        )
+        crons.append(cron)
+
+    return crons
+
 
 def deploy_cdi(
         depends,
         version: str,
-        k8s_provider: k8s.Provider
+        k8s_provider: k8s.Provider,
+        config_cdi: dict = None,
+        registry_cache: dict = None,
+        priority: dict = None,
+        placement: dict = None
     ):
 
     # Fetch the latest stable version of CDI
@@ -31,6 +158,32 @@ def deploy_cdi(
         )
     )
 
+    cdi_spec = {
+        "config": gen_cdi_config(config_cdi or {}, registry_cache),
+        "imagePullPolicy": "IfNotPresent",
+        # Controllers on infra nodes, importer, uploader and cloner pods on workload
+        # nodes next to the node local volumes they fill
+        "infra": node_placement(placement, "infra", {
+            "nodeSelector": {
+                "kubernetes.io/os": "linux",
+            },
+            "tolerations": [
+                {
+                    "key": "CriticalAddonsOnly",
+                    "operator": "Exists",
+                },
+            ],
+        }),
+        "workload": node_placement(placement, "workloads", {
+            "nodeSelector": {
+                "kubernetes.io/os": "linux",
+            },
+        }),
+    }
+    # Applies to the CDI control plane, importer pods take theirs from the DataVolume
+    if priority:
+        cdi_spec["priorityClass"] = priority_class_name(priority, "virtualization")
+
     # Deploy the default CDI custom resource
     cdi_resource = CustomResource(
         "cdi",
@@ -40,30 +193,7 @@ def deploy_cdi(
             "name": "cdi",
             "namespace": "cdi",
         },
-        spec={
-            "config": {
-                "featureGates": [
-                    "HonorWaitForFirstConsumer",
-                ],
-            },
-            "imagePullPolicy": "IfNotPresent",
-            "infra": {
-                "nodeSelector": {
-                    "kubernetes.io/os": "linux",
-                },
-                "tolerations": [
-                    {
-                        "key": "CriticalAddonsOnly",
-                        "operator": "Exists",
-                    },
-                ],
-            },
-            "workload": {
-                "nodeSelector": {
-                    "kubernetes.io/os": "linux",
-                },
-            },
-        },
+        spec=cdi_spec,
         opts=pulumi.ResourceOptions(
             provider=k8s_provider,
             parent=operator,
@@ -71,4 +201,38 @@ def deploy_cdi(
         )
     )
 
+    # Expose the upload proxy for src.containerized_data_importer.upload clients
+    upload_proxy_node_port = (config_cdi or {}).get("upload_proxy_node_port")
+    if upload_proxy_node_port:
+        k8s.core.v1.Service(
+            "cdi-uploadproxy-nodeport",
+            metadata=ObjectMetaArgs(
+                name="cdi-uploadproxy-nodeport",
+                namespace="cdi",
+            ),
+            spec=k8s.core.v1.ServiceSpecArgs(
+                type="NodePort",
+                selector={"cdi.kubevirt.io": "cdi-uploadproxy"},
+                ports=[k8s.core.v1.ServicePortArgs(
+                    name="https",
+                    port=443,
+                    target_port=8443,
+                    node_port=int(upload_proxy_node_port),
+                )],
+            ),
+            opts=pulumi.ResourceOptions(
+                provider=k8s_provider,
+                parent=cdi_resource,
+                depends_on=[cdi_resource]
+            )
+        )
+
+    deploy_golden_images(
+        (config_cdi or {}).get("golden_images") or [],
+        cdi_resource,
+        k8s_provider,
+        registry_cache,
+        priority
+    )
+
     return version, operator
@@ -0,0 +1,299 @@
+"""
+Stream local disk images into CDI upload DataVolumes.
+
+For each image an upload DataVolume is created, an upload token is requested
+and the image is streamed to the CDI upload proxy. Files are sent with
+sendfile(2) over plain HTTP and from an mmap over TLS, so image data is never
+copied through Python buffers. Several images upload in parallel, and images
+whose DataVolume already succeeded are skipped, so re-running an interrupted
+batch resumes where it stopped.
+
+Usage:
+    python -m src.containerized_data_importer.upload talos.qcow2 ubuntu.raw=ubuntu-golden
+
+    # Against a local stand-in (hack/cdi-upload-proxy.py), without a cluster
+    python -m src.containerized_data_importer.upload --url http://127.0.0.1:8443 --token test image.raw
+"""
+import os
+import re
+import ssl
+import sys
+import json
+import math
+import mmap
+import time
+import struct
+import logging
+import argparse
+import threading
+import subprocess
+import http.client
+from dataclasses import dataclass
+from typing import List, Optional
+from urllib.parse import urlsplit
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+UPLOAD_PATH = "/v1beta1/upload"
+QCOW2_MAGIC = b"QFI\xfb"
+GiB = 1024 * 1024 * 1024
+MiB = 1024 * 1024
+
+
+class UploadError(Exception):
+    """Raised when an image cannot be uploaded."""
+
+
+@dataclass(frozen=True)
+class UploadTarget:
+    """A local image and the DataVolume it is uploaded into."""
+    path: str
+    name: str
+
+
+def parse_target(value: str) -> UploadTarget:
+    """Parse `path[=name]`, deriving a DNS-safe DataVolume name from the file name."""
+    path, _, name = value.partition("=")
+    if not name:
+        name = os.path.basename(path).split(".")[0]
+        name = re.sub(r"[^a-z0-9-]+", "-", name.lower()).strip("-")
+    return UploadTarget(path=path, name=name)
+
+
+def image_virtual_size(path: str) -> int:
+    """Disk size in bytes: the virtual size from a qcow2 header, else the file size."""
+    with open(path, "rb") as f:
+        header = f.read(32)
+    if header[:4] == QCOW2_MAGIC:
+        return struct.unpack(">Q", header[24:32])[0]
+    return os.path.getsize(path)
+
+
+def datavolume_size(path: str, overhead: float = 0.1) -> str:
+    """DataVolume request that fits the image plus filesystem overhead, in whole GiB."""
+    return f"{math.ceil(image_virtual_size(path) * (1 + overhead) / GiB)}Gi"
+
+
+def kubectl(args: List[str], manifest: dict = None) -> str:
+    result = subprocess.run(
+        ["kubectl", *args],
+        input=json.dumps(manifest) if manifest else None,
+        check=True,
+        capture_output=True,
+        text=True,
+    )
+    return result.stdout.strip()
+
+
+def get_upload_proxy_url() -> str:
+    """Upload proxy URL published by CDI, set with cdi.upload_proxy_url."""
+    url = kubectl(["get", "cdiconfig", "config", "-o", "jsonpath={.status.uploadProxyURL}"])
+    if not url:
+        raise UploadError("CDI has no upload proxy URL, set cdi.upload_proxy_url or pass --url")
+    return url if "://" in url else f"https://{url}"
+
+
+def get_datavolume_phase(name: str, namespace: str) -> Optional[str]:
+    phase = kubectl([
+        "get", "datavolume", name,
+        "--namespace", namespace,
+        "--ignore-not-found",
+        "-o", "jsonpath={.status.phase}",
+    ])
+    return phase or None
+
+
+def create_upload_datavolume(name: str, namespace: str, size: str, storage_class: str = None):
+    storage = {"resources": {"requests": {"storage": size}}}
+    if storage_class:
+        storage["storageClassName"] = storage_class
+
+    kubectl(["create", "-f", "-"], {
+        "apiVersion": "cdi.kubevirt.io/v1beta1",
+        "kind": "DataVolume",
+        "metadata": {"name": name, "namespace": namespace},
+        "spec": {"source": {"upload": {}}, "storage": storage},
+    })
+
+
+def wait_upload_ready(name: str, namespace: str, timeout: int):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        phase = get_datavolume_phase(name, namespace)
+        if phase == "UploadReady":
+            return
+        if phase == "Failed":
+            raise UploadError(f"DataVolume {namespace}/{name} failed")
+        time.sleep(2)
+    raise UploadError(f"Timed out waiting for DataVolume {namespace}/{name} to be UploadReady")
+
+
+def request_upload_token(name: str, namespace: str) -> str:
+    return kubectl(["create", "-f", "-", "-o", "jsonpath={.status.token}"], {
+        "apiVersion": "upload.cdi.kubevirt.io/v1beta1",
+        "kind": "UploadTokenRequest",
+        "metadata": {"name": name, "namespace": namespace},
+        "spec": {"pvcName": name},
+    })
+
+
+class Progress:
+    """Logs percent complete and throughput for one upload at a fixed interval."""
+
+    def __init__(self, name: str, total: int, interval: float = 5.0):
+        self.name = name
+        self.total = total
+        self.interval = interval
+        self.started = time.monotonic()
+        self.last_report = self.started
+
+    def update(self, sent: int):
+        now = time.monotonic()
+        if now - self.last_report < self.interval and sent < self.total:
+            return
+        self.last_report = now
+        elapsed = max(now - self.started, 1e-6)
+        logging.info(
+            f"{self.name}: {sent / MiB:.0f}/{self.total / MiB:.0f} MiB "
+            f"({sent * 100 / self.total:.1f}%) at {sent / MiB / elapsed:.1f} MiB/s"
+        )
+
+
+def send_file(sock, f, size: int, chunk_size: int, progress: Progress):
+    """Send the whole file in chunk_size pieces, reporting progress after each one."""
+    offset = 0
+    if isinstance(sock, ssl.SSLSocket):
+        # TLS is encrypted in userspace, send slices of the page cache mapping
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            view = memoryview(mapped)
+            try:
+                while offset < size:
+                    end = min(offset + chunk_size, size)
+                    sock.sendall(view[offset:end])
+                    offset = end
+                    progress.update(offset)
+            finally:
+                view.release()
+    else:
+        while offset < size:
+            offset += sock.sendfile(f, offset, min(chunk_size, size - offset))
+            progress.update(offset)
+
+
+def stream_image(
+        url: str,
+        token: str,
+        path: str,
+        name: str,
+        insecure: bool = False,
+        chunk_size: int = 64 * MiB,
+        timeout: int = 3600
+    ) -> float:
+    """
+    POST an image to the upload proxy.
+
+    Returns:
+        float: Throughput in MiB/s
+    """
+    size = os.path.getsize(path)
+    if size == 0:
+        raise UploadError(f"{path} is empty")
+
+    parts = urlsplit(url)
+    if parts.scheme == "https":
+        context = ssl.create_default_context()
+        if insecure:
+            context.check_hostname = False
+            context.verify_mode = ssl.CERT_NONE
+        conn = http.client.HTTPSConnection(parts.hostname, parts.port or 443, timeout=timeout, context=context)
+    else:
+        conn = http.client.HTTPConnection(parts.hostname, parts.port or 80, timeout=timeout)
+
+    progress = Progress(name, size)
+    try:
+        conn.putrequest("POST", parts.path.rstrip("/") + UPLOAD_PATH)
+        conn.putheader("Authorization", f"Bearer {token}")
+        conn.putheader("Content-Type", "application/octet-stream")
+        conn.putheader("Content-Length", str(size))
+        conn.endheaders()
+
+        with open(path, "rb") as f:
+            send_file(conn.sock, f, size, chunk_size, progress)
+
+        response = conn.getresponse()
+        body = response.read().decode(errors="replace").strip()
+    finally:
+        conn.close()
+
+    if response.status != 200:
+        raise UploadError(f"{name}: upload proxy returned {response.status} {body}")
+
+    return size / MiB / max(time.monotonic() - progress.started, 1e-6)
+
+
+def upload_image(target: UploadTarget, args: argparse.Namespace, url: str) -> str:
+    """Upload one image, retrying failed transfers against a fresh upload token."""
+    if args.token:
+        # Stand-in mode, no DataVolume bookkeeping
+        throughput = stream_image(url, args.token, target.path, target.name, args.insecure, args.chunk_size * MiB)
+        return f"{target.name}: uploaded at {throughput:.1f} MiB/s"
+
+    phase = get_datavolume_phase(target.name, args.namespace)
+    if phase == "Succeeded":
+        return f"{target.name}: DataVolume already populated, skipped"
+    if phase is None:
+        size = args.size or datavolume_size(target.path)
+        create_upload_datavolume(target.name, args.namespace, size, args.storage_class)
+        logging.info(f"{target.name}: created upload DataVolume {args.namespace}/{target.name} ({size})")
+
+    for attempt in range(1, args.retries + 1):
+        try:
+            wait_upload_ready(target.name, args.namespace, args.ready_timeout)
+            token = request_upload_token(target.name, args.namespace)
+            throughput = stream_image(url, token, target.path, target.name, args.insecure, args.chunk_size * MiB)
+            return f"{target.name}: uploaded at {throughput:.1f} MiB/s"
+        except (OSError, http.client.HTTPException, UploadError) as e:
+            if attempt == args.retries:
+                raise
+            logging.warning(f"{target.name}: attempt {attempt} failed, retrying: {e}")
+            time.sleep(min(2 ** attempt, 30))
+
+
+def main(argv: List[str] = None) -> int:
+    parser = argparse.ArgumentParser(description="Upload local disk images into CDI DataVolumes")
+    parser.add_argument("images", nargs="+", help="Image path, optionally with a DataVolume name: path[=name]")
+    parser.add_argument("--namespace", default="default", help="DataVolume namespace")
+    parser.add_argument("--size", help="DataVolume size, e.g. 32Gi (default: image virtual size + 10%%)")
+    parser.add_argument("--storage-class", help="DataVolume StorageClass")
+    parser.add_argument("--url", help="Upload proxy URL (default: CDIConfig status.uploadProxyURL)")
+    parser.add_argument("--token", help="Static upload token, skips DataVolume creation (for stand-ins)")
+    parser.add_argument("--insecure", action="store_true", help="Skip upload proxy TLS verification")
+    parser.add_argument("--parallel", type=int, default=2, help="Images uploaded concurrently")
+    parser.add_argument("--chunk-size", type=int, default=64, help="Send and progress granularity in MiB")
+    parser.add_argument("--retries", type=int, default=3, help="Attempts per image")
+    parser.add_argument("--ready-timeout", type=int, default=600, help="Seconds to wait for UploadReady")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(message)s")
+
+    targets = [parse_target(image) for image in args.images]
+    for target in targets:
+        if not os.path.isfile(target.path):
+            parser.error(f"{target.path} is not a file")
+
+    url = args.url or get_upload_proxy_url()
+
+    failed = 0
+    with ThreadPoolExecutor(max_workers=max(1, args.parallel)) as executor:
+        futures = {executor.submit(upload_image, target, args, url): target for target in targets}
+        for future in as_completed(futures):
+            try:
+                logging.info(future.result())
+            except (OSError, subprocess.CalledProcessError, http.client.HTTPException, UploadError) as e:
+                failed += 1
+                logging.error(f"{futures[future].name}: upload failed: {e}")
+
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
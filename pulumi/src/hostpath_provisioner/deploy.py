@@ -6,6 +6,45 @@ from pulumi_kubernetes.apiextensions import CustomResource
 from pulumi_kubernetes.meta.v1 import ObjectMetaArgs
 from pulumi_kubernetes.storage.v1 import StorageClass
 from src.lib.namespace import create_namespace
+from src.lib.priority import priority_class_name, priority_transformation
+from src.lib.placement import placement_transformation
+
+
+def get_storage_pools(storage_pools: list, hostpath: str, default: bool) -> list:
+    """
+    Normalize the storage pool list from stack config.
+
+    Without configured pools a single `ssd` pool at the default path is used.
+    """
+    if not storage_pools:
+        storage_pools = [{"name": "ssd", "path": hostpath, "default": default}]
+
+    normalized = []
+    for pool in storage_pools:
+        if not pool.get("name") or not pool.get("path"):
+            raise ValueError(f"HPP storage pool requires a name and path: {pool}")
+
+        volume_binding_mode = pool.get("volume_binding_mode") or "WaitForFirstConsumer"
+        if volume_binding_mode not in ("WaitForFirstConsumer", "Immediate"):
+            raise ValueError(
+                f"HPP storage pool {pool['name']} has invalid volume_binding_mode: {volume_binding_mode}"
+            )
+
+        normalized.append(
+            {
+                "name": pool["name"],
+                "path": pool["path"],
+                "storage_class": pool.get("storage_class") or pool["name"],
+                "default": str(pool.get("default")).lower() == "true",
+                "volume_binding_mode": volume_binding_mode,
+                "node_selector": pool.get("node_selector") or {},
+            }
+        )
+
+    if sum(pool["default"] for pool in normalized) > 1:
+        raise ValueError("Only one HPP storage pool can be the default storage class")
+
+    return normalized
 
 
 def deploy(
@@ -15,6 +54,9 @@ def deploy(
     hostpath: str,
     default: bool,
     k8s_provider: k8s.Provider,
+    storage_pools: list = None,
+    priority: dict = None,
+    placement: dict = None,
 ):
 
     # If version is not supplied, fetch the latest stable version
@@ -156,6 +198,10 @@ def deploy(
     webhook = k8s.yaml.ConfigFile(
         "hostpath-provisioner-webhook",
         file=url_webhook,
+        transformations=[
+            priority_transformation(priority_class_name(priority, "storage")),
+            placement_transformation(placement, "infra"),
+        ],
         opts=ResourceOptions(
             parent=namespace,
             depends_on=[pod_reader_binding, csi_storage_binding],
@@ -172,6 +218,10 @@ def deploy(
     operator = k8s.yaml.ConfigFile(
         "hostpath-provisioner-operator",
         file=url_operator,
+        transformations=[
+            priority_transformation(priority_class_name(priority, "storage")),
+            placement_transformation(placement, "infra"),
+        ],
         opts=ResourceOptions(
             parent=namespace,
             depends_on=[webhook],
@@ -198,7 +248,17 @@ def deploy(
         ),
     )
 
-    # Create a HostPathProvisioner resource
+    pools = get_storage_pools(storage_pools, hostpath, default)
+
+    # Node local volumes back VM disks on workload nodes and platform PVCs on
+    # infra nodes, the CSI node plugin tolerates both tiers
+    workload_placement = {"nodeSelector": {"kubernetes.io/os": "linux"}}
+    if placement:
+        tolerations = [*placement["infra"]["tolerations"], *placement["workloads"]["tolerations"]]
+        if tolerations:
+            workload_placement["tolerations"] = tolerations
+
+    # Create a HostPathProvisioner resource with one storage pool per tier
     hostpath_provisioner = CustomResource(
         "hostpath-provisioner-hpp",
         api_version="hostpathprovisioner.kubevirt.io/v1beta1",
@@ -206,8 +266,10 @@ def deploy(
         metadata={"name": "hostpath-provisioner-class-ssd", "namespace": ns_name},
         spec={
             "imagePullPolicy": "IfNotPresent",
-            "storagePools": [{"name": "ssd", "path": hostpath}],
-            "workload": {"nodeSelector": {"kubernetes.io/os": "linux"}},
+            "storagePools": [
+                {"name": pool["name"], "path": pool["path"]} for pool in pools
+            ],
+            "workload": workload_placement,
         },
         opts=pulumi.ResourceOptions(
             parent=namespace,
@@ -220,31 +282,50 @@ def deploy(
         ),
     )
 
-    # Define the StorageClass
-    storage_class = StorageClass(
-        "hostpath-storage-class-ssd",
-        metadata=ObjectMetaArgs(
-            name="ssd",
-            annotations={
-                "storageclass.kubernetes.io/is-default-class": (
-                    "true" if default else "false"
+    # Define one StorageClass per pool. WaitForFirstConsumer defers binding
+    # until the VM is scheduled so the disk lands on the node that runs it.
+    # The CSIDriver belongs to the operator and HPP's csi-provisioner does not
+    # publish CSIStorageCapacity, so pool capacity is only planned by src.vm.capacity.
+    for pool in pools:
+        allowed_topologies = None
+        if pool["node_selector"]:
+            allowed_topologies = [
+                k8s.core.v1.TopologySelectorTermArgs(
+                    match_label_expressions=[
+                        k8s.core.v1.TopologySelectorLabelRequirementArgs(
+                            key=key, values=[str(value)]
+                        )
+                        for key, value in pool["node_selector"].items()
+                    ]
                 )
+            ]
+
+        StorageClass(
+            f"hostpath-storage-class-{pool['name']}",
+            metadata=ObjectMetaArgs(
+                name=pool["storage_class"],
+                annotations={
+                    "storageclass.kubernetes.io/is-default-class": (
+                        "true" if pool["default"] else "false"
+                    )
+                },
+            ),
+            reclaim_policy="Delete",
+            provisioner="kubevirt.io.hostpath-provisioner",
+            volume_binding_mode=pool["volume_binding_mode"],
+            allowed_topologies=allowed_topologies,
+            parameters={
+                "storagePool": pool["name"],
             },
-        ),
-        reclaim_policy="Delete",
-        provisioner="kubevirt.io.hostpath-provisioner",
-        volume_binding_mode="Immediate",
-        parameters={
-            "storagePool": "ssd",
-        },
-        opts=ResourceOptions(
-            parent=namespace,
-            depends_on=[hostpath_provisioner],
-            provider=k8s_provider,
-            custom_timeouts=pulumi.CustomTimeouts(
-                create="8m", update="8m", delete="2m"
+            opts=ResourceOptions(
+                parent=namespace,
+                depends_on=[hostpath_provisioner],
+                provider=k8s_provider,
+                delete_before_replace=True,
+                custom_timeouts=pulumi.CustomTimeouts(
+                    create="8m", update="8m", delete="2m"
+                ),
             ),
-        ),
-    )
+        )
 
     return version, webhook  # operator
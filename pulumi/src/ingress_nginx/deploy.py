@@ -8,11 +8,18 @@ from pulumi_kubernetes.meta.v1 import ObjectMetaArgs
 from pulumi_kubernetes.storage.v1 import StorageClass
 from src.lib.namespace import create_namespace
 from src.lib.helm_chart_versions import get_latest_helm_chart_version
+from src.lib.sizing import component_values, merge_values
+from src.lib.priority import priority_class_name
+from src.lib.placement import node_placement
 
 def deploy_ingress_nginx(
         version: str,
         ns_name: str,
         k8s_provider: k8s.Provider,
+        sizing: dict = None,
+        hpa: dict = None,
+        priority: dict = None,
+        placement: dict = None,
     ):
 
     # Create namespace
@@ -62,6 +69,34 @@ def deploy_ingress_nginx(
             }
         }
 
+    # Sized controller resources and replicas
+    if sizing:
+        helm_values["controller"] = merge_values(
+            helm_values.get("controller", {}),
+            component_values(sizing, "ingress_nginx", "replicaCount"),
+        )
+
+    # The chart drops the replica count when autoscaling is enabled
+    if hpa and hpa.get("ingress_nginx"):
+        controller_hpa = hpa["ingress_nginx"]
+        autoscaling = {
+            "enabled": True,
+            "minReplicas": int(controller_hpa["min_replicas"]),
+            "maxReplicas": int(controller_hpa["max_replicas"]),
+            "targetCPUUtilizationPercentage": controller_hpa["cpu_utilization"],
+            "targetMemoryUtilizationPercentage": controller_hpa["memory_utilization"],
+            "behavior": {"scaleDown": {"stabilizationWindowSeconds": int(controller_hpa["scale_down_window"])}},
+        }
+        helm_values["controller"] = merge_values(helm_values.get("controller", {}), {"autoscaling": autoscaling})
+
+    if priority:
+        helm_values["controller"] = merge_values(
+            helm_values.get("controller", {}), {"priorityClassName": priority_class_name(priority, "ui")}
+        )
+
+    if placement:
+        helm_values["controller"] = merge_values(helm_values.get("controller", {}), node_placement(placement, "infra"))
+
     chart_name = "ingress-nginx"
     chart_index_path = "index.yaml"
     chart_url = "https://kubernetes.github.io/ingress-nginx"
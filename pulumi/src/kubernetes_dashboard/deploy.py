@@ -2,6 +2,10 @@ import pulumi
 import pulumi_kubernetes as k8s
 from src.lib.namespace import create_namespace
 from src.lib.helm_chart_versions import get_latest_helm_chart_version
+from src.lib.sizing import component_values, merge_values
+from src.lib.autoscaling import create_hpa
+from src.lib.priority import priority_class_name
+from src.lib.placement import node_placement
 import json
 
 def sanitize_name(name: str) -> str:
@@ -16,7 +20,11 @@ def deploy_kubernetes_dashboard(
         ns_name: str,
         version: str,
         k8s_provider: k8s.Provider,
-        openunison_enabled: bool
+        openunison_enabled: bool,
+        sizing: dict = None,
+        hpa: dict = None,
+        priority: dict = None,
+        placement: dict = None
     ):
 
     # Create namespace
@@ -53,6 +61,36 @@ def deploy_kubernetes_dashboard(
 
     helm_values = gen_helm_values(openunison_enabled)
 
+    # Sized api and web container resources and replicas
+    if sizing:
+        for component in ("api", "web"):
+            sized = component_values(sizing, f"dashboard_{component}", "replicas")
+            helm_values = merge_values(helm_values, {
+                component: {
+                    "scaling": {"replicas": sized["replicas"]} if "replicas" in sized else {},
+                    "containers": {"resources": sized["resources"]},
+                }
+            })
+
+    # An autoscaled Deployment takes its replicas from the HPA, a value set here
+    # would reset them on every release upgrade
+    for component in ("api", "web"):
+        if (hpa or {}).get(f"dashboard_{component}"):
+            helm_values.get(component, {}).get("scaling", {}).pop("replicas", None)
+
+    # Common to the api, auth, web and metrics scraper Deployments
+    if priority:
+        helm_values = merge_values(helm_values, {"app": {"priorityClassName": priority_class_name(priority, "ui")}})
+
+    if placement:
+        infra = node_placement(placement, "infra")
+        helm_values = merge_values(helm_values, {
+            "app": {
+                "scheduling": {"nodeSelector": infra.get("nodeSelector") or {}},
+                "tolerations": infra.get("tolerations") or [],
+            }
+        })
+
     release = k8s.helm.v3.Release(
             "kubernetes-dashboard",
             k8s.helm.v3.ReleaseArgs(
@@ -77,6 +115,16 @@ def deploy_kubernetes_dashboard(
             )
         )
 
+    # The chart has no autoscaling values, the api and web Deployments are named after the release
+    for component in ("api", "web"):
+        create_hpa(
+            f"kubernetes-dashboard-{component}",
+            ns_name,
+            release.name.apply(lambda name, component=component: f"{name}-{component}"),
+            (hpa or {}).get(f"dashboard_{component}"),
+            k8s_provider,
+            release,
+        )
 
     return version, release
 
@@ -1,3 +1,4 @@
+import json
 import requests
 import yaml
 import tempfile
@@ -8,6 +9,267 @@ import pulumi_kubernetes as k8s
 from pulumi_kubernetes.apiextensions.CustomResource import CustomResource
 from pulumi_kubernetes.meta.v1 import ObjectMetaArgs
 from src.lib.namespace import create_namespace
+from src.multus.deploy import gen_bridge_cni_config
+from src.lib.placement import PLACEMENT_TIERS, node_placement, set_placement
+
+KUBEVIRT_PROFILES = {
+    # Matches the historical hard-coded values: verbose logging, no tuning
+    "development": {
+        # 1-Error, 2-Warn, 3-Info, 4-Debug, 5-Trace
+        # 6-TraceAll, 7-DebugAll, 8-InfoAll, 9-WarnAll, 10-ErrorAll
+        "log_verbosity": {
+            "virtLauncher": 2,
+            "virtHandler": 3,
+            "virtController": 4,
+            "virtAPI": 5,
+            "virtOperator": 6,
+        },
+        "memory_overcommit": 100,
+        "free_page_reporting": True,
+        "cpu_manager": False,
+        "virt_handler_resources": None,
+        "guest_memory_overhead_ratio": None,
+    },
+    # Warn level logging, guaranteed memory and dedicated CPU support
+    "production": {
+        "log_verbosity": {
+            "virtLauncher": 2,
+            "virtHandler": 2,
+            "virtController": 2,
+            "virtAPI": 2,
+            "virtOperator": 2,
+        },
+        "memory_overcommit": 100,
+        # Page reporting costs guest and host CPU on every free, skip it when memory is not shared
+        "free_page_reporting": False,
+        "cpu_manager": True,
+        "virt_handler_resources": {
+            "requests": {"cpu": "100m", "memory": "384Mi"},
+            "limits": {"memory": "1Gi"},
+        },
+        "guest_memory_overhead_ratio": "1.2",
+    },
+    # Pack more VMs per node: overcommit memory and hand freed guest pages back
+    "dense": {
+        "log_verbosity": {
+            "virtLauncher": 2,
+            "virtHandler": 2,
+            "virtController": 2,
+            "virtAPI": 2,
+            "virtOperator": 2,
+        },
+        "memory_overcommit": 150,
+        "free_page_reporting": True,
+        "cpu_manager": False,
+        "virt_handler_resources": {
+            "requests": {"cpu": "50m", "memory": "256Mi"},
+            "limits": {"memory": "768Mi"},
+        },
+        "guest_memory_overhead_ratio": None,
+    },
+}
+
+
+def get_profile_config(profile: str, overrides: dict = None) -> dict:
+    """
+    Resolve a named KubeVirt profile merged with per-key stack config overrides
+
+    Args:
+        profile: Name of the profile (development, production, dense)
+        overrides: Dict of profile keys overriding the profile defaults
+
+    Returns:
+        Dict of resolved profile settings
+    """
+    if profile not in KUBEVIRT_PROFILES:
+        raise ValueError(
+            f"Unsupported KubeVirt profile: {profile}. "
+            f"Expected one of: {', '.join(KUBEVIRT_PROFILES)}"
+        )
+
+    tuning = dict(KUBEVIRT_PROFILES[profile])
+    for key, value in (overrides or {}).items():
+        if key not in tuning:
+            raise ValueError(f"Unknown KubeVirt tuning setting: {key}")
+        if value is not None:
+            tuning[key] = value
+
+    if int(tuning["memory_overcommit"]) < 100:
+        raise ValueError("kubevirt.tuning.memory_overcommit must be at least 100 (percent)")
+    if tuning["guest_memory_overhead_ratio"] and float(tuning["guest_memory_overhead_ratio"]) < 1.0:
+        raise ValueError("kubevirt.tuning.guest_memory_overhead_ratio must be at least 1.0")
+    if tuning["cpu_manager"] and int(tuning["memory_overcommit"]) > 100:
+        # Dedicated CPUs need Guaranteed QoS, overcommit lowers memory requests below limits
+        pulumi.log.warn("KubeVirt memory_overcommit prevents Guaranteed QoS for VMs with dedicated CPUs")
+
+    return tuning
+
+
+def gen_virt_handler_patch(resources: dict) -> dict:
+    """
+    customizeComponents patch setting virt-handler container resources
+
+    Args:
+        resources: Kubernetes resources dict (requests, limits)
+
+    Returns:
+        KubeVirt CR customizeComponents patch entry
+    """
+    return {
+        "resourceType": "DaemonSet",
+        "resourceName": "virt-handler",
+        "type": "strategic",
+        "patch": json.dumps({
+            "spec": {
+                "template": {
+                    "spec": {
+                        "containers": [{"name": "virt-handler", "resources": resources}],
+                    },
+                },
+            },
+        }),
+    }
+
+
+def get_migration_config(config_migration: dict, bridge_name: str = "br0") -> dict:
+    """
+    Normalize the `kubevirt.migration` stack config
+
+    Defaults match KubeVirt upstream apart from bandwidth, which is only
+    limited when configured.
+
+    Args:
+        config_migration: `kubevirt.migration` stack config
+        bridge_name: Host bridge for the migration network when not configured
+
+    Returns:
+        Normalized migration config
+    """
+    config_migration = config_migration or {}
+
+    migration = {
+        "parallel_migrations_per_cluster": int(config_migration.get("parallel_migrations_per_cluster") or 5),
+        "parallel_outbound_migrations_per_node": int(config_migration.get("parallel_outbound_migrations_per_node") or 2),
+        "bandwidth_per_migration": config_migration.get("bandwidth_per_migration"),
+        "completion_timeout_per_gib": int(config_migration.get("completion_timeout_per_gib") or 150),
+        "progress_timeout": int(config_migration.get("progress_timeout") or 150),
+        "allow_auto_converge": str(config_migration.get("allow_auto_converge")).lower() == "true",
+        "allow_post_copy": str(config_migration.get("allow_post_copy")).lower() == "true",
+        "disable_tls": str(config_migration.get("disable_tls")).lower() == "true",
+        "network": None,
+    }
+
+    if migration["parallel_outbound_migrations_per_node"] > migration["parallel_migrations_per_cluster"]:
+        raise ValueError(
+            "kubevirt.migration.parallel_outbound_migrations_per_node cannot exceed parallel_migrations_per_cluster"
+        )
+
+    network = config_migration.get("network") or {}
+    if network:
+        # No IPAM plugin is deployed with Multus, so the one named here must
+        # already be installed on every node
+        ipam = network.get("ipam")
+        if not ipam:
+            raise ValueError(
+                "kubevirt.migration.network requires an ipam config for a CNI IPAM plugin installed on every node"
+            )
+
+        migration["network"] = {
+            "name": network.get("name") or "migration-network",
+            "bridge": network.get("bridge") or bridge_name,
+            "mtu": int(network["mtu"]) if network.get("mtu") else None,
+            "vlan": int(network["vlan"]) if network.get("vlan") else None,
+            "ipam": ipam,
+        }
+    elif migration["disable_tls"]:
+        pulumi.log.warn("kubevirt.migration.disable_tls sends guest memory unencrypted over the pod network")
+
+    return migration
+
+
+def gen_migrations_spec(migration: dict) -> dict:
+    """
+    Render the KubeVirt CR configuration.migrations block
+
+    Args:
+        migration: Normalized config from get_migration_config
+
+    Returns:
+        migrations spec
+    """
+    migrations = {
+        "parallelMigrationsPerCluster": migration["parallel_migrations_per_cluster"],
+        "parallelOutboundMigrationsPerNode": migration["parallel_outbound_migrations_per_node"],
+        "completionTimeoutPerGiB": migration["completion_timeout_per_gib"],
+        "progressTimeout": migration["progress_timeout"],
+        "allowAutoConverge": migration["allow_auto_converge"],
+        "allowPostCopy": migration["allow_post_copy"],
+        "disableTLS": migration["disable_tls"],
+    }
+    if migration["bandwidth_per_migration"]:
+        migrations["bandwidthPerMigration"] = migration["bandwidth_per_migration"]
+    if migration["network"]:
+        migrations["network"] = migration["network"]["name"]
+
+    return migrations
+
+
+def deploy_migration_network(
+    depends: List[pulumi.Resource],
+    ns_name: str,
+    migration: dict,
+    k8s_provider: k8s.Provider,
+):
+    """
+    Deploy the dedicated live migration NetworkAttachmentDefinition
+
+    virt-handler attaches this network and sends migration traffic over
+    it instead of the pod network. It lives in the KubeVirt namespace and
+    needs IPs unique across nodes from the configured IPAM plugin.
+
+    Args:
+        depends: List of resources this deployment depends on, including Multus
+        ns_name: KubeVirt namespace
+        migration: Normalized config from get_migration_config
+        k8s_provider: Kubernetes provider instance
+
+    Returns:
+        NetworkAttachmentDefinition resource
+    """
+    network = migration["network"]
+
+    return CustomResource(
+        "kubevirt-migration-network",
+        api_version="k8s.cni.cncf.io/v1",
+        kind="NetworkAttachmentDefinition",
+        metadata={"name": network["name"], "namespace": ns_name},
+        spec={"config": gen_bridge_cni_config(network)},
+        opts=pulumi.ResourceOptions(
+            provider=k8s_provider,
+            depends_on=depends,
+        ),
+    )
+
+
+def validate_migratable_storage(
+    vm_name: str,
+    storage_class: str,
+    rwo_storage_classes: List[str],
+):
+    """
+    Fail early when a live migrating VM would get RWO-only disks
+
+    Args:
+        vm_name: VM or VM pool name used in the error
+        storage_class: StorageClass of the VM disks, None for the cluster default
+        rwo_storage_classes: StorageClasses known to be ReadWriteOnce only,
+            None in the list stands for an RWO-only default class
+    """
+    if storage_class in rwo_storage_classes:
+        raise ValueError(
+            f"{vm_name} is set to live migrate but its disks use the ReadWriteOnce-only "
+            f"storage class {storage_class or '(default)'}, set a ReadWriteMany storage class such as ceph-block"
+        )
 
 
 def deploy_kubevirt(
@@ -17,9 +279,14 @@ def deploy_kubevirt(
     use_emulation: bool,
     k8s_provider: k8s.Provider,
     kubernetes_distribution: str,
+    migration: dict = None,
+    tuning: dict = None,
+    placement: dict = None,
 ):
     """
-    Deploy KubeVirt with Talos-specific configuration and SELinux workaround
+    Deploy KubeVirt with Talos-specific configuration
+
+    The SELinux workaround KubeVirt needs is applied by src.node_prep.
 
     Args:
         depends: List of resources this deployment depends on
@@ -28,6 +295,9 @@ def deploy_kubevirt(
         use_emulation: Whether to use emulation mode
         k8s_provider: Kubernetes provider instance
         kubernetes_distribution: Type of k8s distribution (kind, talos)
+        migration: Normalized config from get_migration_config
+        tuning: Normalized config from get_profile_config
+        placement: Node placement from get_placement_config, virt-handler on workload nodes
 
     Returns:
         Tuple containing:
@@ -80,6 +350,7 @@ def deploy_kubevirt(
         if resource and "metadata" in resource:
             resource["metadata"]["namespace"] = ns_name
             pulumi.log.debug(f"Setting namespace for {resource['kind']} to {ns_name}")
+            set_placement(resource, placement, "infra")
         transformed_yaml.append(resource)
 
     # Write transformed YAML to temp file
@@ -109,9 +380,26 @@ def deploy_kubevirt(
     if use_emulation:
         pulumi.log.info("KVM Emulation configured for KubeVirt in development.")
 
+    tuning = tuning or get_profile_config("development")
+
+    feature_gates = [
+        "HostDevices",
+        "ExpandDisks",
+        "AutoResourceLimitsGate",
+        "NetworkBindingPlugins",
+        "LiveMigration",
+    ]
+    if tuning["cpu_manager"]:
+        # Lets VMs request dedicatedCpuPlacement on nodes with the static kubelet CPU manager
+        feature_gates.append("CPUManager")
+
+    customize_components = {}
+    if tuning["virt_handler_resources"]:
+        customize_components["patches"] = [gen_virt_handler_patch(tuning["virt_handler_resources"])]
+
     # Create the KubeVirt custom resource with configuration
     kubevirt_custom_resource_spec = {
-        "customizeComponents": {},
+        "customizeComponents": customize_components,
         "workloadUpdateStrategy": {},
         "certificateRotateStrategy": {},
         "imagePullPolicy": "IfNotPresent",
@@ -125,28 +413,37 @@ def deploy_kubevirt(
             },
             "developerConfiguration": {
                 "useEmulation": use_emulation,
-                "featureGates": [
-                    "HostDevices",
-                    "ExpandDisks",
-                    "AutoResourceLimitsGate",
-                    "NetworkBindingPlugins",
-                    "LiveMigration",
-                ],
-                # Log verbosity levels for KubeVirt components
-                # 1-Error, 2-Warn, 3-Info, 4-Debug, 5-Trace
-                # 6-TraceAll, 7-DebugAll, 8-InfoAll, 9-WarnAll, 10-ErrorAll
-                "logVerbosity": {
-                    "virtLauncher": 2,
-                    "virtHandler": 3,
-                    "virtController": 4,
-                    "virtAPI": 5,
-                    "virtOperator": 6,
-                },
+                "featureGates": feature_gates,
+                # Log verbosity levels for KubeVirt components, see KUBEVIRT_PROFILES
+                "logVerbosity": tuning["log_verbosity"],
+                "memoryOvercommit": int(tuning["memory_overcommit"]),
             },
+            "virtualMachineOptions": (
+                {} if tuning["free_page_reporting"] else {"disableFreePageReporting": {}}
+            ),
+            "migrations": gen_migrations_spec(migration or get_migration_config({})),
             "permittedHostDevices": {"pciHostDevices": []},
+            # Register the macvtap binding plugin used by CNAO macvtap networks
+            "network": {
+                "binding": {"macvtap": {"domainAttachmentType": "tap"}},
+            },
         },
     }
 
+    # virt-api and virt-controller on infra nodes, virt-handler (and so the
+    # VMs) on workload nodes
+    if placement:
+        for tier in PLACEMENT_TIERS:
+            node_placement_spec = node_placement(placement, tier)
+            if node_placement_spec:
+                kubevirt_custom_resource_spec[tier] = {"nodePlacement": node_placement_spec}
+
+    if tuning["guest_memory_overhead_ratio"]:
+        # Extra virt-launcher memory headroom above the computed guest overhead
+        kubevirt_custom_resource_spec["configuration"]["additionalGuestMemoryOverheadRatio"] = str(
+            tuning["guest_memory_overhead_ratio"]
+        )
+
     # Deploy KubeVirt CR
     kubevirt = CustomResource(
         "kubevirt",
@@ -164,49 +461,4 @@ def deploy_kubevirt(
         ),
     )
 
-    # Deploy SELinux workaround DaemonSet for Talos
-    selinux_ds = k8s.apps.v1.DaemonSet(
-        "disable-selinux",
-        metadata={
-            "name": "disable-selinux",
-            "namespace": ns_name,
-            "labels": {"app": "disable-selinux"},
-        },
-        spec={
-            "selector": {"matchLabels": {"app": "disable-selinux"}},
-            "template": {
-                "metadata": {"labels": {"app": "disable-selinux"}},
-                "spec": {
-                    "containers": [
-                        {
-                            "name": "mount",
-                            "image": "docker.io/library/alpine",
-                            "command": [
-                                "sh",
-                                "-exc",
-                                "test -f  /host/sys/fs/selinux/enforce && mount -t tmpfs tmpfs /host/sys/fs/selinux; sleep infinity",
-                            ],
-                            "securityContext": {"privileged": True},
-                            "volumeMounts": [
-                                {
-                                    "name": "host-root",
-                                    "mountPath": "/host",
-                                    "mountPropagation": "Bidirectional",
-                                }
-                            ],
-                        }
-                    ],
-                    "volumes": [{"name": "host-root", "hostPath": {"path": "/"}}],
-                    "hostIPC": True,
-                    "hostNetwork": True,
-                    "hostPID": True,
-                    "tolerations": [{"operator": "Exists"}],
-                },
-            },
-        },
-        opts=pulumi.ResourceOptions(
-            provider=k8s_provider, parent=namespace, depends_on=[operator]
-        ),
-    )
-
     return version, operator
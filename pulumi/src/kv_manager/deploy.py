@@ -6,10 +6,12 @@ from kubernetes import config, dynamic
 from kubernetes import client as k8s_client
 from kubernetes.dynamic.exceptions import ResourceNotFoundError
 from kubernetes.client import api_client
+from src.lib.priority import priority_class_name, priority_transformation
+from src.lib.placement import placement_transformation
 
 
 
-def deploy_ui_for_kubevirt(name: str, k8s_provider: Provider):
+def deploy_ui_for_kubevirt(name: str, k8s_provider: Provider, priority: dict = None, placement: dict = None):
     # Initialize Pulumi configuration
     pconfig = pulumi.Config()
 
@@ -18,6 +20,10 @@ def deploy_ui_for_kubevirt(name: str, k8s_provider: Provider):
     k8s_yaml = k8s.yaml.ConfigFile(
         "kubevirt-manager",
         file=kubevirt_manager_manifest_url,
+        transformations=[
+            priority_transformation(priority_class_name(priority, "ui")),
+            placement_transformation(placement, "infra"),
+        ],
         opts=pulumi.ResourceOptions(provider=k8s_provider)
     )
     return "1.4.1", k8s_yaml
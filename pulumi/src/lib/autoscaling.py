@@ -0,0 +1,107 @@
+from typing import Dict, Optional
+import pulumi
+import pulumi_kubernetes as k8s
+
+# HorizontalPodAutoscaler defaults per component. Utilization targets are
+# percentages of the container requests. Leader-elected controllers (the
+# cert-manager controller, the Cilium operator) only get standby replicas
+# from scaling, so cert-manager scales its admission webhook instead.
+HPA_DEFAULTS = {
+    "ingress_nginx": {"min_replicas": 1, "max_replicas": 5, "cpu_utilization": 70, "memory_utilization": 80},
+    "openunison": {"min_replicas": 1, "max_replicas": 5, "cpu_utilization": 60, "memory_utilization": 80},
+    "dashboard_api": {"min_replicas": 1, "max_replicas": 3, "cpu_utilization": 70, "memory_utilization": None},
+    "dashboard_web": {"min_replicas": 1, "max_replicas": 3, "cpu_utilization": 70, "memory_utilization": None},
+    "cert_manager_webhook": {"min_replicas": 1, "max_replicas": 3, "cpu_utilization": 70, "memory_utilization": None},
+}
+
+# Seconds of lower load before replicas are removed
+DEFAULT_SCALE_DOWN_WINDOW = 300
+
+
+def get_hpa_config(config_hpa: dict) -> Dict[str, dict]:
+    """
+    Normalize the `hpa` stack config
+
+    Every component in HPA_DEFAULTS is autoscaled unless its `enabled` is
+    false, other keys override the component defaults.
+
+    Args:
+        config_hpa: `hpa` stack config
+
+    Returns:
+        Dict of component name to HPA settings
+    """
+    unknown = set(config_hpa) - set(HPA_DEFAULTS) - {"enabled", "scale_down_window"}
+    if unknown:
+        raise ValueError(f"Unknown hpa components: {', '.join(sorted(unknown))}. Expected: {', '.join(HPA_DEFAULTS)}")
+
+    scale_down_window = int(config_hpa.get("scale_down_window") or DEFAULT_SCALE_DOWN_WINDOW)
+    hpa = {}
+    for name, defaults in HPA_DEFAULTS.items():
+        component_config = config_hpa.get(name) or {}
+        if str(component_config.get("enabled", True)).lower() == "false":
+            continue
+        component = {**defaults, "scale_down_window": scale_down_window}
+        for key, value in component_config.items():
+            if key != "enabled":
+                if key not in component:
+                    raise ValueError(f"Unknown hpa.{name} setting: {key}")
+                component[key] = value
+        if not 1 <= int(component["min_replicas"]) <= int(component["max_replicas"]):
+            raise ValueError(f"hpa.{name}: expected 1 <= min_replicas <= max_replicas")
+        hpa[name] = component
+    return hpa
+
+
+def gen_hpa_spec(target_kind: str, target_name: pulumi.Input[str], hpa: dict) -> dict:
+    """autoscaling/v2 HorizontalPodAutoscaler spec scaling on CPU and memory utilization."""
+    metrics = [
+        {
+            "type": "Resource",
+            "resource": {"name": resource, "target": {"type": "Utilization", "averageUtilization": int(hpa[key])}},
+        }
+        for resource, key in (("cpu", "cpu_utilization"), ("memory", "memory_utilization"))
+        if hpa[key]
+    ]
+    return {
+        "scaleTargetRef": {"apiVersion": "apps/v1", "kind": target_kind, "name": target_name},
+        "minReplicas": int(hpa["min_replicas"]),
+        "maxReplicas": int(hpa["max_replicas"]),
+        "metrics": metrics,
+        # Shrink back only after the burst has passed
+        "behavior": {"scaleDown": {"stabilizationWindowSeconds": int(hpa["scale_down_window"])}},
+    }
+
+
+def create_hpa(
+    name: str,
+    ns_name: str,
+    target_name: pulumi.Input[str],
+    hpa: Optional[dict],
+    k8s_provider: k8s.Provider,
+    parent: pulumi.Resource,
+) -> Optional[k8s.autoscaling.v2.HorizontalPodAutoscaler]:
+    """
+    HorizontalPodAutoscaler for a Deployment installed by a Helm chart without HPA values
+
+    Args:
+        name: HPA name
+        ns_name: Namespace of the Deployment
+        target_name: Deployment name, usually derived from the release name
+        hpa: Component settings from get_hpa_config, nothing is created when None
+        k8s_provider: Kubernetes provider instance
+        parent: Helm release creating the Deployment
+
+    Returns:
+        The HPA, None when the component is not autoscaled
+    """
+    if not hpa:
+        return None
+    return k8s.autoscaling.v2.HorizontalPodAutoscaler(
+        name,
+        metadata=k8s.meta.v1.ObjectMetaArgs(
+            name=name, namespace=ns_name, labels={"app.kubernetes.io/managed-by": "pulumi"}
+        ),
+        spec=gen_hpa_spec("Deployment", target_name, hpa),
+        opts=pulumi.ResourceOptions(provider=k8s_provider, parent=parent, depends_on=[parent]),
+    )
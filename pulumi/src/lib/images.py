@@ -0,0 +1,364 @@
+import io
+import os
+import re
+import json
+import tarfile
+from typing import List, Optional
+from urllib.parse import urljoin
+import yaml
+import requests
+import pulumi
+
+# Manifest types accepted when resolving a tag, multi-arch indexes first so
+# the digest is the same one every node architecture pulls
+MANIFEST_MEDIA_TYPES = ", ".join([
+    "application/vnd.oci.image.index.v1+json",
+    "application/vnd.docker.distribution.manifest.list.v2+json",
+    "application/vnd.oci.image.manifest.v1+json",
+    "application/vnd.docker.distribution.manifest.v2+json",
+])
+
+# Registry API hosts that differ from the registry name used in image references
+REGISTRY_API_HOSTS = {"docker.io": "registry-1.docker.io"}
+
+# Pod spec fields holding container lists
+CONTAINER_FIELDS = ("containers", "initContainers", "ephemeralContainers")
+
+# Lockfile key holding the image values of each chart version
+CHARTS_KEY = "charts"
+
+
+def split_image(image: str) -> tuple:
+    """Split an image reference into its registry and repository path, docker.io when implicit."""
+    first, _, rest = image.partition("/")
+    if rest and ("." in first or ":" in first or first == "localhost"):
+        return first, rest
+    if not rest:
+        return "docker.io", f"library/{image}"
+    return "docker.io", image
+
+
+def parse_image(image: str) -> tuple:
+    """Registry, repository and tag of an image reference, `latest` when untagged."""
+    registry, path = split_image(image)
+    repository, _, tag = path.rpartition(":")
+    if not repository or "/" in tag:
+        repository, tag = path, "latest"
+    return registry, repository, tag
+
+
+def resolve_digest(image: str, timeout: int = 10) -> str:
+    """
+    Manifest digest a tag currently points to, from the registry HTTP API
+
+    Anonymous bearer tokens are requested when the registry asks for one.
+
+    Raises:
+        requests.RequestException: If the registry cannot be reached or the tag does not exist
+    """
+    registry, repository, tag = parse_image(image)
+    url = f"https://{REGISTRY_API_HOSTS.get(registry, registry)}/v2/{repository}/manifests/{tag}"
+    headers = {"Accept": MANIFEST_MEDIA_TYPES}
+
+    response = requests.head(url, headers=headers, timeout=timeout)
+    if response.status_code == 401:
+        challenge = dict(re.findall(r'(\w+)="([^"]*)"', response.headers.get("WWW-Authenticate", "")))
+        token = requests.get(
+            challenge["realm"],
+            params={key: value for key, value in challenge.items() if key in ("service", "scope")},
+            timeout=timeout,
+        )
+        token.raise_for_status()
+        headers["Authorization"] = f"Bearer {token.json().get('token') or token.json().get('access_token')}"
+        response = requests.head(url, headers=headers, timeout=timeout)
+
+    response.raise_for_status()
+    digest = response.headers.get("Docker-Content-Digest")
+    if not digest:
+        raise requests.RequestException(f"{url} returned no Docker-Content-Digest")
+    return digest
+
+
+class ImageResolver:
+    """
+    Pins image tags to digests recorded in a lockfile
+
+    Tags are resolved once and then read from the lockfile, so pinned
+    workloads only roll out when the lockfile changes. refresh re-resolves
+    every tag once per run and rewrites the entries whose digest moved.
+    """
+
+    def __init__(self, lockfile: str, refresh: bool = False):
+        self.lockfile = lockfile
+        self.refresh = refresh
+        self.refreshed = set()
+        self.unresolved = set()
+        self.digests = {}
+        if os.path.exists(lockfile):
+            with open(lockfile, "r") as f:
+                self.digests = json.load(f)
+        self.charts = self.digests.pop(CHARTS_KEY, {})
+
+    def pin(self, image: str) -> str:
+        if "@" in image or image in self.unresolved:
+            return image
+        registry, repository, tag = parse_image(image)
+        key = f"{registry}/{repository}:{tag}"
+
+        if key not in self.digests or (self.refresh and key not in self.refreshed):
+            try:
+                digest = resolve_digest(image)
+            except (requests.RequestException, KeyError, ValueError) as e:
+                if key not in self.digests:
+                    pulumi.log.warn(f"Cannot resolve {image}, leaving it unpinned: {e}")
+                    self.unresolved.add(image)
+                    return image
+                pulumi.log.warn(f"Cannot refresh {image}, keeping the locked digest: {e}")
+            else:
+                if self.digests.get(key) != digest:
+                    if key in self.digests:
+                        pulumi.log.info(f"Image {key} moved to {digest}")
+                    self.digests[key] = digest
+                    self.save()
+            self.refreshed.add(key)
+
+        return f"{image}@{self.digests[key]}"
+
+    def chart_images(self, repo: str, chart: str, version: str) -> Optional[List[dict]]:
+        """Image values of a chart version, read from the chart once and then from the lockfile."""
+        key = f"{repo.rstrip('/')}/{chart}:{version}"
+        if key not in self.charts:
+            try:
+                self.charts[key] = read_chart_images(fetch_chart(repo, chart, version))
+            except (requests.RequestException, tarfile.TarError, KeyError, ValueError, yaml.YAMLError) as e:
+                pulumi.log.warn(f"Cannot read the images of chart {chart} {version}, leaving them unpinned: {e}")
+                return None
+            self.save()
+        return self.charts[key]
+
+    def save(self):
+        # Written on every change, ConfigFile children are registered after the program body
+        with open(self.lockfile, "w") as f:
+            json.dump({**self.digests, CHARTS_KEY: self.charts}, f, indent=2, sort_keys=True)
+            f.write("\n")
+
+
+def fetch_chart(repo: str, chart: str, version: str, timeout: int = 30) -> bytes:
+    """Packaged chart archive of a chart version from its repository index."""
+    index_url = f"{repo.rstrip('/')}/index.yaml"
+    index = requests.get(index_url, timeout=timeout)
+    index.raise_for_status()
+    entries = yaml.safe_load(index.content)["entries"][chart]
+    entry = next((entry for entry in entries if entry["version"] == version), None)
+    if entry is None:
+        raise ValueError(f"{chart} {version} is not in {index_url}")
+
+    archive = requests.get(urljoin(index_url, entry["urls"][0]), timeout=timeout)
+    archive.raise_for_status()
+    return archive.content
+
+
+def read_chart_images(content: bytes) -> List[dict]:
+    """
+    Image references in the default values of a packaged chart and its subcharts
+
+    Subchart images are nested under the subchart name, the way a parent
+    chart overrides them, and the parent's overrides are applied.
+    """
+    values, app_version = {}, None
+    subcharts = {}
+    with tarfile.open(fileobj=io.BytesIO(content), mode="r:gz") as archive:
+        for member in archive.getmembers():
+            if not member.isfile():
+                continue
+            parts = member.name.split("/")
+            data = archive.extractfile(member).read()
+            if parts[1:] == ["values.yaml"]:
+                values = yaml.safe_load(data) or {}
+            elif parts[1:] == ["Chart.yaml"]:
+                app_version = (yaml.safe_load(data) or {}).get("appVersion")
+            elif len(parts) == 3 and parts[1] == "charts" and parts[2].endswith(".tgz"):
+                subcharts[parts[2][: -len(".tgz")].rsplit("-", 1)[0]] = read_chart_images(data)
+            elif len(parts) == 4 and parts[1] == "charts" and parts[3] in ("values.yaml", "Chart.yaml"):
+                # Unpacked subchart directory
+                subcharts.setdefault(parts[2], {})[parts[3]] = data
+
+    images = find_chart_images(values, app_version)
+    for name, subchart in subcharts.items():
+        if isinstance(subchart, dict):
+            subchart = find_chart_images(
+                yaml.safe_load(subchart.get("values.yaml") or "") or {},
+                (yaml.safe_load(subchart.get("Chart.yaml") or "") or {}).get("appVersion"),
+            )
+        known = {tuple(image["path"]) for image in images}
+        for image in subchart:
+            path = [name, *image["path"]]
+            if tuple(path) in known:
+                continue
+            override = get_path(values, path)
+            if isinstance(image["image"], dict) and isinstance(override, dict):
+                image = {**image, "image": {**image["image"], **override}}
+            elif isinstance(override, str):
+                image = {**image, "image": override}
+            images.append({**image, "path": path})
+    return images
+
+
+def find_chart_images(values: dict, app_version: str = None, path: tuple = ()) -> List[dict]:
+    """
+    Image references in chart values
+
+    Finds `{registry, repository, tag}` maps and plain `image` strings. Maps
+    without a tag get the chart appVersion, the usual template default, and
+    `image` maps without a tag key at all are taken for that default too.
+
+    Returns:
+        List of the value path, the default image and the field to pin
+    """
+    images = []
+    for key, value in values.items():
+        if isinstance(value, dict):
+            is_image = "tag" in value or (app_version and key.lower().endswith("image"))
+            if isinstance(value.get("repository"), str) and is_image:
+                if "digest" in value:
+                    field = "digest"
+                elif "sha" in value:
+                    field = "sha"
+                else:
+                    field = "tag"
+                image = dict(value)
+                if not image.get("tag") and app_version:
+                    image["tag"] = str(app_version)
+                images.append({"path": [*path, key], "image": image, "field": field})
+            else:
+                images.extend(find_chart_images(value, app_version, (*path, key)))
+        elif key == "image" and isinstance(value, str) and ":" in value and "@" not in value:
+            images.append({"path": [*path, key], "image": value, "field": "image"})
+    return images
+
+
+def get_path(values: dict, path: list):
+    for key in path:
+        if not isinstance(values, dict):
+            return None
+        values = values.get(key)
+    return values
+
+
+def pin_chart_values(values: dict, chart_images: List[dict], pin) -> dict:
+    """
+    Helm values overriding every chart image with its digest, in place
+
+    Uses the chart's own digest field where it has one (`digest`, or the
+    bare hex `sha` of kube-prometheus-stack) and appends the digest to the
+    tag otherwise. Images the values already set are resolved instead of
+    the chart default.
+    """
+    for chart_image in chart_images:
+        path, field = chart_image["path"], chart_image["field"]
+        override = get_path(values, path)
+
+        if field == "image":
+            image = override if isinstance(override, str) else chart_image["image"]
+            if "@" not in image:
+                parent = values
+                for key in path[:-1]:
+                    parent = parent.setdefault(key, {})
+                parent[path[-1]] = pin(image)
+            continue
+
+        image = {**chart_image["image"], **(override if isinstance(override, dict) else {})}
+        tag = str(image.get("tag") or "")
+        # No tag is a chart without appVersion, and a set digest is pinned already
+        if not tag or "@" in tag or (field != "tag" and image.get(field)):
+            continue
+        reference = f"{image['repository']}:{tag}"
+        if image.get("registry"):
+            reference = f"{image['registry']}/{reference}"
+        pinned = pin(reference)
+        if "@" not in pinned:
+            continue
+        digest = pinned.rpartition("@")[2]
+
+        target = values
+        for key in path:
+            target = target.setdefault(key, {})
+        if field == "digest":
+            target["digest"] = digest
+            if "useDigest" in image:
+                target["useDigest"] = True
+        elif field == "sha":
+            target["sha"] = digest.partition(":")[2]
+        else:
+            target["tag"] = f"{tag}@{digest}"
+    return values
+
+
+def pin_images(obj, pin) -> None:
+    """Rewrite container and containerDisk images anywhere in a manifest fragment in place."""
+    if isinstance(obj, list):
+        for item in obj:
+            pin_images(item, pin)
+        return
+    if not isinstance(obj, dict):
+        return
+
+    for field in CONTAINER_FIELDS:
+        for container in obj.get(field) or []:
+            if isinstance(container, dict) and isinstance(container.get("image"), str):
+                container["image"] = pin(container["image"])
+
+    # KubeVirt VMs boot from container images too
+    container_disk = obj.get("containerDisk")
+    if isinstance(container_disk, dict) and isinstance(container_disk.get("image"), str):
+        container_disk["image"] = pin(container_disk["image"])
+
+    for key, value in obj.items():
+        if key not in CONTAINER_FIELDS:
+            pin_images(value, pin)
+
+
+def pin_images_transformation(resolver: ImageResolver):
+    """
+    Stack transformation pinning the images of every Kubernetes workload
+
+    Covers typed resources, CustomResources and the children of
+    k8s.yaml.ConfigFile manifests. Specs built from *Args classes are left
+    alone. Helm releases get values overriding the images of the chart's
+    default values, see pin_chart_values.
+
+    Args:
+        resolver: ImageResolver holding the lockfile
+
+    Returns:
+        Function for pulumi.runtime.register_stack_transformation
+    """
+    def transformation(args: pulumi.ResourceTransformationArgs) -> Optional[pulumi.ResourceTransformationResult]:
+        if args.type_ == "kubernetes:helm.sh/v3:Release":
+            return pin_release(args)
+        if not args.type_.startswith("kubernetes:") or args.type_.startswith("kubernetes:helm"):
+            return None
+        spec = args.props.get("spec")
+        if not isinstance(spec, dict):
+            return None
+        pin_images(spec, resolver.pin)
+        return pulumi.ResourceTransformationResult(args.props, args.opts)
+
+    def pin_release(args: pulumi.ResourceTransformationArgs) -> Optional[pulumi.ResourceTransformationResult]:
+        repository_opts = args.props.get("repository_opts")
+        repo = repository_opts.get("repo") if isinstance(repository_opts, dict) else getattr(repository_opts, "repo", None)
+        chart, version = args.props.get("chart"), args.props.get("version")
+        values = args.props.get("values")
+        if values is None:
+            values = args.props["values"] = {}
+        if not all(isinstance(item, str) for item in (repo, chart, version)) or not isinstance(values, dict):
+            pulumi.log.warn(f"{args.name}: chart repository, version or values are not known yet, images stay unpinned")
+            return None
+
+        chart_images = resolver.chart_images(repo, chart, version)
+        if chart_images is None:
+            return None
+        pin_chart_values(values, chart_images, resolver.pin)
+        return pulumi.ResourceTransformationResult(args.props, args.opts)
+
+    return transformation
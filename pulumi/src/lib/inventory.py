@@ -0,0 +1,395 @@
+import os
+import re
+import glob
+import subprocess
+from dataclasses import dataclass, field
+from functools import lru_cache
+from typing import Dict, List, Optional
+import pulumi
+
+# Map talosctl disk TYPE values to storage device classes
+DEVICE_CLASSES = {"NVME": "nvme", "SSD": "ssd", "HDD": "hdd"}
+
+# Link kinds that carry node traffic; physical NICs have an empty kind
+DATAPATH_LINK_KINDS = ("", "bridge", "bond", "vlan")
+
+# What a data disk is used for. A device class belongs to exactly one role.
+DISK_ROLES = ("hostpath", "ceph", "unused")
+
+
+def get_disk_roles(config_disk_roles: dict, ceph_enabled: bool) -> Dict[str, str]:
+    """
+    Normalize `inventory.disk_roles`, the role of each device class
+
+    Data disks are either mounted as a hostpath-provisioner pool or handed
+    to Ceph as OSDs, never both. Classes not configured go to Ceph when it
+    is enabled and to hostpath-provisioner otherwise.
+
+    Args:
+        config_disk_roles: `inventory.disk_roles` stack config, device class to role
+        ceph_enabled: Whether the Ceph module is enabled
+
+    Returns:
+        Dict of device class to role
+    """
+    default_role = "ceph" if ceph_enabled else "hostpath"
+    roles = {device_class: default_role for device_class in DEVICE_CLASSES.values()}
+    for device_class, role in (config_disk_roles or {}).items():
+        if device_class not in roles:
+            raise ValueError(
+                f"Unknown inventory.disk_roles device class: {device_class}. "
+                f"Expected one of: {', '.join(roles)}"
+            )
+        if role not in DISK_ROLES:
+            raise ValueError(f"inventory.disk_roles.{device_class} must be one of: {', '.join(DISK_ROLES)}")
+        roles[device_class] = role
+    if not ceph_enabled and "ceph" in roles.values():
+        pulumi.log.warn("inventory.disk_roles assigns disks to Ceph, which is not enabled; they stay unused")
+    return roles
+
+
+def role_classes(disk_roles: Dict[str, str], role: str) -> List[str]:
+    """Device classes assigned to a role."""
+    return [device_class for device_class, assigned in disk_roles.items() if assigned == role]
+
+
+@dataclass(frozen=True)
+class Disk:
+    """A block device reported by `talosctl get disks`."""
+    node: str
+    dev: str
+    model: str
+    type: str
+    size_gb: float
+    wwid: str
+    system_disk: bool
+    read_only: bool
+
+    @property
+    def name(self) -> str:
+        return self.dev.replace("/dev/", "")
+
+    @property
+    def device_class(self) -> str:
+        return DEVICE_CLASSES.get(self.type.upper(), "hdd")
+
+
+@dataclass(frozen=True)
+class Link:
+    """A network link reported by `talosctl get links`."""
+    node: str
+    id: str
+    type: str
+    kind: str
+    hw_addr: str
+    oper_state: str
+    link_state: bool
+
+
+@dataclass
+class Node:
+    """A host with its disks and links."""
+    address: str
+    name: str
+    disks: List[Disk] = field(default_factory=list)
+    links: List[Link] = field(default_factory=list)
+
+    def device_classes(self) -> set:
+        return {disk.device_class for disk in self.data_disks()}
+
+    def data_disks(self, min_size_gb: float = 0) -> List[Disk]:
+        """Disks usable for storage: not the system disk, writable and large enough."""
+        return [
+            disk
+            for disk in self.disks
+            if not disk.system_disk and not disk.read_only and disk.size_gb >= min_size_gb
+        ]
+
+    def datapath_links(self) -> List[Link]:
+        """Up links that carry node traffic (physical NICs, bridges, bonds, vlans)."""
+        return [
+            link
+            for link in self.links
+            if link.type == "ether"
+            and link.kind in DATAPATH_LINK_KINDS
+            and link.oper_state == "up"
+        ]
+
+
+@dataclass
+class Inventory:
+    """Hardware inventory of all nodes, queried by modules to fill in host specific config."""
+    nodes: List[Node] = field(default_factory=list)
+
+    def node(self, address: str) -> Optional[Node]:
+        return next((node for node in self.nodes if node.address == address), None)
+
+    def hostpath_disks(self, device_classes: List[str]) -> Dict[str, Dict[str, Disk]]:
+        """
+        Disk backing each hostpath pool per node address, the largest of its class
+
+        A pool is one directory per node, so only one disk per class can back
+        it. Further disks of the class stay unused.
+        """
+        disks = {}
+        for node in self.nodes:
+            for device_class in device_classes:
+                candidates = sorted(
+                    (disk for disk in node.data_disks() if disk.device_class == device_class),
+                    key=lambda disk: disk.size_gb,
+                    reverse=True,
+                )
+                if not candidates:
+                    continue
+                disks.setdefault(node.address, {})[device_class] = candidates[0]
+        return disks
+
+    def storage_pools(self, base_path: str, device_classes: List[str], default: bool = False) -> List[dict]:
+        """
+        hostpath-provisioner storage pools, one per device class present on every node.
+
+        Only device classes assigned to hostpath are used. Classes missing on
+        some nodes are skipped because HPP pools are cluster wide. The pool
+        path is the mountpoint from talos_disk_patches. With default the
+        fastest pool is the default StorageClass.
+        """
+        if not self.nodes:
+            return []
+
+        node_classes = [node.device_classes() & set(device_classes) for node in self.nodes]
+        all_classes = set.union(*node_classes)
+        common_classes = set.intersection(*node_classes)
+        for device_class in sorted(all_classes - common_classes):
+            pulumi.log.warn(f"Skipping {device_class} storage pool, not present on every node")
+
+        pools = [
+            {"name": device_class, "path": f"{base_path}/{device_class}"}
+            for device_class in ("nvme", "ssd", "hdd")
+            if device_class in common_classes
+        ]
+        if pools and default:
+            pools[0]["default"] = True
+        return pools
+
+    def talos_disk_patches(self, base_path: str, device_classes: List[str]) -> Dict[str, dict]:
+        """
+        Talos machine config patch per node address mounting the hostpath pool disks
+
+        Talos partitions and formats each disk on the next boot after the
+        patch is applied and mounts it at the pool path. Mountpoints must be
+        under /var/mnt.
+        """
+        patches = {}
+        pool_classes = {pool["name"] for pool in self.storage_pools(base_path, device_classes)}
+        for address, disks in sorted(self.hostpath_disks(device_classes).items()):
+            node_disks = self.node(address).data_disks()
+            for device_class, disk in sorted(disks.items()):
+                for unused in node_disks:
+                    if unused.device_class == device_class and unused.dev != disk.dev:
+                        pulumi.log.warn(f"{address}: {unused.dev} stays unused, the {device_class} pool uses {disk.dev}")
+            machine_disks = [
+                {"device": disk.dev, "partitions": [{"mountpoint": f"{base_path}/{device_class}"}]}
+                for device_class, disk in sorted(disks.items())
+                if device_class in pool_classes
+            ]
+            if machine_disks:
+                patches[address] = {"machine": {"disks": machine_disks}}
+        return patches
+
+    def ceph_storage_nodes(self, osds_per_device: dict, min_size_gb: float, device_classes: List[str]) -> List[dict]:
+        """
+        CephCluster storage.nodes entries for every data disk of a class assigned to Ceph
+
+        Rook matches storage nodes by Kubernetes node name, so every node
+        contributing OSDs needs an inventory.node_names entry.
+        """
+        storage_nodes = []
+        unnamed = []
+        for node in sorted(self.nodes, key=lambda n: n.name):
+            devices = [
+                {
+                    "name": disk.name,
+                    "config": {
+                        "deviceClass": disk.device_class,
+                        "osdsPerDevice": str(osds_per_device.get(disk.device_class, 1)),
+                    },
+                }
+                for disk in node.data_disks(min_size_gb)
+                if disk.device_class in device_classes
+            ]
+            if devices:
+                if node.name == node.address:
+                    unnamed.append(node.address)
+                storage_nodes.append({"name": node.name, "devices": devices})
+        if unnamed:
+            raise ValueError(
+                f"Ceph OSD nodes {', '.join(unnamed)} have no Kubernetes node name, map them in inventory.node_names"
+            )
+        return storage_nodes
+
+    def bridge_name(self) -> Optional[str]:
+        """The bridge present on every node, used for Multus and L2 announcements."""
+        if not self.nodes:
+            return None
+        bridges = set.intersection(
+            *({link.id for link in node.links if link.kind == "bridge"} for node in self.nodes)
+        )
+        return sorted(bridges)[0] if bridges else None
+
+    def cilium_devices(self) -> List[str]:
+        """
+        Interfaces Cilium should attach to, the up datapath links of all nodes
+
+        `talosctl get links` does not list bridge and bond ports, so on a
+        node with an up bridge or bond only those are used and its plain
+        NICs are taken as their ports. Bridges come first, then bonds, so
+        the first device is the uplink used for masquerading.
+        """
+        devices = set()
+        for node in self.nodes:
+            links = node.datapath_links()
+            masters = [link for link in links if link.kind in ("bridge", "bond")]
+            devices.update(link.id for link in masters or links)
+        order = {"bridge": 0, "bond": 1}
+        kinds = {link.id: link.kind for node in self.nodes for link in node.links}
+        return sorted(devices, key=lambda device: (order.get(kinds[device], 2), device))
+
+
+def parse_talosctl_table(text: str) -> List[dict]:
+    """
+    Parse the table output of `talosctl get <resource>`.
+
+    Column boundaries are taken from the header row offsets because values
+    (MODEL, SIZE) and headers (HW ADDR) can contain single spaces. Repeated
+    headers get a numeric suffix, e.g. the second TYPE becomes `type_2`.
+    """
+    lines = [line.rstrip("\n") for line in text.splitlines() if line.strip()]
+    if not lines:
+        return []
+
+    header = lines[0]
+    columns = []
+    offsets = []
+    for match in re.finditer(r"\S+(?: \S+)*", header):
+        base = column = match.group().lower().replace(" ", "_")
+        suffix = 1
+        while column in columns:
+            suffix += 1
+            column = f"{base}_{suffix}"
+        columns.append(column)
+        offsets.append(match.start())
+
+    rows = []
+    for line in lines[1:]:
+        row = {}
+        for index, column in enumerate(columns):
+            start = offsets[index]
+            end = offsets[index + 1] if index + 1 < len(offsets) else None
+            row[column] = line[start:end].strip()
+        rows.append(row)
+
+    return rows
+
+
+def parse_size_gb(size: str) -> float:
+    """Convert a talosctl SIZE value such as '2.0 TB' or '256 GB' to GB."""
+    value, unit = size.split()
+    multipliers = {"KB": 0.000001, "MB": 0.001, "GB": 1, "TB": 1000}
+    return float(value) * multipliers[unit.upper()]
+
+
+def parse_disks(text: str) -> List[Disk]:
+    """Parse `talosctl get disks` output."""
+    return [
+        Disk(
+            node=row["node"],
+            dev=row["dev"],
+            model=row["model"],
+            type=row["type"],
+            size_gb=parse_size_gb(row["size"]),
+            wwid=row["wwid"],
+            system_disk=row.get("system_disk") == "*",
+            read_only=row.get("read_only") == "*",
+        )
+        for row in parse_talosctl_table(text)
+    ]
+
+
+def parse_links(text: str, node: str = "") -> List[Link]:
+    """Parse `talosctl get links` output. Single node output has an empty NODE column."""
+    return [
+        Link(
+            node=row["node"] or node,
+            id=row["id"],
+            type=row["type_2"],
+            kind=row["kind"],
+            hw_addr=row["hw_addr"],
+            oper_state=row["oper_state"],
+            link_state=row["link_state"] == "true",
+        )
+        for row in parse_talosctl_table(text)
+    ]
+
+
+@lru_cache(maxsize=None)
+def load_inventory(path: str, node_names: tuple = ()) -> Inventory:
+    """
+    Load an inventory from a directory of `<id>.disks.list` / `<id>.links.list` files.
+
+    Files sharing an `<id>` prefix belong to the same node; its address is
+    taken from the NODE column of the disk list. Results are cached per path.
+
+    Args:
+        path: Directory containing the list files, e.g. docs/metal/3node-optiplex-cluster
+        node_names: Tuple of (address, kubernetes node name) pairs
+
+    Returns:
+        Inventory of all nodes found
+    """
+    names = dict(node_names)
+    nodes: Dict[str, Node] = {}
+
+    for disks_path in sorted(glob.glob(os.path.join(path, "*.disks.list"))):
+        node_id = os.path.basename(disks_path)[: -len(".disks.list")]
+        with open(disks_path, "r") as f:
+            disks = parse_disks(f.read())
+        if not disks:
+            continue
+
+        address = disks[0].node or node_id
+        links = []
+        links_path = os.path.join(path, f"{node_id}.links.list")
+        if os.path.exists(links_path):
+            with open(links_path, "r") as f:
+                links = parse_links(f.read(), address)
+
+        nodes[address] = Node(
+            address=address,
+            name=names.get(address, address),
+            disks=disks,
+            links=links,
+        )
+
+    pulumi.log.info(f"Loaded hardware inventory for {len(nodes)} nodes from {path}")
+    return Inventory(nodes=list(nodes.values()))
+
+
+def capture_talos_inventory(addresses: List[str], path: str):
+    """
+    Write `talosctl get disks/links` output for live nodes into an inventory directory.
+
+    The result is read back with load_inventory, so previews do not need
+    access to the nodes.
+    """
+    os.makedirs(path, exist_ok=True)
+    for address in addresses:
+        node_id = address.split(".")[-1]
+        for resource in ("disks", "links"):
+            output = subprocess.run(
+                ["talosctl", "get", resource, "--nodes", address],
+                check=True,
+                capture_output=True,
+                text=True,
+            ).stdout
+            with open(os.path.join(path, f"{node_id}.{resource}.list"), "w") as f:
+                f.write(output)
@@ -0,0 +1,19 @@
+import yaml
+from kubernetes import client as k8s_client
+from kubernetes import config as k8s_config
+
+
+def new_api_client(kubeconfig: str = None, context: str = None) -> k8s_client.ApiClient:
+    """
+    Kubernetes API client for queries made while the program runs
+
+    Args:
+        kubeconfig: Kubeconfig file path or content, default kubeconfig if None
+        context: Kubeconfig context
+
+    Returns:
+        Configured API client
+    """
+    if kubeconfig and "apiVersion" in kubeconfig:
+        return k8s_config.new_client_from_config_dict(yaml.safe_load(kubeconfig), context=context)
+    return k8s_config.new_client_from_config(config_file=kubeconfig, context=context)
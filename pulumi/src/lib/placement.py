@@ -0,0 +1,79 @@
+from typing import Optional
+
+# Node tiers. Platform controllers run on infra nodes, node agents serving
+# VMs (virt-handler, CSI and VM network plugins) on workload nodes. CNI and
+# DNS DaemonSets run everywhere and are not placed.
+PLACEMENT_TIERS = ("infra", "workloads")
+
+# Settings of a tier, tolerations use the Kubernetes toleration fields
+PLACEMENT_KEYS = ("node_selector", "tolerations")
+
+
+def get_placement_config(config_placement: dict) -> dict:
+    """
+    Normalize the `placement` stack config
+
+    Args:
+        config_placement: `placement` stack config
+
+    Returns:
+        Dict of tier to `node_selector` and `tolerations`
+    """
+    placement = {}
+    for tier in PLACEMENT_TIERS:
+        tier_config = config_placement.get(tier) or {}
+        unknown = set(tier_config) - set(PLACEMENT_KEYS)
+        if unknown:
+            raise ValueError(f"Unknown placement.{tier} settings: {', '.join(sorted(unknown))}")
+        tolerations = tier_config.get("tolerations") or []
+        for toleration in tolerations:
+            if not toleration.get("key") and toleration.get("operator") != "Exists":
+                raise ValueError(f"placement.{tier}.tolerations: a toleration without a key needs operator Exists")
+        placement[tier] = {
+            "node_selector": {key: str(value) for key, value in (tier_config.get("node_selector") or {}).items()},
+            "tolerations": list(tolerations),
+        }
+    return placement
+
+
+def node_placement(placement: Optional[dict], tier: str, base: dict = None) -> dict:
+    """
+    nodeSelector and tolerations of a tier merged over an existing pod placement
+
+    Works for pod specs, the usual chart values and the NodePlacement of the
+    KubeVirt, CDI and hostpath-provisioner CRs.
+
+    Args:
+        placement: Normalized config from get_placement_config, None when disabled
+        tier: infra or workloads
+        base: Existing nodeSelector and tolerations, kept and extended
+
+    Returns:
+        Dict with the nodeSelector and tolerations that are set
+    """
+    rendered = dict(base or {})
+    if not placement:
+        return rendered
+    tier_config = placement[tier]
+    if tier_config["node_selector"]:
+        rendered["nodeSelector"] = {**(rendered.get("nodeSelector") or {}), **tier_config["node_selector"]}
+    if tier_config["tolerations"]:
+        rendered["tolerations"] = [*(rendered.get("tolerations") or []), *tier_config["tolerations"]]
+    return rendered
+
+
+def set_placement(obj: dict, placement: Optional[dict], tier: str) -> dict:
+    """Place the pods of a manifest Deployment on a node tier, in place."""
+    if placement and obj.get("kind") == "Deployment" and "spec" in obj:
+        pod_spec = obj["spec"].setdefault("template", {}).setdefault("spec", {})
+        base = {key: pod_spec[key] for key in ("nodeSelector", "tolerations") if pod_spec.get(key)}
+        pod_spec.update(node_placement(placement, tier, base))
+    return obj
+
+
+def placement_transformation(placement: Optional[dict], tier: str):
+    """ConfigFile transformation running set_placement, a no-op when placement is None."""
+    def transformation(obj):
+        return set_placement(obj, placement, tier)
+
+    return transformation
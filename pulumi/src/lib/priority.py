@@ -0,0 +1,140 @@
+from typing import List, Optional
+import pulumi
+import pulumi_kubernetes as k8s
+
+# Priority tiers, highest first. Node agents of the pod network keep the
+# built-in system-node-critical class, which the kubelet evicts last. The
+# other tiers are PriorityClasses created by Kargo. KubeVirt assigns its own
+# kubevirt-cluster-critical class (1000000000) to virt-handler, virt-api and
+# virt-controller, so the virtualization tier matches it. Observability and UI
+# pods never preempt running VMs to get scheduled.
+PRIORITY_TIERS = {
+    "datapath": {"name": "system-node-critical", "builtin": True},
+    "virtualization": {"name": "kargo-virtualization", "value": 1000000000, "preemption_policy": "PreemptLowerPriority"},
+    "storage": {"name": "kargo-storage", "value": 900000000, "preemption_policy": "PreemptLowerPriority"},
+    "observability": {"name": "kargo-observability", "value": 800000000, "preemption_policy": "Never"},
+    "ui": {"name": "kargo-ui", "value": 700000000, "preemption_policy": "Never"},
+}
+
+# Datapath components that may run with Guaranteed QoS
+GUARANTEED_COMPONENTS = ("cilium_agent", "multus", "node_local_dns")
+
+# Pod template owners in manifests applied with k8s.yaml.ConfigFile
+WORKLOAD_KINDS = ("Deployment", "DaemonSet", "StatefulSet")
+
+
+def get_priority_config(config_priority: dict) -> dict:
+    """
+    Normalize the `priority` stack config
+
+    Args:
+        config_priority: `priority` stack config
+
+    Returns:
+        Dict with the `tiers` and the `guaranteed` datapath components
+    """
+    tiers = {name: dict(tier) for name, tier in PRIORITY_TIERS.items()}
+    for name, tier_config in (config_priority.get("tiers") or {}).items():
+        if name not in tiers:
+            raise ValueError(f"Unknown priority tier: {name}. Expected one of: {', '.join(PRIORITY_TIERS)}")
+        if tiers[name].get("builtin"):
+            raise ValueError(f"priority.tiers.{name} uses the built-in {tiers[name]['name']} class")
+        unknown = set(tier_config) - {"value", "preemption_policy"}
+        if unknown:
+            raise ValueError(f"Unknown priority.tiers.{name} settings: {', '.join(sorted(unknown))}")
+        tiers[name].update(tier_config)
+
+    values = [int(tier["value"]) for tier in tiers.values() if not tier.get("builtin")]
+    if values != sorted(values, reverse=True) or len(set(values)) != len(values):
+        raise ValueError(f"priority tier values must decrease in the order {', '.join(PRIORITY_TIERS)}")
+    if values and values[0] > 1000000000:
+        raise ValueError("priority tier values above 1000000000 are reserved for system classes")
+
+    guaranteed = config_priority.get("guaranteed") or []
+    unknown = set(guaranteed) - set(GUARANTEED_COMPONENTS)
+    if unknown:
+        raise ValueError(
+            f"priority.guaranteed supports {', '.join(GUARANTEED_COMPONENTS)}, got: {', '.join(sorted(unknown))}"
+        )
+
+    return {"tiers": tiers, "guaranteed": list(guaranteed)}
+
+
+def create_priority_classes(priority: dict, k8s_provider: k8s.Provider) -> List[k8s.scheduling.v1.PriorityClass]:
+    """
+    Create the PriorityClasses of the Kargo tiers
+
+    Args:
+        priority: Normalized config from get_priority_config
+        k8s_provider: Kubernetes provider instance
+
+    Returns:
+        PriorityClass resources, pods using them must depend on these
+    """
+    priority_classes = []
+    for tier_name, tier in priority["tiers"].items():
+        if tier.get("builtin"):
+            continue
+        priority_classes.append(k8s.scheduling.v1.PriorityClass(
+            tier["name"],
+            metadata=k8s.meta.v1.ObjectMetaArgs(
+                name=tier["name"], labels={"app.kubernetes.io/managed-by": "pulumi"}
+            ),
+            value=int(tier["value"]),
+            global_default=False,
+            preemption_policy=tier["preemption_policy"],
+            description=f"Kargo {tier_name} tier",
+            opts=pulumi.ResourceOptions(provider=k8s_provider),
+        ))
+    return priority_classes
+
+
+def priority_class_name(priority: Optional[dict], tier: str) -> Optional[str]:
+    """PriorityClass of a tier, None when tiering is disabled."""
+    if not priority:
+        return None
+    return priority["tiers"][tier]["name"]
+
+
+def qos_resources(priority: Optional[dict], component: str, resources: Optional[dict]) -> Optional[dict]:
+    """
+    Container resources giving a datapath component Guaranteed QoS
+
+    Requests are raised to the limits, cpu and memory requests then equal
+    the limits. Components not listed in `priority.guaranteed` keep their resources.
+
+    Args:
+        priority: Normalized config from get_priority_config, None when disabled
+        component: Component name from GUARANTEED_COMPONENTS
+        resources: Container resources, usually from the sizing plan
+
+    Returns:
+        Container resources
+    """
+    if not priority or component not in priority["guaranteed"]:
+        return resources
+    requests = (resources or {}).get("requests") or {}
+    limits = (resources or {}).get("limits") or {}
+    if not {"cpu", "memory"} <= set(requests):
+        pulumi.log.warn(f"{component} needs cpu and memory requests for Guaranteed QoS, enable sizing")
+        return resources
+    if "memory" not in limits:
+        pulumi.log.warn(f"{component} has no memory limit, its memory request becomes the limit")
+    guaranteed = {resource: limits.get(resource) or requests[resource] for resource in ("cpu", "memory")}
+    return {"requests": dict(guaranteed), "limits": dict(guaranteed)}
+
+
+def set_priority_class(obj: dict, class_name: Optional[str]) -> dict:
+    """Set the PriorityClass of a manifest workload without one, in place."""
+    if class_name and obj.get("kind") in WORKLOAD_KINDS and "spec" in obj:
+        pod_spec = obj["spec"].setdefault("template", {}).setdefault("spec", {})
+        pod_spec.setdefault("priorityClassName", class_name)
+    return obj
+
+
+def priority_transformation(class_name: Optional[str]):
+    """ConfigFile transformation running set_priority_class, a no-op when class_name is None."""
+    def transformation(obj):
+        return set_priority_class(obj, class_name)
+
+    return transformation
@@ -0,0 +1,310 @@
+import math
+from decimal import Decimal
+from typing import Dict, Optional
+import yaml
+from kubernetes.utils import parse_quantity
+
+# Default sizing policy. Requests grow from a floor with the scale inputs:
+#
+#   request = requests + per_node * nodes + per_vm * vms + per_pod * pods
+#
+# capped at max. DaemonSet components see the per node share of vms and
+# pods. limits are multiples of the computed request, resources without a
+# factor get no limit. Replicas are ceil(nodes / nodes_per_replica) bounded
+# by min and max.
+SIZING_POLICY = {
+    "cert_manager": {
+        "requests": {"cpu": "10m", "memory": "64Mi"},
+        # Certificates and their secrets grow with the workloads
+        "per_pod": {"cpu": "0.05m", "memory": "64Ki"},
+        "max": {"cpu": "500m", "memory": "1Gi"},
+        "limits": {"memory": 2},
+        "replicas": {"min": 1, "max": 2, "nodes_per_replica": 16},
+    },
+    "cilium_agent": {
+        "daemonset": True,
+        "requests": {"cpu": "100m", "memory": "256Mi"},
+        # Cluster wide ipcache and per node endpoints
+        "per_node": {"memory": "1Mi"},
+        "per_pod": {"cpu": "1m", "memory": "1Mi"},
+        "max": {"cpu": "1", "memory": "2Gi"},
+        "limits": {"memory": 4},
+    },
+    "cilium_operator": {
+        "requests": {"cpu": "25m", "memory": "64Mi"},
+        "per_node": {"memory": "2Mi"},
+        "per_pod": {"memory": "16Ki"},
+        "max": {"cpu": "500m", "memory": "1Gi"},
+        "limits": {"memory": 4},
+        # Host network pods with anti-affinity, never more replicas than nodes
+        "replicas": {"min": 1, "max": 2, "nodes_per_replica": 2},
+    },
+    "hubble_relay": {
+        "requests": {"cpu": "25m", "memory": "64Mi"},
+        "per_node": {"cpu": "2m", "memory": "4Mi"},
+        "max": {"cpu": "500m", "memory": "1Gi"},
+        "limits": {"memory": 4},
+        "replicas": {"min": 1, "max": 2, "nodes_per_replica": 16},
+    },
+    "multus": {
+        "daemonset": True,
+        "requests": {"cpu": "10m", "memory": "50Mi"},
+        "per_pod": {"memory": "256Ki"},
+        "max": {"cpu": "100m", "memory": "512Mi"},
+        # The thick plugin daemon spikes while many pods start at once
+        "limits": {"memory": 8},
+    },
+    "node_local_dns": {
+        "daemonset": True,
+        "requests": {"cpu": "25m", "memory": "5Mi"},
+        "per_pod": {"memory": "128Ki"},
+        "max": {"cpu": "200m", "memory": "256Mi"},
+    },
+    "virt_handler": {
+        "daemonset": True,
+        "requests": {"cpu": "50m", "memory": "256Mi"},
+        "per_vm": {"cpu": "2m", "memory": "4Mi"},
+        "max": {"cpu": "500m", "memory": "1Gi"},
+        "limits": {"memory": 3},
+    },
+    "prometheus": {
+        "requests": {"cpu": "200m", "memory": "512Mi"},
+        # Series per node exporter, per KubeVirt VM and per pod
+        "per_node": {"cpu": "10m", "memory": "64Mi"},
+        "per_vm": {"cpu": "1m", "memory": "8Mi"},
+        "per_pod": {"memory": "2Mi"},
+        "max": {"cpu": "8", "memory": "32Gi"},
+        "limits": {"memory": 1.5},
+    },
+    "kube_state_metrics": {
+        "requests": {"cpu": "10m", "memory": "32Mi"},
+        "per_node": {"memory": "1Mi"},
+        "per_pod": {"memory": "16Ki"},
+        "max": {"cpu": "500m", "memory": "1Gi"},
+        "limits": {"memory": 2},
+    },
+    "registry_cache": {
+        # Per upstream container, concurrent pulls grow with the node count
+        "requests": {"cpu": "50m", "memory": "64Mi"},
+        "per_node": {"cpu": "5m", "memory": "8Mi"},
+        "max": {"cpu": "1", "memory": "1Gi"},
+        "limits": {"memory": 8},
+    },
+    "ingress_nginx": {
+        "requests": {"cpu": "100m", "memory": "90Mi"},
+        "per_node": {"cpu": "5m", "memory": "8Mi"},
+        "max": {"cpu": "2", "memory": "2Gi"},
+        "limits": {"memory": 4},
+        "replicas": {"min": 1, "max": 3, "nodes_per_replica": 8},
+    },
+    "metrics_server": {
+        # Scrapes every kubelet and keeps the latest sample per pod
+        "requests": {"cpu": "50m", "memory": "64Mi"},
+        "per_node": {"cpu": "1m", "memory": "2Mi"},
+        "max": {"cpu": "1", "memory": "2Gi"},
+        "limits": {"memory": 2},
+        "replicas": {"min": 1, "max": 2, "nodes_per_replica": 8},
+    },
+    "dashboard_api": {
+        "requests": {"cpu": "50m", "memory": "64Mi"},
+        "max": {"cpu": "500m", "memory": "512Mi"},
+        "limits": {"memory": 4},
+        "replicas": {"min": 1, "max": 2, "nodes_per_replica": 16},
+    },
+    "dashboard_web": {
+        "requests": {"cpu": "25m", "memory": "32Mi"},
+        "max": {"cpu": "250m", "memory": "256Mi"},
+        "limits": {"memory": 4},
+        "replicas": {"min": 1, "max": 2, "nodes_per_replica": 16},
+    },
+}
+
+# Keys a component policy may set
+POLICY_KEYS = ("daemonset", "requests", "per_node", "per_vm", "per_pod", "max", "limits", "replicas")
+
+# Keys a component override may set, pinning the computed values
+OVERRIDE_KEYS = ("requests", "limits", "replicas")
+
+# Pods per node assumed when the planned pod count is not configured
+DEFAULT_PODS_PER_NODE = 30
+
+
+def get_sizing_config(config_sizing: dict) -> dict:
+    """
+    Normalize the `sizing` stack config and load the policy file
+
+    The policy file (YAML) holds `components` deep merged over
+    SIZING_POLICY and `overrides` deep merged with the stack config
+    overrides, the stack config winning. Setting only `requests.cpu` keeps
+    the default memory request.
+
+    Args:
+        config_sizing: `sizing` stack config
+
+    Returns:
+        Normalized sizing config
+    """
+    policy_file = config_sizing.get("policy_file")
+    file_policy = {}
+    if policy_file:
+        with open(policy_file, "r") as f:
+            file_policy = yaml.safe_load(f) or {}
+
+    policy = {name: dict(component) for name, component in SIZING_POLICY.items()}
+    for source in (file_policy.get("components") or {}, config_sizing.get("components") or {}):
+        for name, component in source.items():
+            unknown = set(component) - set(POLICY_KEYS)
+            if unknown:
+                raise ValueError(f"Unknown sizing policy keys for {name}: {', '.join(sorted(unknown))}")
+            policy[name] = merge_values(policy.get(name) or {}, component)
+
+    overrides = {}
+    for source in (file_policy.get("overrides") or {}, config_sizing.get("overrides") or {}):
+        for name, override in source.items():
+            if name not in policy:
+                raise ValueError(f"Unknown sizing component: {name}. Expected one of: {', '.join(policy)}")
+            unknown = set(override) - set(OVERRIDE_KEYS)
+            if unknown:
+                raise ValueError(f"Unknown sizing override keys for {name}: {', '.join(sorted(unknown))}")
+            overrides[name] = merge_values(overrides.get(name) or {}, override)
+
+    return {
+        "policy_file": policy_file,
+        "policy": policy,
+        "overrides": overrides,
+        "nodes": config_sizing.get("nodes"),
+        "vms": config_sizing.get("vms"),
+        "pods": config_sizing.get("pods"),
+    }
+
+
+def get_scale(sizing: dict, nodes: Optional[int], vms: int) -> Dict[str, int]:
+    """
+    Scale inputs of the sizing policy, configured values winning over the discovered ones
+
+    Args:
+        sizing: Normalized config from get_sizing_config
+        nodes: Node count from the inventory or the cluster, None when unknown
+        vms: Planned VM count
+
+    Returns:
+        Dict with nodes, vms and pods
+    """
+    nodes = int(sizing["nodes"] or nodes or 1)
+    vms = int(sizing["vms"] if sizing["vms"] is not None else vms)
+    # Every VM runs in its own virt-launcher pod
+    pods = int(sizing["pods"] if sizing["pods"] is not None else nodes * DEFAULT_PODS_PER_NODE + vms)
+    if nodes < 1 or vms < 0 or pods < 0:
+        raise ValueError("sizing.nodes must be at least 1, sizing.vms and sizing.pods at least 0")
+    return {"nodes": nodes, "vms": vms, "pods": pods}
+
+
+def format_quantity(resource: str, value: Decimal) -> str:
+    """Round a quantity up to whole millicores for cpu and whole MiB otherwise."""
+    if resource == "cpu":
+        return f"{math.ceil(value * 1000)}m"
+    return f"{math.ceil(value / (1024 * 1024))}Mi"
+
+
+def size_component(policy: dict, scale: Dict[str, int], override: dict = None) -> dict:
+    """
+    Requests, limits and replicas of one component
+
+    Overridden requests replace the computed ones per resource before limits
+    are derived from them, overridden limits and replicas replace the computed ones.
+
+    Args:
+        policy: Component policy
+        scale: Scale inputs from get_scale
+        override: Component override
+
+    Returns:
+        Dict with `resources` (requests and limits) and `replicas`, None without a replicas policy
+    """
+    nodes = scale["nodes"]
+    amounts = {"per_node": nodes, "per_vm": scale["vms"], "per_pod": scale["pods"]}
+    if policy.get("daemonset"):
+        amounts.update(per_node=0, per_vm=math.ceil(scale["vms"] / nodes), per_pod=math.ceil(scale["pods"] / nodes))
+
+    requests = {}
+    for resource, floor in (policy.get("requests") or {}).items():
+        value = parse_quantity(floor)
+        for key, amount in amounts.items():
+            value += parse_quantity((policy.get(key) or {}).get(resource, 0)) * amount
+        if resource in (policy.get("max") or {}):
+            value = min(value, parse_quantity(policy["max"][resource]))
+        requests[resource] = value
+
+    override = override or {}
+    for resource, value in (override.get("requests") or {}).items():
+        requests[resource] = parse_quantity(value)
+
+    limits = {
+        resource: format_quantity(resource, requests[resource] * Decimal(str(factor)))
+        for resource, factor in (policy.get("limits") or {}).items()
+        if resource in requests
+    }
+
+    replicas = None
+    replica_policy = policy.get("replicas")
+    if replica_policy:
+        replicas = math.ceil(nodes / int(replica_policy.get("nodes_per_replica") or 1))
+        replicas = min(max(replicas, int(replica_policy.get("min", 1))), int(replica_policy.get("max", replicas)))
+    if override.get("replicas") is not None:
+        replicas = int(override["replicas"])
+    if "limits" in override:
+        limits = dict(override["limits"])
+
+    resources = {"requests": {resource: format_quantity(resource, value) for resource, value in requests.items()}}
+    if limits:
+        resources["limits"] = limits
+    return {"resources": resources, "replicas": replicas}
+
+
+def compute_sizing(sizing: dict, scale: Dict[str, int]) -> Dict[str, dict]:
+    """
+    Size every component of the policy for the given scale
+
+    Args:
+        sizing: Normalized config from get_sizing_config
+        scale: Scale inputs from get_scale
+
+    Returns:
+        Dict of component name to `resources` and `replicas`
+    """
+    return {
+        name: size_component(policy, scale, sizing["overrides"].get(name))
+        for name, policy in sizing["policy"].items()
+    }
+
+
+def component_values(sizing_plan: Optional[Dict[str, dict]], name: str, replicas_key: str = None) -> dict:
+    """
+    Helm values fragment with the sized resources of a component
+
+    Args:
+        sizing_plan: Result of compute_sizing, None when sizing is disabled
+        name: Component name
+        replicas_key: Values key for the replica count, the component's replicas are skipped when None
+
+    Returns:
+        Dict with `resources` and optionally the replica count, empty when sizing is disabled
+    """
+    if not sizing_plan or name not in sizing_plan:
+        return {}
+    component = sizing_plan[name]
+    values = {"resources": component["resources"]}
+    if replicas_key and component["replicas"] is not None:
+        values[replicas_key] = component["replicas"]
+    return values
+
+
+def merge_values(base: dict, extra: dict) -> dict:
+    """Deep merge Helm values, extra wins and lists are replaced."""
+    merged = dict(base)
+    for key, value in extra.items():
+        if isinstance(value, dict) and isinstance(merged.get(key), dict):
+            merged[key] = merge_values(merged[key], value)
+        else:
+            merged[key] = value
+    return merged
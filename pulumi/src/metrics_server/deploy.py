@@ -0,0 +1,69 @@
+import pulumi
+import pulumi_kubernetes as k8s
+from src.lib.helm_chart_versions import get_latest_helm_chart_version
+from src.lib.sizing import component_values
+from src.lib.placement import node_placement
+
+
+def deploy_metrics_server(
+    depends,
+    ns_name: str,
+    version: str,
+    kubelet_insecure_tls: bool,
+    k8s_provider: k8s.Provider,
+    sizing: dict = None,
+    placement: dict = None,
+):
+    """
+    Deploy metrics-server, the resource metrics API HorizontalPodAutoscalers read
+
+    Args:
+        depends: List of resources this deployment depends on
+        ns_name: Namespace to deploy metrics-server into
+        version: Version of the metrics-server chart, latest if None
+        kubelet_insecure_tls: Skip kubelet serving certificate verification, needed
+            unless kubelet serving certificates are signed by the cluster CA
+        k8s_provider: Kubernetes provider instance
+        sizing: Sizing plan from compute_sizing
+        placement: Node placement from get_placement_config, infra for the server
+
+    Returns:
+        Tuple containing:
+        - metrics-server chart version deployed
+        - metrics-server Helm release
+    """
+    chart_name = "metrics-server"
+    chart_url = "https://kubernetes-sigs.github.io/metrics-server"
+    if version is None:
+        version = get_latest_helm_chart_version(f"{chart_url}/index.yaml", chart_name)
+        pulumi.log.info(f"Setting helm release version to latest: {chart_name}/{version}")
+    else:
+        pulumi.log.info(f"Using helm release version: {chart_name}/{version}")
+
+    helm_values = {
+        "args": ["--kubelet-insecure-tls"] if kubelet_insecure_tls else [],
+        **component_values(sizing, "metrics_server", "replicas"),
+        **node_placement(placement, "infra"),
+    }
+    # Keeps the metrics API available while a node drains, a single replica must stay evictable
+    if helm_values.get("replicas", 1) > 1:
+        helm_values["podDisruptionBudget"] = {"enabled": True, "minAvailable": 1}
+
+    release = k8s.helm.v3.Release(
+        chart_name,
+        k8s.helm.v3.ReleaseArgs(
+            chart=chart_name,
+            version=version,
+            namespace=ns_name,
+            skip_await=False,
+            repository_opts=k8s.helm.v3.RepositoryOptsArgs(repo=chart_url),
+            values=helm_values,
+        ),
+        opts=pulumi.ResourceOptions(
+            provider=k8s_provider,
+            depends_on=depends,
+            custom_timeouts=pulumi.CustomTimeouts(create="8m", update="4m", delete="4m"),
+        ),
+    )
+
+    return version, release
@@ -1,16 +1,28 @@
+import json
 import pulumi
 import pulumi_kubernetes as k8s
+from src.lib.sizing import component_values
+from src.lib.priority import priority_class_name, qos_resources
 
+# Container resources used when sizing is disabled
+MULTUS_RESOURCES = {
+    "requests": {"cpu": "10m", "memory": "60Mi"},
+    "limits": {"cpu": "500m", "memory": "3Gi"},
+}
 
-def transform_resources(obj):
+
+def transform_resources(obj, resources: dict = MULTUS_RESOURCES, priority_class: str = None):
     """
     Transform Kubernetes resource objects:
     - Update hostPath mounts for netns
     - Set standardized resource requests/limits
+    - Set the pod PriorityClass
     - Add clean exit for multus-shim copy command
 
     Args:
         obj: The kubernetes resource object to transform
+        resources: Resources set on the multus containers
+        priority_class: PriorityClass of the DaemonSet pods, unchanged when None
 
     Returns:
         Modified resource object
@@ -24,17 +36,14 @@ def transform_resources(obj):
         if "spec" in obj:
             pod_spec = obj["spec"]["template"]["spec"]
 
+            if priority_class:
+                pod_spec["priorityClassName"] = priority_class
+
             # Transform main container (kube-multus)
             for container in pod_spec.get("containers", []):
                 if container.get("name") == "kube-multus":
-                    if "resources" not in container:
-                        container["resources"] = {}
-
                     # Set standardized resource limits/requests
-                    container["resources"] = {
-                        "requests": {"cpu": "10m", "memory": "60Mi"},
-                        "limits": {"cpu": "500m", "memory": "3Gi"},
-                    }
+                    container["resources"] = resources
 
             # Transform init containers
             init_containers = pod_spec.get("initContainers", [])
@@ -42,10 +51,7 @@ def transform_resources(obj):
                 # Set resources for install-multus-binary container
                 if init_container.get("name") == "install-multus-binary":
                     # Update resource limits/requests
-                    init_container["resources"] = {
-                        "requests": {"cpu": "10m", "memory": "60Mi"},
-                        "limits": {"cpu": "500m", "memory": "3Gi"},
-                    }
+                    init_container["resources"] = resources
 
                     # Add clean exit for multus-shim copy command
                     # Workaround: Adding '| true' ensures clean container exit even if copy fails
@@ -58,10 +64,7 @@ def transform_resources(obj):
 
                 # Set resources for install-cni container
                 elif init_container.get("name") == "install-cni":
-                    init_container["resources"] = {
-                        "requests": {"cpu": "10m", "memory": "60Mi"},
-                        "limits": {"cpu": "500m", "memory": "3Gi"},
-                    }
+                    init_container["resources"] = resources
 
             # Transform volume paths
             volumes = pod_spec.get("volumes", [])
@@ -74,7 +77,95 @@ def transform_resources(obj):
     return obj
 
 
-def deploy_multus(depends, version, bridge_name, k8s_provider):
+def resource_transformation(resources: dict = None, priority_class: str = None):
+    """ConfigFile transformation running transform_resources with the sized container resources."""
+    def transformation(obj):
+        return transform_resources(obj, resources or MULTUS_RESOURCES, priority_class)
+
+    return transformation
+
+
+def get_network_config(networks, bridge_name):
+    """
+    Normalize the secondary network list from stack config
+
+    When no networks are configured a single untagged network named after
+    the bridge is created in the default namespace.
+
+    Args:
+        networks: List of network dicts from `multus.networks`
+        bridge_name: Default bridge interface name
+
+    Returns:
+        List of normalized network dicts
+    """
+    if not networks:
+        networks = [{"name": bridge_name}]
+
+    normalized = []
+    for network in networks:
+        if not network.get("name"):
+            raise ValueError(f"Multus network requires a name: {network}")
+
+        mtu = network.get("mtu")
+        vlan = network.get("vlan")
+        if mtu is not None and not 576 <= int(mtu) <= 9216:
+            raise ValueError(
+                f"Multus network {network['name']} mtu must be between 576 and 9216"
+            )
+        if vlan is not None and not 1 <= int(vlan) <= 4094:
+            raise ValueError(
+                f"Multus network {network['name']} vlan must be between 1 and 4094"
+            )
+
+        normalized.append(
+            {
+                "name": network["name"],
+                "namespace": network.get("namespace") or "default",
+                "bridge": network.get("bridge") or bridge_name,
+                "mtu": int(mtu) if mtu is not None else None,
+                "vlan": int(vlan) if vlan is not None else None,
+                "ipam": network.get("ipam") or {},
+            }
+        )
+
+    return normalized
+
+
+def gen_bridge_cni_config(network):
+    """
+    Render the bridge + tuning CNI plugin chain for a NetworkAttachmentDefinition
+
+    Args:
+        network: Normalized network dict from get_network_config
+
+    Returns:
+        CNI config as a JSON string
+    """
+    bridge_plugin = {
+        "type": "bridge",
+        "bridge": network["bridge"],
+        "ipam": network["ipam"],
+    }
+    tuning_plugin = {"type": "tuning"}
+
+    if network["mtu"] is not None:
+        bridge_plugin["mtu"] = network["mtu"]
+        tuning_plugin["mtu"] = network["mtu"]
+    if network["vlan"] is not None:
+        bridge_plugin["vlan"] = network["vlan"]
+
+    return json.dumps(
+        {
+            "cniVersion": "0.3.1",
+            "name": network["name"],
+            "plugins": [bridge_plugin, tuning_plugin],
+        },
+        indent=2,
+    )
+
+
+def deploy_multus(depends, version, bridge_name, k8s_provider, networks=None, sizing=None, priority=None):
     """
     Deploy Multus CNI with Talos-specific configuration
 
@@ -83,6 +174,9 @@ def deploy_multus(depends, version, bridge_name, k8s_provider):
         version: Multus CNI version to deploy
         bridge_name: Name of bridge interface to configure
         k8s_provider: Kubernetes provider instance
+        networks: List of secondary networks (name, namespace, bridge, mtu, vlan, ipam)
+        sizing: Sizing plan from compute_sizing, MULTUS_RESOURCES when None
+        priority: Priority tiers from get_priority_config, datapath for the DaemonSet
 
     Returns:
         Tuple containing:
@@ -92,6 +186,10 @@ def deploy_multus(depends, version, bridge_name, k8s_provider):
     resource_name = f"k8snetworkplumbingwg-multus-daemonset-thick"
     manifest_url = f"https://raw.githubusercontent.com/k8snetworkplumbingwg/multus-cni/{version}/deployments/multus-daemonset-thick.yml"
 
+    resources = qos_resources(
+        priority, "multus", component_values(sizing, "multus").get("resources") or MULTUS_RESOURCES
+    )
+
     daemonset_patch = {
         "apiVersion": "apps/v1",
         "kind": "DaemonSet",
@@ -105,6 +203,8 @@ def deploy_multus(depends, version, bridge_name, k8s_provider):
                             "image": "ghcr.io/siderolabs/install-cni:v1.9.0",
                             "command": ["/install-cni.sh"],
                             "securityContext": {"privileged": True},
+                            # Every container needs resources for the pod QoS class
+                            "resources": resources,
                             "volumeMounts": [
                                 {
                                     "name": "cnibin",
@@ -122,7 +222,7 @@ def deploy_multus(depends, version, bridge_name, k8s_provider):
     multus = k8s.yaml.ConfigFile(
         resource_name,
         file=manifest_url,
-        transformations=[transform_resources],
+        transformations=[resource_transformation(resources, priority_class_name(priority, "datapath"))],
         opts=pulumi.ResourceOptions(
             provider=k8s_provider,
             depends_on=depends,
@@ -139,41 +239,40 @@ def deploy_multus(depends, version, bridge_name, k8s_provider):
         opts=pulumi.ResourceOptions(depends_on=[multus]),
     )
 
-    network_attachment_definition = k8s.apiextensions.CustomResource(
-        "kargo-net-attach-def",
-        api_version="k8s.cni.cncf.io/v1",
-        kind="NetworkAttachmentDefinition",
-        metadata={"name": f"{bridge_name}", "namespace": "default"},
-        spec={
-            "config": pulumi.Output.all(bridge_name, bridge_name).apply(
-                lambda args: f"""
-            {{
-                "cniVersion": "0.3.1",
-                "name": "{bridge_name}",
-                "plugins": [
-                    {{
-                        "type": "bridge",
-                        "bridge": "{bridge_name}",
-                        "ipam": {{}}
-                    }},
-                    {{
-                        "type": "tuning"
-                    }}
-                ]
-            }}"""
-            )
-        },
-        opts=pulumi.ResourceOptions(
-            depends_on=multus,
-            provider=k8s_provider,
-            custom_timeouts=pulumi.CustomTimeouts(
-                create="5m", update="5m", delete="5m"
+    network_attachment_definitions = []
+    for network in get_network_config(networks, bridge_name):
+        # Keep the original resource name for the default network to avoid a replace
+        if network["name"] == bridge_name and network["namespace"] == "default":
+            resource_name = "kargo-net-attach-def"
+        else:
+            resource_name = f"kargo-net-attach-def-{network['namespace']}-{network['name']}"
+
+        network_attachment_definition = k8s.apiextensions.CustomResource(
+            resource_name,
+            api_version="k8s.cni.cncf.io/v1",
+            kind="NetworkAttachmentDefinition",
+            metadata={"name": network["name"], "namespace": network["namespace"]},
+            spec={"config": gen_bridge_cni_config(network)},
+            opts=pulumi.ResourceOptions(
+                depends_on=multus,
+                provider=k8s_provider,
+                custom_timeouts=pulumi.CustomTimeouts(
+                    create="5m", update="5m", delete="5m"
+                ),
             ),
-        ),
-    )
+        )
+        network_attachment_definitions.append(network_attachment_definition)
 
     pulumi.export(
-        "network_attachment_definition", network_attachment_definition.metadata["name"]
+        "network_attachment_definition",
+        network_attachment_definitions[0].metadata["name"],
+    )
+    pulumi.export(
+        "network_attachment_definitions",
+        [
+            pulumi.Output.concat(nad.metadata["namespace"], "/", nad.metadata["name"])
+            for nad in network_attachment_definitions
+        ],
     )
 
     return "master", multus
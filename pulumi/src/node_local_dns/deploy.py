@@ -0,0 +1,378 @@
+import json
+import pulumi
+import pulumi_kubernetes as k8s
+from pulumi_kubernetes.apiextensions import CustomResource
+from src.lib.sizing import component_values
+from src.lib.priority import priority_class_name, qos_resources
+from src.lib.placement import node_placement
+
+
+def deploy_node_local_dns(
+    depends,
+    ns_name: str,
+    version: str,
+    cluster_dns_ip: str,
+    autoscaler_config: dict,
+    k8s_provider: k8s.Provider,
+    sizing: dict = None,
+    priority: dict = None,
+    placement: dict = None,
+):
+    """
+    Deploy a node-local DNS cache redirected to by a Cilium Local Redirect Policy
+
+    Pods and VMs keep using the kube-dns ClusterIP, Cilium redirects those
+    lookups to the cache pod on the same node, and only cache misses cross the
+    network to CoreDNS through the kube-dns-upstream service.
+
+    Args:
+        depends: List of resources this deployment depends on
+        ns_name: Namespace CoreDNS runs in (kube-system)
+        version: Version of the k8s-dns-node-cache image to deploy
+        cluster_dns_ip: ClusterIP of the kube-dns service
+        autoscaler_config: CoreDNS cluster-proportional autoscaler settings
+        k8s_provider: Kubernetes provider instance
+        sizing: Sizing plan from compute_sizing for the node-cache container
+        priority: Priority tiers from get_priority_config, datapath for the cache pods
+        placement: Node placement from get_placement_config, infra for the CoreDNS autoscaler
+
+    Returns:
+        Tuple containing:
+        - node-local-dns version deployed
+        - node-local-dns DaemonSet
+    """
+    labels = {
+        "k8s-app": "node-local-dns",
+        "app.kubernetes.io/managed-by": "pulumi",
+    }
+
+    # Service selecting the CoreDNS pods directly. The kube-dns ClusterIP is
+    # redirected to the local cache, so cache misses must use a different IP.
+    upstream_service = k8s.core.v1.Service(
+        "kube-dns-upstream",
+        metadata=k8s.meta.v1.ObjectMetaArgs(
+            name="kube-dns-upstream",
+            namespace=ns_name,
+            labels={"k8s-app": "kube-dns", "app.kubernetes.io/managed-by": "pulumi"},
+        ),
+        spec={
+            "ports": [
+                {"name": "dns", "port": 53, "protocol": "UDP", "targetPort": 53},
+                {"name": "dns-tcp", "port": 53, "protocol": "TCP", "targetPort": 53},
+            ],
+            "selector": {"k8s-app": "kube-dns"},
+        },
+        opts=pulumi.ResourceOptions(provider=k8s_provider, depends_on=depends),
+    )
+
+    # __PILLAR__ placeholders are substituted by the node-cache binary at startup
+    corefile = """cluster.local:53 {
+    errors
+    cache {
+        success 9984 30
+        denial 9984 5
+    }
+    reload
+    loop
+    bind 0.0.0.0
+    forward . __PILLAR__CLUSTER__DNS__ {
+        force_tcp
+    }
+    prometheus :9253
+    health
+}
+in-addr.arpa:53 {
+    errors
+    cache 30
+    reload
+    loop
+    bind 0.0.0.0
+    forward . __PILLAR__CLUSTER__DNS__ {
+        force_tcp
+    }
+    prometheus :9253
+}
+ip6.arpa:53 {
+    errors
+    cache 30
+    reload
+    loop
+    bind 0.0.0.0
+    forward . __PILLAR__CLUSTER__DNS__ {
+        force_tcp
+    }
+    prometheus :9253
+}
+.:53 {
+    errors
+    cache 30
+    reload
+    loop
+    bind 0.0.0.0
+    forward . __PILLAR__UPSTREAM__SERVERS__
+    prometheus :9253
+}
+"""
+
+    configmap = k8s.core.v1.ConfigMap(
+        "node-local-dns",
+        metadata=k8s.meta.v1.ObjectMetaArgs(
+            name="node-local-dns", namespace=ns_name, labels=labels
+        ),
+        data={"Corefile": corefile},
+        opts=pulumi.ResourceOptions(provider=k8s_provider, depends_on=depends),
+    )
+
+    service_account = k8s.core.v1.ServiceAccount(
+        "node-local-dns",
+        metadata=k8s.meta.v1.ObjectMetaArgs(
+            name="node-local-dns", namespace=ns_name, labels=labels
+        ),
+        opts=pulumi.ResourceOptions(provider=k8s_provider, depends_on=depends),
+    )
+
+    # Not hostNetwork: Cilium redirects to the pod endpoint, no iptables or
+    # dummy interface setup is needed on the node.
+    daemonset = k8s.apps.v1.DaemonSet(
+        "node-local-dns",
+        metadata=k8s.meta.v1.ObjectMetaArgs(
+            name="node-local-dns", namespace=ns_name, labels=labels
+        ),
+        spec={
+            "updateStrategy": {"rollingUpdate": {"maxUnavailable": "10%"}},
+            "selector": {"matchLabels": {"k8s-app": "node-local-dns"}},
+            "template": {
+                "metadata": {
+                    "labels": {"k8s-app": "node-local-dns"},
+                    "annotations": {
+                        "prometheus.io/port": "9253",
+                        "prometheus.io/scrape": "true",
+                    },
+                },
+                "spec": {
+                    "serviceAccountName": "node-local-dns",
+                    # Every pod and VM on the node resolves through the cache
+                    "priorityClassName": priority_class_name(priority, "datapath"),
+                    "dnsPolicy": "Default",
+                    "tolerations": [
+                        {"key": "CriticalAddonsOnly", "operator": "Exists"},
+                        {"effect": "NoExecute", "operator": "Exists"},
+                        {"effect": "NoSchedule", "operator": "Exists"},
+                    ],
+                    "containers": [
+                        {
+                            "name": "node-cache",
+                            "image": f"registry.k8s.io/dns/k8s-dns-node-cache:{version}",
+                            "imagePullPolicy": "IfNotPresent",
+                            "resources": qos_resources(
+                                priority,
+                                "node_local_dns",
+                                component_values(sizing, "node_local_dns").get("resources")
+                                or {"requests": {"cpu": "25m", "memory": "5Mi"}},
+                            ),
+                            "args": [
+                                "-localip",
+                                f"169.254.20.10,{cluster_dns_ip}",
+                                "-conf",
+                                "/etc/Corefile",
+                                "-upstreamsvc",
+                                "kube-dns-upstream",
+                                "-skipteardown=true",
+                                "-setupinterface=false",
+                                "-setupiptables=false",
+                            ],
+                            "ports": [
+                                {"containerPort": 53, "name": "dns", "protocol": "UDP"},
+                                {"containerPort": 53, "name": "dns-tcp", "protocol": "TCP"},
+                                {"containerPort": 9253, "name": "metrics", "protocol": "TCP"},
+                            ],
+                            "livenessProbe": {
+                                "httpGet": {"path": "/health", "port": 8080},
+                                "initialDelaySeconds": 60,
+                                "timeoutSeconds": 5,
+                            },
+                            "volumeMounts": [
+                                {"name": "config-volume", "mountPath": "/etc/coredns"},
+                                {"name": "kube-dns-config", "mountPath": "/etc/kube-dns"},
+                            ],
+                        }
+                    ],
+                    "volumes": [
+                        {
+                            "name": "kube-dns-config",
+                            "configMap": {"name": "kube-dns", "optional": True},
+                        },
+                        {
+                            "name": "config-volume",
+                            "configMap": {
+                                "name": "node-local-dns",
+                                "items": [{"key": "Corefile", "path": "Corefile.base"}],
+                            },
+                        },
+                    ],
+                },
+            },
+        },
+        opts=pulumi.ResourceOptions(
+            provider=k8s_provider,
+            depends_on=[upstream_service, configmap, service_account],
+            custom_timeouts=pulumi.CustomTimeouts(
+                create="8m", update="8m", delete="2m"
+            ),
+        ),
+    )
+
+    # Redirect kube-dns ClusterIP traffic to the node-local cache endpoint
+    local_redirect_policy = CustomResource(
+        "node-local-dns-lrp",
+        api_version="cilium.io/v2",
+        kind="CiliumLocalRedirectPolicy",
+        metadata={"name": "nodelocaldns", "namespace": ns_name, "labels": labels},
+        spec={
+            "redirectFrontend": {
+                "serviceMatcher": {"serviceName": "kube-dns", "namespace": ns_name}
+            },
+            "redirectBackend": {
+                "localEndpointSelector": {
+                    "matchLabels": {"k8s-app": "node-local-dns"}
+                },
+                "toPorts": [
+                    {"port": "53", "name": "dns", "protocol": "UDP"},
+                    {"port": "53", "name": "dns-tcp", "protocol": "TCP"},
+                ],
+            },
+        },
+        opts=pulumi.ResourceOptions(
+            provider=k8s_provider,
+            depends_on=[daemonset],
+        ),
+    )
+
+    deploy_coredns_autoscaler(ns_name, autoscaler_config, k8s_provider, depends, placement)
+
+    return version, daemonset
+
+
+def deploy_coredns_autoscaler(
+    ns_name: str,
+    autoscaler_config: dict,
+    k8s_provider: k8s.Provider,
+    depends,
+    placement: dict = None,
+):
+    """
+    Deploy the cluster-proportional-autoscaler for the CoreDNS deployment
+
+    Replicas = max(ceil(cores / cores_per_replica), ceil(nodes / nodes_per_replica))
+    bounded by min_replicas and max_replicas.
+
+    Args:
+        ns_name: Namespace CoreDNS runs in (kube-system)
+        autoscaler_config: Autoscaler settings from stack config
+        k8s_provider: Kubernetes provider instance
+        depends: List of resources this deployment depends on
+        placement: Node placement from get_placement_config
+
+    Returns:
+        Autoscaler Deployment
+    """
+    name = "coredns-autoscaler"
+    labels = {"k8s-app": name, "app.kubernetes.io/managed-by": "pulumi"}
+    linear_params = {
+        "coresPerReplica": int(autoscaler_config.get("cores_per_replica") or 256),
+        "nodesPerReplica": int(autoscaler_config.get("nodes_per_replica") or 16),
+        "min": int(autoscaler_config.get("min_replicas") or 2),
+        "max": int(autoscaler_config.get("max_replicas") or 20),
+        "preventSinglePointFailure": True,
+        "includeUnschedulableNodes": True,
+    }
+
+    service_account = k8s.core.v1.ServiceAccount(
+        name,
+        metadata=k8s.meta.v1.ObjectMetaArgs(name=name, namespace=ns_name, labels=labels),
+        opts=pulumi.ResourceOptions(provider=k8s_provider, depends_on=depends),
+    )
+
+    cluster_role = k8s.rbac.v1.ClusterRole(
+        name,
+        metadata=k8s.meta.v1.ObjectMetaArgs(name=name, labels=labels),
+        rules=[
+            k8s.rbac.v1.PolicyRuleArgs(
+                api_groups=[""], resources=["nodes"], verbs=["list", "watch"]
+            ),
+            k8s.rbac.v1.PolicyRuleArgs(
+                api_groups=[""],
+                resources=["replicationcontrollers/scale"],
+                verbs=["get", "update"],
+            ),
+            k8s.rbac.v1.PolicyRuleArgs(
+                api_groups=["apps"],
+                resources=["deployments/scale", "replicasets/scale"],
+                verbs=["get", "update"],
+            ),
+            k8s.rbac.v1.PolicyRuleArgs(
+                api_groups=[""], resources=["configmaps"], verbs=["get", "create"]
+            ),
+        ],
+        opts=pulumi.ResourceOptions(provider=k8s_provider, depends_on=depends),
+    )
+
+    cluster_role_binding = k8s.rbac.v1.ClusterRoleBinding(
+        name,
+        metadata=k8s.meta.v1.ObjectMetaArgs(name=name, labels=labels),
+        subjects=[
+            k8s.rbac.v1.SubjectArgs(
+                kind="ServiceAccount", name=name, namespace=ns_name
+            )
+        ],
+        role_ref=k8s.rbac.v1.RoleRefArgs(
+            api_group="rbac.authorization.k8s.io", kind="ClusterRole", name=name
+        ),
+        opts=pulumi.ResourceOptions(provider=k8s_provider, parent=cluster_role),
+    )
+
+    deployment = k8s.apps.v1.Deployment(
+        name,
+        metadata=k8s.meta.v1.ObjectMetaArgs(name=name, namespace=ns_name, labels=labels),
+        spec={
+            "replicas": 1,
+            "selector": {"matchLabels": {"k8s-app": name}},
+            "template": {
+                "metadata": {"labels": {"k8s-app": name}},
+                "spec": {
+                    "serviceAccountName": name,
+                    "priorityClassName": "system-cluster-critical",
+                    **node_placement(placement, "infra", {
+                        "tolerations": [
+                            {"key": "CriticalAddonsOnly", "operator": "Exists"}
+                        ],
+                    }),
+                    "containers": [
+                        {
+                            "name": "autoscaler",
+                            "image": "registry.k8s.io/cpa/cluster-proportional-autoscaler:v1.8.9",
+                            "imagePullPolicy": "IfNotPresent",
+                            "resources": {
+                                "requests": {"cpu": "20m", "memory": "10Mi"}
+                            },
+                            "command": [
+                                "/cluster-proportional-autoscaler",
+                                f"--namespace={ns_name}",
+                                f"--configmap={name}",
+                                "--target=deployment/coredns",
+                                f"--default-params={json.dumps({'linear': linear_params})}",
+                                "--logtostderr=true",
+                                "--v=2",
+                            ],
+                        }
+                    ],
+                },
+            },
+        },
+        opts=pulumi.ResourceOptions(
+            provider=k8s_provider,
+            depends_on=[service_account, cluster_role_binding],
+        ),
+    )
+
+    return deployment
@@ -0,0 +1,456 @@
+import os
+import json
+import hashlib
+import yaml
+import pulumi
+import pulumi_kubernetes as k8s
+from src.lib.inventory import Inventory
+from src.node_prep.talos import get_performance_config, generate_talos_patches
+
+# Node label recording the hash of the node preparation settings applied
+NODE_PREP_LABEL = "kargo.ccio.io/node-prep"
+
+# Node annotation recording the boot ID the settings were applied in
+NODE_PREP_BOOT_ANNOTATION = "kargo.ccio.io/node-prep-boot"
+
+HUGEPAGE_SIZES = {"2Mi": "2048kB", "1Gi": "1048576kB"}
+
+
+def get_node_prep_config(config_node_prep: dict, registry_mirrors: dict = None) -> dict:
+    """
+    Normalize the `node_prep` stack config
+
+    Args:
+        config_node_prep: `node_prep` stack config
+        registry_mirrors: Registry to mirror endpoint, see src.registry_cache.deploy.node_mirrors
+
+    Returns:
+        Normalized node preparation config
+    """
+    hugepages = config_node_prep.get("hugepages") or {}
+    hugepages_size = hugepages.get("size") or "2Mi"
+    if hugepages_size not in HUGEPAGE_SIZES:
+        raise ValueError(
+            f"Unsupported node_prep.hugepages.size: {hugepages_size}. "
+            f"Expected one of: {', '.join(HUGEPAGE_SIZES)}"
+        )
+
+    return {
+        # KubeVirt refuses to start VMs when it finds an enforcing SELinux without policy
+        "disable_selinux": str(config_node_prep.get("disable_selinux", True)).lower() == "true",
+        "sysctls": {
+            key: str(value) for key, value in (config_node_prep.get("sysctls") or {}).items()
+        },
+        "hugepages": {"size": hugepages_size, "count": int(hugepages.get("count") or 0)},
+        "kernel_modules": list(config_node_prep.get("kernel_modules") or []),
+        "registry_mirrors": dict(registry_mirrors or {}),
+        "image": config_node_prep.get("image") or "docker.io/library/alpine:3.20",
+        "kubectl_image": config_node_prep.get("kubectl_image") or "docker.io/bitnami/kubectl:1.31",
+        # How often the label check looks for rebooted or new nodes
+        "check_schedule": config_node_prep.get("check_schedule") or "*/10 * * * *",
+        "talos_patch_path": config_node_prep.get("talos_patch_path"),
+        "performance": get_performance_config(config_node_prep.get("performance") or {}),
+    }
+
+
+def node_prep_hash(prep: dict) -> str:
+    """Short hash of the host tweaks, recorded on prepared nodes."""
+    tweaks = {key: prep[key] for key in ("disable_selinux", "sysctls", "hugepages", "kernel_modules")}
+    if prep["registry_mirrors"]:
+        tweaks["registry_mirrors"] = prep["registry_mirrors"]
+    return hashlib.sha256(json.dumps(tweaks, sort_keys=True).encode()).hexdigest()[:10]
+
+
+def gen_talos_machine_patch(prep: dict) -> dict:
+    """
+    Render the node preparation as a Talos machine config patch
+
+    Talos applies sysctls, kernel modules and kernel arguments itself on
+    every boot, so no pods are needed. Kernel arguments take effect after
+    the next `talosctl upgrade`.
+
+    Args:
+        prep: Normalized config from get_node_prep_config
+
+    Returns:
+        Talos machine config patch
+    """
+    machine = {
+        "nodeLabels": {NODE_PREP_LABEL: node_prep_hash(prep)},
+    }
+    sysctls = dict(prep["sysctls"])
+    kernel_args = []
+
+    if prep["disable_selinux"]:
+        kernel_args.append("selinux=0")
+
+    hugepages = prep["hugepages"]
+    if hugepages["count"]:
+        if hugepages["size"] == "1Gi":
+            # 1Gi pages can only be reserved reliably at boot
+            kernel_args.extend(["default_hugepagesz=1G", "hugepagesz=1G", f"hugepages={hugepages['count']}"])
+        else:
+            sysctls["vm.nr_hugepages"] = str(hugepages["count"])
+
+    if sysctls:
+        machine["sysctls"] = sysctls
+    if prep["kernel_modules"]:
+        machine["kernel"] = {"modules": [{"name": module} for module in prep["kernel_modules"]]}
+    if kernel_args:
+        machine["install"] = {"extraKernelArgs": kernel_args}
+    if prep["registry_mirrors"]:
+        # Talos falls back to the upstream registry when the mirror is unreachable
+        machine["registries"] = {
+            "mirrors": {
+                registry: {"endpoints": [endpoint]}
+                for registry, endpoint in sorted(prep["registry_mirrors"].items())
+            }
+        }
+
+    return {"machine": machine}
+
+
+def gen_node_prep_script(prep: dict) -> str:
+    """
+    Shell script applying the node preparation through nsenter
+
+    Every step is idempotent. Runtime settings do not survive a reboot, the
+    label check starts the Job again when the node boot ID changes.
+
+    Args:
+        prep: Normalized config from get_node_prep_config
+
+    Returns:
+        Script for `sh -ec`
+    """
+    lines = []
+
+    if prep["disable_selinux"]:
+        lines.append(
+            "if [ -f /sys/fs/selinux/enforce ]; then mount -t tmpfs tmpfs /sys/fs/selinux; fi"
+        )
+
+    for key, value in sorted(prep["sysctls"].items()):
+        lines.append(f"echo '{value}' > /proc/sys/{key.replace('.', '/')}")
+
+    hugepages = prep["hugepages"]
+    if hugepages["count"]:
+        page_size = HUGEPAGE_SIZES[hugepages["size"]]
+        lines.append(
+            f"echo {hugepages['count']} > /sys/kernel/mm/hugepages/hugepages-{page_size}/nr_hugepages"
+        )
+
+    for module in prep["kernel_modules"]:
+        lines.append(f"modprobe {module}")
+
+    # containerd reads hosts.toml on every pull (config_path /etc/containerd/certs.d)
+    # and falls back to the server when the mirror is unreachable
+    for registry, endpoint in sorted(prep["registry_mirrors"].items()):
+        server = "https://registry-1.docker.io" if registry == "docker.io" else f"https://{registry}"
+        hosts_dir = f"/etc/containerd/certs.d/{registry}"
+        lines.append(f"mkdir -p {hosts_dir}")
+        lines.append(
+            f"printf '%s\\n' 'server = \"{server}\"' '' '[host.\"{endpoint}\"]' "
+            f"'  capabilities = [\"pull\", \"resolve\"]' > {hosts_dir}/hosts.toml"
+        )
+
+    return "\n".join(lines or ["true"])
+
+
+def jsonpath_key(key: str) -> str:
+    return key.replace(".", "\\.")
+
+
+def gen_node_check_script() -> str:
+    """
+    Shell script starting the node preparation Job of every node that needs it
+
+    A node needs it when its NODE_PREP_LABEL differs from the settings hash
+    or its NODE_PREP_BOOT_ANNOTATION differs from the current boot ID, so new
+    nodes, settings changes and reboots all start one Job. Prepared nodes are
+    skipped. Job names derive from node, boot ID and hash, so a Job still
+    running is not started twice. With WAIT=true the script waits for the
+    Jobs it started.
+    """
+    label = jsonpath_key(NODE_PREP_LABEL)
+    annotation = jsonpath_key(NODE_PREP_BOOT_ANNOTATION)
+    return "\n".join([
+        'nodes="$NODES"',
+        'if [ -z "$nodes" ]; then nodes=$(kubectl get nodes -o jsonpath=\'{.items[*].metadata.name}\'); fi',
+        'jobs=""',
+        'for node in $nodes; do',
+        f'  prepared=$(kubectl get node "$node" -o jsonpath=\'{{.metadata.labels.{label}}}\')',
+        f'  prepared_boot=$(kubectl get node "$node" -o jsonpath=\'{{.metadata.annotations.{annotation}}}\')',
+        '  boot=$(kubectl get node "$node" -o jsonpath=\'{.status.nodeInfo.bootID}\')',
+        '  if [ "$prepared" = "$PREP_HASH" ] && [ "$prepared_boot" = "$boot" ]; then continue; fi',
+        '  job="node-prep-$(printf \'%s\' "$node $boot $PREP_HASH" | sha256sum | cut -c1-16)"',
+        '  if ! kubectl get job "$job" -n "$NAMESPACE" >/dev/null 2>&1; then',
+        '    sed -e "s|__JOB__|$job|g" -e "s|__NODE__|$node|g" -e "s|__BOOT__|$boot|g" /etc/node-prep/job.json'
+        ' | kubectl create -f -',
+        '  fi',
+        '  jobs="$jobs $job"',
+        'done',
+        'if [ "$WAIT" = "true" ]; then',
+        '  for job in $jobs; do kubectl wait -n "$NAMESPACE" --for=condition=complete "job/$job" --timeout=600s; done',
+        'fi',
+    ])
+
+
+def gen_node_job_manifest(prep: dict, ns_name: str) -> dict:
+    """
+    Run-once node preparation Job, a template for the label check
+
+    `__JOB__`, `__NODE__` and `__BOOT__` are replaced with the Job name, the
+    node name and its boot ID. The Job applies the settings through nsenter,
+    then records the hash and boot ID on the node. Finished Jobs are removed
+    after an hour, so no pods stay behind.
+    """
+    prep_hash = node_prep_hash(prep)
+    labels = {"app": "node-prep", "app.kubernetes.io/managed-by": "pulumi"}
+    return {
+        "apiVersion": "batch/v1",
+        "kind": "Job",
+        "metadata": {"name": "__JOB__", "namespace": ns_name, "labels": labels},
+        "spec": {
+            "backoffLimit": 3,
+            "ttlSecondsAfterFinished": 3600,
+            "template": {
+                "metadata": {"labels": labels},
+                "spec": {
+                    "nodeName": "__NODE__",
+                    "serviceAccountName": "node-prep",
+                    "restartPolicy": "OnFailure",
+                    "hostPID": True,
+                    "hostNetwork": True,
+                    "tolerations": [{"operator": "Exists"}],
+                    "initContainers": [
+                        {
+                            "name": "prepare",
+                            "image": prep["image"],
+                            # Run in the host mount, uts, ipc, net and pid namespaces
+                            "command": [
+                                "nsenter", "-t", "1", "-m", "-u", "-i", "-n", "-p", "--",
+                                "sh", "-ec", gen_node_prep_script(prep),
+                            ],
+                            "securityContext": {"privileged": True},
+                            "resources": {
+                                "requests": {"cpu": "10m", "memory": "16Mi"},
+                                "limits": {"memory": "64Mi"},
+                            },
+                        }
+                    ],
+                    "containers": [
+                        {
+                            "name": "label",
+                            "image": prep["kubectl_image"],
+                            "command": [
+                                "sh", "-ec",
+                                f"kubectl label node __NODE__ {NODE_PREP_LABEL}={prep_hash} --overwrite\n"
+                                f"kubectl annotate node __NODE__ {NODE_PREP_BOOT_ANNOTATION}=__BOOT__ --overwrite",
+                            ],
+                            "resources": {
+                                "requests": {"cpu": "10m", "memory": "32Mi"},
+                                "limits": {"memory": "128Mi"},
+                            },
+                        }
+                    ],
+                },
+            },
+        },
+    }
+
+
+def deploy_node_prep(
+    depends,
+    ns_name: str,
+    prep: dict,
+    node_names: list,
+    k8s_provider: k8s.Provider,
+    kubernetes_distribution: str,
+    inventory: Inventory = None,
+):
+    """
+    Prepare every node once: SELinux workaround, sysctls, hugepages, kernel modules and registry mirrors
+
+    On talos the preparation is rendered as a machine config patch and
+    exported (and optionally written to talos_patch_path) for
+    `talosctl patch machineconfig`. Talos applies it on every boot and the
+    patch labels the nodes, so no workload is deployed. With performance
+    tuning configured, one validated patch per node is exported and written
+    to performance.output_dir as `<address>.yaml`.
+
+    Elsewhere a label check (gen_node_check_script) starts a run-once Job
+    on every node missing the settings hash or rebooted since it was
+    prepared. It runs once when the settings change and then on
+    check_schedule from a CronJob, and leaves no running pods.
+
+    Args:
+        depends: List of resources this deployment depends on
+        ns_name: Namespace the Jobs run in
+        prep: Normalized config from get_node_prep_config
+        node_names: Nodes to prepare, all nodes when empty; node addresses on talos
+        k8s_provider: Kubernetes provider instance
+        kubernetes_distribution: Type of k8s distribution (kind, talos)
+        inventory: Hardware inventory providing per-node links on talos
+
+    Returns:
+        List with the label check Job run by this update, empty on talos
+    """
+    prep_hash = node_prep_hash(prep)
+
+    if kubernetes_distribution == "talos":
+        base_patch = gen_talos_machine_patch(prep)
+        talos_patch = yaml.safe_dump(base_patch, sort_keys=False)
+        if prep["talos_patch_path"]:
+            with open(prep["talos_patch_path"], "w") as f:
+                f.write(talos_patch)
+        pulumi.export("node_prep_talos_patch", talos_patch)
+        pulumi.log.warn(
+            "node_prep: apply the exported node_prep_talos_patch to every node with "
+            "`talosctl patch machineconfig --nodes <address> --patch @<file>`"
+            + (f" (written to {prep['talos_patch_path']})" if prep["talos_patch_path"] else "")
+            + ". Kernel arguments (selinux=0, 1Gi hugepages) need a `talosctl upgrade` or reboot after that. "
+            f"Nodes without the {NODE_PREP_LABEL}={prep_hash} label are not patched yet."
+        )
+
+        if prep["performance"]:
+            inventory_nodes = {node.address: node for node in (inventory.nodes if inventory else [])}
+            patches = generate_talos_patches(
+                base_patch,
+                prep["performance"],
+                {address: inventory_nodes.get(address) for address in node_names},
+            )
+            rendered = {
+                address: yaml.safe_dump(patch, sort_keys=False) for address, patch in patches.items()
+            }
+            output_dir = prep["performance"]["output_dir"]
+            if output_dir:
+                os.makedirs(output_dir, exist_ok=True)
+                for address, patch in rendered.items():
+                    with open(os.path.join(output_dir, f"{address}.yaml"), "w") as f:
+                        f.write(patch)
+            pulumi.export("node_prep_talos_node_patches", rendered)
+        return []
+
+    if prep["performance"]:
+        pulumi.log.warn("node_prep.performance renders Talos machine config and is ignored on " + kubernetes_distribution)
+
+    labels = {"app": "node-prep", "app.kubernetes.io/managed-by": "pulumi"}
+    opts = pulumi.ResourceOptions(provider=k8s_provider, depends_on=depends)
+
+    service_account = k8s.core.v1.ServiceAccount(
+        "node-prep",
+        metadata=k8s.meta.v1.ObjectMetaArgs(name="node-prep", namespace=ns_name, labels=labels),
+        opts=opts,
+    )
+
+    # Read and label nodes
+    cluster_role = k8s.rbac.v1.ClusterRole(
+        "node-prep",
+        metadata=k8s.meta.v1.ObjectMetaArgs(name="kargo-node-prep", labels=labels),
+        rules=[k8s.rbac.v1.PolicyRuleArgs(api_groups=[""], resources=["nodes"], verbs=["get", "list", "patch"])],
+        opts=opts,
+    )
+    cluster_role_binding = k8s.rbac.v1.ClusterRoleBinding(
+        "node-prep",
+        metadata=k8s.meta.v1.ObjectMetaArgs(name="kargo-node-prep", labels=labels),
+        role_ref=k8s.rbac.v1.RoleRefArgs(
+            api_group="rbac.authorization.k8s.io", kind="ClusterRole", name="kargo-node-prep"
+        ),
+        subjects=[k8s.rbac.v1.SubjectArgs(kind="ServiceAccount", name="node-prep", namespace=ns_name)],
+        opts=pulumi.ResourceOptions(provider=k8s_provider, parent=cluster_role),
+    )
+
+    # Start and wait for the per-node Jobs
+    role = k8s.rbac.v1.Role(
+        "node-prep",
+        metadata=k8s.meta.v1.ObjectMetaArgs(name="node-prep", namespace=ns_name, labels=labels),
+        rules=[
+            k8s.rbac.v1.PolicyRuleArgs(
+                api_groups=["batch"], resources=["jobs"], verbs=["get", "list", "watch", "create"]
+            )
+        ],
+        opts=opts,
+    )
+    role_binding = k8s.rbac.v1.RoleBinding(
+        "node-prep",
+        metadata=k8s.meta.v1.ObjectMetaArgs(name="node-prep", namespace=ns_name, labels=labels),
+        role_ref=k8s.rbac.v1.RoleRefArgs(api_group="rbac.authorization.k8s.io", kind="Role", name="node-prep"),
+        subjects=[k8s.rbac.v1.SubjectArgs(kind="ServiceAccount", name="node-prep", namespace=ns_name)],
+        opts=pulumi.ResourceOptions(provider=k8s_provider, parent=role),
+    )
+
+    config_map = k8s.core.v1.ConfigMap(
+        "node-prep",
+        metadata=k8s.meta.v1.ObjectMetaArgs(name="node-prep", namespace=ns_name, labels=labels),
+        data={
+            "check.sh": gen_node_check_script(),
+            "job.json": json.dumps(gen_node_job_manifest(prep, ns_name), indent=2),
+        },
+        opts=opts,
+    )
+
+    def check_pod_spec(wait: bool) -> dict:
+        return {
+            "serviceAccountName": "node-prep",
+            "restartPolicy": "OnFailure",
+            "containers": [
+                {
+                    "name": "check",
+                    "image": prep["kubectl_image"],
+                    "command": ["sh", "-e", "/etc/node-prep/check.sh"],
+                    "env": [
+                        {"name": "NODES", "value": " ".join(node_names)},
+                        {"name": "PREP_HASH", "value": prep_hash},
+                        {"name": "NAMESPACE", "value": ns_name},
+                        {"name": "WAIT", "value": str(wait).lower()},
+                    ],
+                    "volumeMounts": [{"name": "node-prep", "mountPath": "/etc/node-prep"}],
+                    "resources": {
+                        "requests": {"cpu": "10m", "memory": "32Mi"},
+                        "limits": {"memory": "128Mi"},
+                    },
+                }
+            ],
+            "volumes": [{"name": "node-prep", "configMap": {"name": "node-prep"}}],
+        }
+
+    check_depends = [service_account, cluster_role_binding, role_binding, config_map]
+
+    # Reboots and new nodes are picked up by the schedule
+    k8s.batch.v1.CronJob(
+        "node-prep-check",
+        metadata=k8s.meta.v1.ObjectMetaArgs(name="node-prep-check", namespace=ns_name, labels=labels),
+        spec={
+            "schedule": prep["check_schedule"],
+            "concurrencyPolicy": "Forbid",
+            "successfulJobsHistoryLimit": 1,
+            "failedJobsHistoryLimit": 1,
+            "jobTemplate": {
+                "spec": {
+                    "backoffLimit": 1,
+                    "ttlSecondsAfterFinished": 600,
+                    "template": {"metadata": {"labels": labels}, "spec": check_pod_spec(False)},
+                }
+            },
+        },
+        opts=pulumi.ResourceOptions(provider=k8s_provider, depends_on=check_depends),
+    )
+
+    # Settings changes apply right away, dependents wait for every node
+    check_job = k8s.batch.v1.Job(
+        "node-prep-check-once",
+        metadata=k8s.meta.v1.ObjectMetaArgs(name=f"node-prep-check-{prep_hash}", namespace=ns_name, labels=labels),
+        spec={
+            "backoffLimit": 3,
+            "template": {"metadata": {"labels": labels}, "spec": check_pod_spec(True)},
+        },
+        opts=pulumi.ResourceOptions(
+            provider=k8s_provider,
+            depends_on=check_depends,
+            delete_before_replace=True,
+            custom_timeouts=pulumi.CustomTimeouts(create="15m", update="15m"),
+        ),
+    )
+
+    return [check_job]
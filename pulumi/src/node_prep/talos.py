@@ -0,0 +1,240 @@
+import os
+import shutil
+import tempfile
+import subprocess
+from typing import Dict, List, Optional
+import yaml
+import pulumi
+from src.lib.inventory import Node
+
+CPU_MANAGER_POLICIES = ("none", "static")
+TOPOLOGY_MANAGER_POLICIES = ("none", "best-effort", "restricted", "single-numa-node")
+CPU_GOVERNORS = ("performance", "schedutil", "powersave", "ondemand")
+
+
+def parse_cpu_list(cpu_list: str) -> set:
+    """Parse a Linux cpu list such as '0-1,4' into a set of cpu ids."""
+    cpus = set()
+    for part in str(cpu_list).split(","):
+        part = part.strip()
+        if not part:
+            continue
+        start, _, end = part.partition("-")
+        cpus.update(range(int(start), int(end or start) + 1))
+    return cpus
+
+
+def format_cpu_list(cpus: set) -> str:
+    """Format a set of cpu ids as a compact Linux cpu list, e.g. '2-7'."""
+    ranges = []
+    for cpu in sorted(cpus):
+        if ranges and cpu == ranges[-1][1] + 1:
+            ranges[-1][1] = cpu
+        else:
+            ranges.append([cpu, cpu])
+    return ",".join(f"{start}-{end}" if start != end else f"{start}" for start, end in ranges)
+
+
+def get_performance_config(config_performance: dict) -> Optional[dict]:
+    """
+    Normalize the `node_prep.performance` stack config
+
+    Args:
+        config_performance: `node_prep.performance` stack config
+
+    Returns:
+        Normalized performance config, None when not configured
+    """
+    if not config_performance:
+        return None
+
+    performance = {
+        "cpus": int(config_performance["cpus"]) if config_performance.get("cpus") else None,
+        "reserved_cpus": str(config_performance.get("reserved_cpus") or "0-1"),
+        "isolate_cpus": str(config_performance.get("isolate_cpus")).lower() == "true",
+        "cpu_manager_policy": config_performance.get("cpu_manager_policy") or "static",
+        "topology_manager_policy": config_performance.get("topology_manager_policy") or "best-effort",
+        "cpu_governor": config_performance.get("cpu_governor"),
+        "conntrack_max": int(config_performance.get("conntrack_max") or 1048576),
+        "neighbor_table_size": int(config_performance.get("neighbor_table_size") or 16384),
+        "nodes": config_performance.get("nodes") or {},
+        "output_dir": config_performance.get("output_dir"),
+    }
+
+    if performance["cpu_manager_policy"] not in CPU_MANAGER_POLICIES:
+        raise ValueError(f"node_prep.performance.cpu_manager_policy must be one of {CPU_MANAGER_POLICIES}")
+    if performance["topology_manager_policy"] not in TOPOLOGY_MANAGER_POLICIES:
+        raise ValueError(f"node_prep.performance.topology_manager_policy must be one of {TOPOLOGY_MANAGER_POLICIES}")
+    if performance["cpu_governor"] and performance["cpu_governor"] not in CPU_GOVERNORS:
+        raise ValueError(f"node_prep.performance.cpu_governor must be one of {CPU_GOVERNORS}")
+
+    return performance
+
+
+def gen_performance_patch(performance: dict, address: str, node: Node = None) -> dict:
+    """
+    Render the per-node performance tuning as a Talos machine config patch
+
+    Covers CPU isolation and IRQ affinity kernel args, the static kubelet CPU
+    manager, the cpufreq governor, conntrack/neighbour table sysctls and ARP
+    sysctls for every datapath link the inventory reports for the node.
+
+    Args:
+        performance: Normalized config from get_performance_config
+        address: Node address, used for per-node overrides and errors
+        node: Inventory node, if known
+
+    Returns:
+        Talos machine config patch
+    """
+    overrides = performance["nodes"].get(address) or {}
+    cpus = int(overrides.get("cpus") or performance["cpus"] or 0)
+    reserved_cpus = parse_cpu_list(overrides.get("reserved_cpus") or performance["reserved_cpus"])
+
+    if cpus and not reserved_cpus < set(range(cpus)):
+        raise ValueError(f"{address}: reserved_cpus must be a strict subset of cpus 0-{cpus - 1}")
+    if performance["isolate_cpus"] and not cpus:
+        raise ValueError(f"{address}: isolate_cpus requires the node cpu count (cpus)")
+    if performance["cpu_governor"] and not cpus:
+        raise ValueError(f"{address}: cpu_governor requires the node cpu count (cpus)")
+
+    # Keep device interrupts on the housekeeping cpus
+    kernel_args = [f"irqaffinity={format_cpu_list(reserved_cpus)}"]
+    if performance["isolate_cpus"]:
+        isolated = format_cpu_list(set(range(cpus)) - reserved_cpus)
+        kernel_args.extend([
+            f"isolcpus=managed_irq,domain,{isolated}",
+            f"nohz_full={isolated}",
+            f"rcu_nocbs={isolated}",
+        ])
+
+    neighbor_table_size = performance["neighbor_table_size"]
+    sysctls = {"net.netfilter.nf_conntrack_max": str(performance["conntrack_max"])}
+    for family in ("ipv4", "ipv6"):
+        sysctls[f"net.{family}.neigh.default.gc_thresh1"] = str(neighbor_table_size // 4)
+        sysctls[f"net.{family}.neigh.default.gc_thresh2"] = str(neighbor_table_size // 2)
+        sysctls[f"net.{family}.neigh.default.gc_thresh3"] = str(neighbor_table_size)
+
+    # Only answer and announce ARP for addresses on the interface itself, so
+    # multi-homed hosts and L2 announcements do not leak addresses across links
+    for link in (node.datapath_links() if node else []):
+        interface = link.id.replace(".", "/")
+        sysctls[f"net.ipv4.conf.{interface}.arp_ignore"] = "1"
+        sysctls[f"net.ipv4.conf.{interface}.arp_announce"] = "2"
+
+    machine = {
+        "sysctls": sysctls,
+        "install": {"extraKernelArgs": kernel_args},
+    }
+
+    if performance["cpu_manager_policy"] == "static":
+        machine["kubelet"] = {
+            "extraConfig": {
+                "cpuManagerPolicy": "static",
+                "reservedSystemCPUs": format_cpu_list(reserved_cpus),
+                "topologyManagerPolicy": performance["topology_manager_policy"],
+            }
+        }
+
+    if performance["cpu_governor"]:
+        machine["sysfs"] = {
+            f"devices.system.cpu.cpu{cpu}.cpufreq.scaling_governor": performance["cpu_governor"]
+            for cpu in range(cpus)
+        }
+
+    return {"machine": machine}
+
+
+def merge_patches(base: dict, extra: dict) -> dict:
+    """Deep merge two machine config patches, lists are concatenated."""
+    merged = dict(base)
+    for key, value in extra.items():
+        if isinstance(value, dict) and isinstance(merged.get(key), dict):
+            merged[key] = merge_patches(merged[key], value)
+        elif isinstance(value, list) and isinstance(merged.get(key), list):
+            merged[key] = merged[key] + value
+        else:
+            merged[key] = value
+    return merged
+
+
+def talosctl_run(args: List[str], cwd: str) -> subprocess.CompletedProcess:
+    return subprocess.run(["talosctl", *args], cwd=cwd, capture_output=True, text=True)
+
+
+def validate_talos_patches(patches: Dict[str, dict]) -> Optional[Dict[str, List[str]]]:
+    """
+    Validate machine config patches with talosctl
+
+    Each patch is applied to a freshly generated worker config with
+    `talosctl machineconfig patch`, and the result is checked with
+    `talosctl validate --mode metal`, so Talos itself decides what is valid.
+
+    Args:
+        patches: Node address to machine config patch
+
+    Returns:
+        Node address to error messages, empty when all are valid; None when talosctl is not installed
+    """
+    if not shutil.which("talosctl"):
+        return None
+
+    errors = {}
+    with tempfile.TemporaryDirectory(prefix="kargo-talos-validate-") as work_dir:
+        generated = talosctl_run([
+            "gen", "config", "kargo-validate", "https://127.0.0.1:6443",
+            "--output-types", "worker", "--output", "worker.yaml",
+            "--with-docs=false", "--with-examples=false",
+        ], work_dir)
+        if generated.returncode != 0:
+            raise RuntimeError(f"talosctl gen config failed: {generated.stderr.strip()}")
+
+        for address, patch in patches.items():
+            patch_file = os.path.join(work_dir, "patch.yaml")
+            with open(patch_file, "w") as f:
+                yaml.safe_dump(patch, f, sort_keys=False)
+            patched = talosctl_run([
+                "machineconfig", "patch", "worker.yaml", "--patch", "@patch.yaml", "--output", "patched.yaml",
+            ], work_dir)
+            if patched.returncode == 0:
+                patched = talosctl_run(["validate", "--config", "patched.yaml", "--mode", "metal"], work_dir)
+            if patched.returncode != 0:
+                errors[address] = [line for line in (patched.stderr or patched.stdout).strip().splitlines() if line]
+
+    return errors
+
+
+def generate_talos_patches(base_patch: dict, performance: dict, nodes: Dict[str, Optional[Node]]) -> Dict[str, dict]:
+    """
+    Build and validate the machine config patch for every node
+
+    Args:
+        base_patch: Cluster wide node preparation patch
+        performance: Normalized config from get_performance_config, or None
+        nodes: Node address to inventory node (None when not in the inventory)
+
+    Returns:
+        Node address to machine config patch, a single `all` entry without nodes
+
+    Raises:
+        ValueError: If a patch fails validation
+    """
+    if not nodes:
+        nodes = {"all": None}
+
+    patches = {}
+    for address, node in nodes.items():
+        patch = base_patch
+        if performance:
+            patch = merge_patches(base_patch, gen_performance_patch(performance, address, node))
+        patches[address] = patch
+
+    errors = validate_talos_patches(patches)
+    if errors is None:
+        pulumi.log.warn("talosctl is not installed, the Talos machine config patches are not validated")
+    elif errors:
+        raise ValueError("Invalid Talos machine config patches: " + "; ".join(
+            f"{address}: {' '.join(messages)}" for address, messages in sorted(errors.items())
+        ))
+
+    return patches
@@ -7,6 +7,8 @@ import pulumi_kubernetes as k8s
 from pulumi_kubernetes.apiextensions import CustomResource
 from src.lib.namespace import create_namespace
 from src.lib.helm_chart_versions import get_latest_helm_chart_version
+from src.lib.priority import priority_class_name
+from src.lib.placement import node_placement
 
 def sanitize_name(name: str) -> str:
     """Ensure the name complies with DNS-1035 and RFC 1123."""
@@ -26,7 +28,10 @@ def deploy_openunison(
         ou_github_client_id: str,
         ou_github_client_secret: str,
         ou_github_teams: str,
-        enabled
+        enabled,
+        hpa: dict = None,
+        priority: dict = None,
+        placement: dict = None
     ):
     kubernetes_dashboard_release = enabled["kubernetes_dashboard"]["release"]
     ns_retain = True
@@ -207,6 +212,23 @@ def deploy_openunison(
         }
     }
 
+    # The auth proxy on infra nodes
+    ou_placement = node_placement(placement, "infra")
+    ou_helm_values["services"]["node_selectors"] = [
+        {"name": name, "value": value} for name, value in (ou_placement.get("nodeSelector") or {}).items()
+    ]
+
+    # The orchestra chart renders its own HorizontalPodAutoscaler for the auth proxy
+    if hpa and hpa.get("openunison"):
+        ou_hpa = hpa["openunison"]
+        ou_helm_values["openunison"]["hpa"] = {
+            "enabled": True,
+            "min": int(ou_hpa["min_replicas"]),
+            "max": int(ou_hpa["max_replicas"]),
+            "cpu": ou_hpa["cpu_utilization"],
+            "memory": ou_hpa["memory_utilization"],
+        }
+
     if not running_in_gh_spaces:
         ou_helm_values["trusted_certs"].append(
             {
@@ -416,6 +438,29 @@ def deploy_openunison(
 
     ou_orchestra_release_name = ou_orchestra_release.name.apply(lambda name: name)
 
+    # The operator renders the auth proxy Deployment without a priority class
+    # or tolerations, patch them in with server-side apply
+    orchestra_pod_spec = {}
+    if priority:
+        orchestra_pod_spec["priorityClassName"] = priority_class_name(priority, "ui")
+    if ou_placement.get("tolerations"):
+        orchestra_pod_spec["tolerations"] = ou_placement["tolerations"]
+    if orchestra_pod_spec:
+        k8s.apps.v1.DeploymentPatch(
+            "openunison-orchestra-patch",
+            metadata=k8s.meta.v1.ObjectMetaPatchArgs(
+                name=ou_orchestra_release.name.apply(lambda name: sanitize_name('openunison-' + name)),
+                namespace=ns_name,
+                annotations={"pulumi.com/patchForce": "true"},
+            ),
+            spec={"template": {"spec": orchestra_pod_spec}},
+            opts=pulumi.ResourceOptions(
+                provider=k8s_provider,
+                parent=ou_orchestra_release,
+                depends_on=[ou_orchestra_release],
+            ),
+        )
+
     def update_values(name):
         return {
             **ou_helm_values,
@@ -509,7 +554,7 @@ def deploy_openunison(
         )
     )
 
-    return version, operator_release
+    return version, operator_release, ou_orchestra_release
 
 
 
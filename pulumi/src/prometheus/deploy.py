@@ -1,7 +1,148 @@
+import math
+from decimal import Decimal
 import pulumi
 import pulumi_kubernetes as k8s
+from kubernetes.utils import parse_quantity
 from src.lib.namespace import create_namespace
 from src.lib.helm_chart_versions import get_latest_helm_chart_version
+from src.lib.sizing import component_values, merge_values
+from src.lib.priority import priority_class_name
+from src.lib.placement import node_placement
+
+PROMETHEUS_PROFILES = {
+    # Matches the historical chart defaults: ephemeral storage, one replica
+    "development": {
+        "storage_size": None,
+        "storage_class": None,
+        "retention": "10d",
+        "retention_size": None,
+        # None keeps the chart's 30s
+        "scrape_interval": None,
+        "evaluation_interval": None,
+        # Kubelet, cAdvisor and kube-state-metrics, the high cardinality targets
+        "detail_scrape_interval": None,
+        "replicas": 1,
+        "shards": 1,
+        "wal_compression": True,
+        "helm_timeout_minutes": 30,
+    },
+    # Persistent TSDB and an HA pair, detail metrics at half resolution
+    "production": {
+        "storage_size": "50Gi",
+        "storage_class": None,
+        "retention": "15d",
+        "retention_size": None,
+        "scrape_interval": "30s",
+        "evaluation_interval": "30s",
+        "detail_scrape_interval": "60s",
+        "replicas": 2,
+        "shards": 1,
+        "wal_compression": True,
+        "helm_timeout_minutes": 15,
+    },
+    # Many VMs: longer history on a bigger volume, fewer samples per series
+    "large": {
+        "storage_size": "200Gi",
+        "storage_class": None,
+        "retention": "30d",
+        "retention_size": None,
+        "scrape_interval": "60s",
+        "evaluation_interval": "60s",
+        "detail_scrape_interval": "120s",
+        "replicas": 2,
+        "shards": 1,
+        "wal_compression": True,
+        "helm_timeout_minutes": 20,
+    },
+}
+
+# Share of the volume the TSDB may fill when retention_size is not set, the
+# rest is headroom for the WAL and compaction
+RETENTION_SIZE_RATIO = Decimal("0.85")
+
+
+def get_profile_config(profile: str, overrides: dict = None) -> dict:
+    """
+    Resolve a named Prometheus profile merged with per-key stack config overrides
+
+    Args:
+        profile: Name of the profile (development, production, large)
+        overrides: Dict of profile keys overriding the profile defaults
+
+    Returns:
+        Dict of resolved profile settings
+    """
+    if profile not in PROMETHEUS_PROFILES:
+        raise ValueError(
+            f"Unsupported Prometheus profile: {profile}. "
+            f"Expected one of: {', '.join(PROMETHEUS_PROFILES)}"
+        )
+
+    tuning = dict(PROMETHEUS_PROFILES[profile])
+    for key, value in (overrides or {}).items():
+        if key not in tuning:
+            raise ValueError(f"Unknown Prometheus tuning setting: {key}")
+        if value is not None:
+            tuning[key] = value
+
+    if int(tuning["replicas"]) < 1 or int(tuning["shards"]) < 1:
+        raise ValueError("prometheus.tuning.replicas and prometheus.tuning.shards must be at least 1")
+    if int(tuning["helm_timeout_minutes"]) < 1:
+        raise ValueError("prometheus.tuning.helm_timeout_minutes must be at least 1")
+    if tuning["storage_size"] and not tuning["retention_size"]:
+        # Size based retention keeps a full volume from crash looping Prometheus
+        size_mib = math.floor(parse_quantity(tuning["storage_size"]) * RETENTION_SIZE_RATIO / (1024 * 1024))
+        tuning["retention_size"] = f"{size_mib}MiB"
+    if tuning["retention_size"] and not tuning["storage_size"]:
+        pulumi.log.warn("Prometheus retention_size without storage_size limits the ephemeral node disk use only")
+    if int(tuning["shards"]) > 1:
+        # Each shard scrapes a subset of the targets, the prometheus Service and
+        # Grafana then see a different subset per query
+        pulumi.log.warn("Prometheus shards split the series, queries need a querier spanning all shards such as Thanos")
+
+    return tuning
+
+
+def get_tuning_values(tuning: dict) -> dict:
+    """
+    kube-prometheus-stack values for a resolved profile
+
+    Args:
+        tuning: Result of get_profile_config
+
+    Returns:
+        Helm values fragment
+    """
+    prometheus_spec = {
+        "replicas": int(tuning["replicas"]),
+        "shards": int(tuning["shards"]),
+        "retention": tuning["retention"],
+        "walCompression": bool(tuning["wal_compression"]),
+    }
+    if tuning["retention_size"]:
+        prometheus_spec["retentionSize"] = tuning["retention_size"]
+    if tuning["scrape_interval"]:
+        prometheus_spec["scrapeInterval"] = tuning["scrape_interval"]
+    if tuning["evaluation_interval"]:
+        prometheus_spec["evaluationInterval"] = tuning["evaluation_interval"]
+    if tuning["storage_size"]:
+        volume_claim_spec = {
+            "accessModes": ["ReadWriteOnce"],
+            "resources": {"requests": {"storage": tuning["storage_size"]}},
+        }
+        if tuning["storage_class"]:
+            volume_claim_spec["storageClassName"] = tuning["storage_class"]
+        prometheus_spec["storageSpec"] = {"volumeClaimTemplate": {"spec": volume_claim_spec}}
+
+    values = {"prometheus": {"prometheusSpec": prometheus_spec}}
+
+    # Per pod and per container series dominate the cardinality as VMs are added
+    detail_interval = tuning["detail_scrape_interval"]
+    if detail_interval:
+        values["kubelet"] = {"serviceMonitor": {"interval": detail_interval}}
+        values["kube-state-metrics"] = {"prometheus": {"monitor": {"interval": detail_interval}}}
+
+    return values
 
 
 def deploy_prometheus(
@@ -10,6 +151,10 @@ def deploy_prometheus(
     version: str,
     k8s_provider: k8s.Provider,
     openunison_enabled: bool,
+    sizing: dict = None,
+    priority: dict = None,
+    placement: dict = None,
+    tuning: dict = None,
 ):
 
     # Create the monitoring Namespace
@@ -46,6 +191,38 @@ def deploy_prometheus(
             }
         }
 
+    # Storage, retention, scrape intervals and replicas of the profile
+    tuning = tuning or get_profile_config("development")
+    prometheus_helm_values = merge_values(prometheus_helm_values, get_tuning_values(tuning))
+
+    # Prometheus memory follows the series count, which grows with nodes, VMs and pods
+    if sizing:
+        prometheus_helm_values = merge_values(prometheus_helm_values, {
+            "prometheus": {"prometheusSpec": component_values(sizing, "prometheus")},
+            "kube-state-metrics": component_values(sizing, "kube_state_metrics"),
+        })
+
+    if priority:
+        observability_priority = priority_class_name(priority, "observability")
+        prometheus_helm_values = merge_values(prometheus_helm_values, {
+            "prometheus": {"prometheusSpec": {"priorityClassName": observability_priority}},
+            "alertmanager": {"alertmanagerSpec": {"priorityClassName": observability_priority}},
+            "kube-state-metrics": {"priorityClassName": observability_priority},
+            "prometheus-node-exporter": {"priorityClassName": observability_priority},
+            "grafana": {"priorityClassName": observability_priority},
+        })
+
+    # Everything but the node exporter DaemonSet on infra nodes
+    if placement:
+        infra = node_placement(placement, "infra")
+        prometheus_helm_values = merge_values(prometheus_helm_values, {
+            "prometheus": {"prometheusSpec": infra},
+            "alertmanager": {"alertmanagerSpec": infra},
+            "prometheusOperator": infra,
+            "kube-state-metrics": infra,
+            "grafana": infra,
+        })
+
     # Fetch the latest version from the helm chart index
     chart_name = "kube-prometheus-stack"
     chart_index_path = "index.yaml"
@@ -59,6 +236,7 @@ def deploy_prometheus(
     else:
         pulumi.log.info(f"Using helm release version: {chart_name}/{version}")
 
+    helm_timeout = f"{int(tuning['helm_timeout_minutes'])}m"
     release = k8s.helm.v3.Release(
         "helm-release-prometheus",
         k8s.helm.v3.ReleaseArgs(
@@ -67,6 +245,7 @@ def deploy_prometheus(
             values=prometheus_helm_values,
             namespace="monitoring",
             skip_await=False,
+            timeout=int(tuning["helm_timeout_minutes"]) * 60,
             repository_opts=k8s.helm.v3.RepositoryOptsArgs(repo=chart_url),
         ),
         opts=pulumi.ResourceOptions(
@@ -74,7 +253,7 @@ def deploy_prometheus(
             parent=namespace,
             depends_on=depends,
             custom_timeouts=pulumi.CustomTimeouts(
-                create="30m", update="30m", delete="30m"
+                create=helm_timeout, update=helm_timeout, delete=helm_timeout
             ),
         ),
     )
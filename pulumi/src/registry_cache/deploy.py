@@ -0,0 +1,228 @@
+import pulumi
+import pulumi_kubernetes as k8s
+from src.lib.namespace import create_namespace
+from src.lib.images import split_image
+from src.lib.sizing import component_values
+from src.lib.priority import priority_class_name
+from src.lib.placement import node_placement
+
+# Upstream registries mirrored by default and the URL the proxy pulls from
+DEFAULT_UPSTREAMS = {
+    "docker.io": "https://registry-1.docker.io",
+    "quay.io": "https://quay.io",
+    "ghcr.io": "https://ghcr.io",
+    "registry.k8s.io": "https://registry.k8s.io",
+}
+
+# The distribution registry proxies a single upstream per instance, so each
+# upstream gets its own container and port in the cache pod
+REGISTRY_PORT = 5000
+
+
+def get_registry_cache_config(config_registry_cache: dict) -> dict:
+    """
+    Normalize the `registry_cache` stack config
+
+    Args:
+        config_registry_cache: `registry_cache` stack config
+
+    Returns:
+        Normalized registry cache config with one entry per mirrored registry
+    """
+    namespace = config_registry_cache.get("namespace") or "registry-cache"
+    node_port = int(config_registry_cache.get("node_port") or 30500)
+    host = config_registry_cache.get("host") or "127.0.0.1"
+    upstreams = config_registry_cache.get("upstreams") or DEFAULT_UPSTREAMS
+
+    mirrors = []
+    for index, (registry, upstream) in enumerate(sorted(upstreams.items())):
+        mirrors.append({
+            "registry": registry,
+            "name": registry.replace(".", "-"),
+            "upstream": upstream,
+            "port": REGISTRY_PORT + index,
+            "node_port": node_port + index,
+            # Nodes pull through the NodePort, containerd cannot resolve Service names
+            "node_endpoint": f"http://{host}:{node_port + index}",
+            "cluster_endpoint": f"registry-cache.{namespace}.svc:{REGISTRY_PORT + index}",
+        })
+
+    return {
+        "namespace": namespace,
+        "image": config_registry_cache.get("image") or "docker.io/library/registry:2.8.3",
+        "storage_size": config_registry_cache.get("storage_size") or "100Gi",
+        "storage_class": config_registry_cache.get("storage_class"),
+        "docker_hub": config_registry_cache.get("docker_hub") or {},
+        "mirrors": mirrors,
+    }
+
+
+def mirror_image(image: str, registry_cache: dict = None) -> str:
+    """
+    Image reference pulled through the in-cluster cache
+
+    For pods that pull images themselves (CDI importers) rather than
+    through the node container runtime. Unmirrored registries are kept.
+    """
+    if not registry_cache:
+        return image
+    registry, path = split_image(image)
+    for mirror in registry_cache["mirrors"]:
+        if mirror["registry"] == registry:
+            return f"{mirror['cluster_endpoint']}/{path}"
+    return image
+
+
+def node_mirrors(registry_cache: dict = None) -> dict:
+    """Registry to node side mirror endpoint, for containerd and Talos registry config."""
+    if not registry_cache:
+        return {}
+    return {mirror["registry"]: mirror["node_endpoint"] for mirror in registry_cache["mirrors"]}
+
+
+def deploy_registry_cache(
+    depends,
+    registry_cache: dict,
+    k8s_provider: k8s.Provider,
+    sizing: dict = None,
+    priority: dict = None,
+    placement: dict = None,
+):
+    """
+    Deploy a pull-through registry cache on cluster storage
+
+    One pod runs a distribution registry in proxy mode per upstream, all
+    sharing a single volume. Nodes reach it through NodePorts configured as
+    registry mirrors by node_prep (containerd hosts.toml or Talos
+    machine.registries), CDI importer pods through the Service. Runtimes
+    fall back to the upstream while the cache is unavailable.
+
+    Args:
+        depends: List of resources this deployment depends on
+        registry_cache: Normalized config from get_registry_cache_config
+        k8s_provider: Kubernetes provider instance
+        sizing: Sizing plan from compute_sizing, resources of each registry container
+        priority: Priority tiers from get_priority_config, storage for the cache pod
+        placement: Node placement from get_placement_config, infra for the cache pod
+
+    Returns:
+        registry-cache Deployment
+    """
+    ns_name = registry_cache["namespace"]
+    labels = {"app": "registry-cache", "app.kubernetes.io/managed-by": "pulumi"}
+
+    namespace = create_namespace(
+        depends,
+        ns_name,
+        False,
+        False,
+        k8s_provider,
+    )
+
+    opts = pulumi.ResourceOptions(provider=k8s_provider, parent=namespace, depends_on=depends)
+
+    pvc_spec = {
+        "accessModes": ["ReadWriteOnce"],
+        "resources": {"requests": {"storage": registry_cache["storage_size"]}},
+    }
+    if registry_cache["storage_class"]:
+        pvc_spec["storageClassName"] = registry_cache["storage_class"]
+
+    pvc = k8s.core.v1.PersistentVolumeClaim(
+        "registry-cache",
+        metadata=k8s.meta.v1.ObjectMetaArgs(name="registry-cache", namespace=ns_name, labels=labels),
+        spec=pvc_spec,
+        opts=opts,
+    )
+
+    # Authenticated Docker Hub pulls get a higher rate limit
+    docker_hub = registry_cache["docker_hub"]
+    credentials = None
+    if docker_hub.get("username") and docker_hub.get("password"):
+        credentials = k8s.core.v1.Secret(
+            "registry-cache-docker-hub",
+            metadata=k8s.meta.v1.ObjectMetaArgs(name="registry-cache-docker-hub", namespace=ns_name, labels=labels),
+            string_data={"username": docker_hub["username"], "password": docker_hub["password"]},
+            opts=opts,
+        )
+
+    containers = []
+    for mirror in registry_cache["mirrors"]:
+        env = [
+            {"name": "REGISTRY_HTTP_ADDR", "value": f":{mirror['port']}"},
+            {"name": "REGISTRY_PROXY_REMOTEURL", "value": mirror["upstream"]},
+            {"name": "REGISTRY_STORAGE_FILESYSTEM_ROOTDIRECTORY", "value": f"/var/lib/registry/{mirror['name']}"},
+            # Lets the proxy expire cached blobs
+            {"name": "REGISTRY_STORAGE_DELETE_ENABLED", "value": "true"},
+        ]
+        if credentials and mirror["registry"] == "docker.io":
+            env += [
+                {
+                    "name": f"REGISTRY_PROXY_{key.upper()}",
+                    "valueFrom": {"secretKeyRef": {"name": "registry-cache-docker-hub", "key": key}},
+                }
+                for key in ("username", "password")
+            ]
+
+        probe = {"httpGet": {"path": "/", "port": mirror["port"]}, "periodSeconds": 10}
+        containers.append({
+            "name": mirror["name"],
+            "image": registry_cache["image"],
+            "env": env,
+            "ports": [{"name": f"registry-{mirror['port']}", "containerPort": mirror["port"]}],
+            "readinessProbe": probe,
+            "livenessProbe": {**probe, "initialDelaySeconds": 10},
+            "resources": component_values(sizing, "registry_cache").get("resources") or {
+                "requests": {"cpu": "50m", "memory": "64Mi"},
+                "limits": {"memory": "512Mi"},
+            },
+            "volumeMounts": [{"name": "cache", "mountPath": "/var/lib/registry"}],
+        })
+
+    deployment = k8s.apps.v1.Deployment(
+        "registry-cache",
+        metadata=k8s.meta.v1.ObjectMetaArgs(name="registry-cache", namespace=ns_name, labels=labels),
+        spec={
+            "replicas": 1,
+            # The cache volume is ReadWriteOnce
+            "strategy": {"type": "Recreate"},
+            "selector": {"matchLabels": {"app": "registry-cache"}},
+            "template": {
+                "metadata": {"labels": labels},
+                "spec": {
+                    "priorityClassName": priority_class_name(priority, "storage"),
+                    **node_placement(placement, "infra"),
+                    "containers": containers,
+                    "volumes": [{"name": "cache", "persistentVolumeClaim": {"claimName": "registry-cache"}}],
+                },
+            },
+        },
+        opts=pulumi.ResourceOptions(
+            provider=k8s_provider,
+            parent=namespace,
+            depends_on=[pvc, *([credentials] if credentials else [])],
+        ),
+    )
+
+    k8s.core.v1.Service(
+        "registry-cache",
+        metadata=k8s.meta.v1.ObjectMetaArgs(name="registry-cache", namespace=ns_name, labels=labels),
+        spec={
+            "type": "NodePort",
+            "selector": {"app": "registry-cache"},
+            "ports": [
+                {
+                    "name": mirror["name"],
+                    "port": mirror["port"],
+                    "targetPort": mirror["port"],
+                    "nodePort": mirror["node_port"],
+                }
+                for mirror in registry_cache["mirrors"]
+            ],
+        },
+        opts=pulumi.ResourceOptions(provider=k8s_provider, parent=namespace, depends_on=[deployment]),
+    )
+
+    pulumi.export("registry_cache_mirrors", node_mirrors(registry_cache))
+
+    return deployment
@@ -0,0 +1,210 @@
+"""
+Pending-pods autoscaler for nested Talos VirtualMachinePools.
+
+Watches the nested cluster for unschedulable pods and scales the hosting
+cluster VirtualMachinePools within their min/max bounds:
+
+- scale up: a pool whose nodes could take a pending pod (its nodeSelector
+  matches the pool node labels) grows by one replica per cooldown period
+- scale down: after scale_down_delay seconds without pending pods, a pool
+  above its minimum with an idle node (no pods besides DaemonSets) has
+  that node drained, its VirtualMachine deleted, the pool shrunk by one
+  replica and the Node removed from the nested cluster. The VM is found
+  through its VMI, whose name or interface IPs match the node. Nodes
+  without a VM are uncordoned and left alone.
+
+Runs in the hosting cluster with its in-cluster service account and reads
+the nested kubeconfig from NESTED_KUBECONFIG. The config file named by
+AUTOSCALER_CONFIG looks like:
+
+    {"namespace": "default", "interval": 30, "cooldown": 120, "scale_down_delay": 600,
+     "pools": [{"name": "kargo-dev-workers", "min": 1, "max": 5, "node_labels": {...}}]}
+
+Deployed by src.vm.talos.deploy_talos_autoscaler. Depends only on the
+kubernetes client, the image is built from .github/docker/talos-autoscaler.
+"""
+import os
+import json
+import time
+import logging
+from kubernetes import client, config
+
+POOL_LABEL = "kargo.ccio.io/pool"
+
+
+def is_unschedulable(pod) -> bool:
+    return any(
+        condition.type == "PodScheduled" and condition.reason == "Unschedulable"
+        for condition in (pod.status.conditions or [])
+    )
+
+
+def is_daemonset_pod(pod) -> bool:
+    return any(owner.kind == "DaemonSet" for owner in (pod.metadata.owner_references or []))
+
+
+def pod_fits_pool(pod, pool: dict) -> bool:
+    """A pod can land on a pool node when its nodeSelector matches the pool node labels."""
+    labels = {**pool.get("node_labels", {}), POOL_LABEL: pool["name"]}
+    return all(labels.get(key) == value for key, value in (pod.spec.node_selector or {}).items())
+
+
+class Autoscaler:
+    def __init__(self, settings: dict, host: client.ApiClient, nested: client.ApiClient):
+        self.settings = settings
+        self.namespace = settings.get("namespace", "default")
+        self.pools = settings["pools"]
+        self.host = client.CustomObjectsApi(host)
+        self.nested = client.CoreV1Api(nested)
+        self.last_scale = 0.0
+        self.last_pending = time.monotonic()
+
+    def get_replicas(self, pool: dict) -> int:
+        vm_pool = self.host.get_namespaced_custom_object(
+            "pool.kubevirt.io", "v1alpha1", self.namespace, "virtualmachinepools", pool["name"]
+        )
+        return int(vm_pool["spec"].get("replicas", 0))
+
+    def set_replicas(self, pool: dict, replicas: int):
+        self.host.patch_namespaced_custom_object(
+            "pool.kubevirt.io", "v1alpha1", self.namespace, "virtualmachinepools", pool["name"],
+            {"spec": {"replicas": replicas}},
+        )
+        self.last_scale = time.monotonic()
+        logging.info(f"Scaled {pool['name']} to {replicas} replicas")
+
+    def pool_vm(self, pool: dict, node):
+        """Name of the pool VirtualMachine running a nested node, None when not found."""
+        addresses = {address.address for address in (node.status.addresses or [])}
+        vmis = self.host.list_namespaced_custom_object(
+            "kubevirt.io", "v1", self.namespace, "virtualmachineinstances"
+        )["items"]
+        for vmi in vmis:
+            name = vmi["metadata"]["name"]
+            ips = {
+                ip
+                for interface in (vmi.get("status", {}).get("interfaces") or [])
+                for ip in (interface.get("ipAddresses") or [interface.get("ipAddress")])
+                if ip
+            }
+            if name != node.metadata.name and not ips & addresses:
+                continue
+            # A VMI has the name of its VM, which the pool owns
+            vm = self.host.get_namespaced_custom_object(
+                "kubevirt.io", "v1", self.namespace, "virtualmachines", name
+            )
+            owners = vm["metadata"].get("ownerReferences") or []
+            if any(owner["kind"] == "VirtualMachinePool" and owner["name"] == pool["name"] for owner in owners):
+                return name
+        return None
+
+    def drain(self, node_name: str):
+        """Cordon a nested node and evict its pods besides DaemonSets."""
+        self.nested.patch_node(node_name, {"spec": {"unschedulable": True}})
+        pods = self.nested.list_pod_for_all_namespaces(field_selector=f"spec.nodeName={node_name}").items
+        for pod in pods:
+            if is_daemonset_pod(pod):
+                continue
+            self.nested.create_namespaced_pod_eviction(
+                pod.metadata.name,
+                pod.metadata.namespace,
+                client.V1Eviction(
+                    metadata=client.V1ObjectMeta(name=pod.metadata.name, namespace=pod.metadata.namespace)
+                ),
+            )
+
+    def scale_in(self, pool: dict, replicas: int, node) -> bool:
+        """
+        Remove one idle node and its VM from a pool
+
+        The VM is deleted before replicas is lowered. The pool controller
+        counts VMs that are being deleted towards a scale in, so it does not
+        remove a second, possibly busy, VM.
+        """
+        node_name = node.metadata.name
+        vm_name = self.pool_vm(pool, node)
+        if not vm_name:
+            logging.warning(f"{node_name}: no VirtualMachine of {pool['name']} found, not scaling in")
+            return False
+
+        try:
+            self.drain(node_name)
+            self.host.delete_namespaced_custom_object(
+                "kubevirt.io", "v1", self.namespace, "virtualmachines", vm_name
+            )
+        except client.exceptions.ApiException as e:
+            logging.warning(f"{node_name}: scale in failed, uncordoning: {e.status} {e.reason}")
+            self.nested.patch_node(node_name, {"spec": {"unschedulable": False}})
+            return False
+
+        self.set_replicas(pool, replicas - 1)
+        logging.info(f"Deleted {vm_name} running idle node {node_name}")
+        self.nested.delete_node(node_name)
+        return True
+
+    def idle_nodes(self, pool: dict) -> list:
+        nodes = self.nested.list_node(label_selector=f"{POOL_LABEL}={pool['name']}").items
+        pods = self.nested.list_pod_for_all_namespaces(field_selector="status.phase=Running").items
+        busy = {pod.spec.node_name for pod in pods if not is_daemonset_pod(pod)}
+        return [
+            node for node in nodes
+            if node.metadata.name not in busy and not node.spec.unschedulable
+        ]
+
+    def reconcile(self):
+        now = time.monotonic()
+        if now - self.last_scale < int(self.settings.get("cooldown", 120)):
+            return
+
+        pending = [
+            pod for pod in self.nested.list_pod_for_all_namespaces(field_selector="status.phase=Pending").items
+            if is_unschedulable(pod)
+        ]
+
+        if pending:
+            self.last_pending = now
+            for pool in self.pools:
+                replicas = self.get_replicas(pool)
+                if replicas < pool["max"] and any(pod_fits_pool(pod, pool) for pod in pending):
+                    self.set_replicas(pool, replicas + 1)
+                    return
+            logging.info(f"{len(pending)} unschedulable pods, all matching pools at max")
+            return
+
+        if now - self.last_pending < int(self.settings.get("scale_down_delay", 600)):
+            return
+
+        # Shrink the last configured pools first
+        for pool in reversed(self.pools):
+            replicas = self.get_replicas(pool)
+            if replicas <= pool["min"]:
+                continue
+            for node in self.idle_nodes(pool):
+                if self.scale_in(pool, replicas, node):
+                    self.last_pending = now
+                    return
+
+    def run(self):
+        interval = int(self.settings.get("interval", 30))
+        while True:
+            try:
+                self.reconcile()
+            except client.exceptions.ApiException as e:
+                logging.warning(f"Reconcile failed: {e.status} {e.reason}")
+            time.sleep(interval)
+
+
+def main():
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(message)s")
+    with open(os.environ.get("AUTOSCALER_CONFIG", "/etc/autoscaler/config.json"), "r") as f:
+        settings = json.load(f)
+
+    config.load_incluster_config()
+    host = client.ApiClient()
+    nested = config.new_client_from_config(config_file=os.environ.get("NESTED_KUBECONFIG", "/etc/nested/kubeconfig"))
+
+    Autoscaler(settings, host, nested).run()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,463 @@
+import os
+import json
+import time
+import math
+import logging
+from dataclasses import dataclass, field
+from decimal import Decimal
+from typing import Dict, List, Optional, Tuple
+import yaml
+import pulumi
+from kubernetes import client as k8s_client
+from kubernetes.utils import parse_quantity
+from src.lib.inventory import Inventory
+from src.lib.kube_client import new_api_client
+from src.vm.ubuntu import VM_CPU_CORES, VM_MEMORY
+
+GiB = 1024 * 1024 * 1024
+MiB = 1024 * 1024
+
+# KubeVirt requests 1/cpuAllocationRatio of a core per vCPU (default ratio 10)
+CPU_ALLOCATION_RATIO = 10
+
+# Approximation of KubeVirt's virt-launcher memory overhead: fixed daemons
+# (virt-launcher, virtqemud, virtlogd, qemu), per vCPU stacks and guest page tables
+LAUNCHER_MEMORY_OVERHEAD = 210 * MiB
+VCPU_MEMORY_OVERHEAD = 8 * MiB
+PAGE_TABLE_RATIO = 512
+
+# Taints that keep VMs, which carry no tolerations, off a node
+BLOCKING_TAINT_EFFECTS = ("NoSchedule", "NoExecute")
+
+
+def get_capacity_config(config_capacity: dict) -> dict:
+    """
+    Normalize the `capacity` stack config
+
+    Args:
+        config_capacity: `capacity` stack config
+
+    Returns:
+        Normalized capacity planner config
+    """
+    capacity = {
+        "source": config_capacity.get("source") or "api",
+        "file": config_capacity.get("file"),
+        "cache_path": config_capacity.get("cache_path") or "../.kargo/capacity.json",
+        "cache_ttl": int(config_capacity.get("cache_ttl") or 300),
+        "headroom_percent": float(config_capacity.get("headroom_percent") or 10),
+        "enforce": str(config_capacity.get("enforce", True)).lower() == "true",
+    }
+
+    if capacity["source"] not in ("api", "file"):
+        raise ValueError(f"capacity.source must be api or file, got: {capacity['source']}")
+    if capacity["source"] == "file" and not capacity["file"]:
+        raise ValueError("capacity.source file requires capacity.file")
+    if not 0 <= capacity["headroom_percent"] < 100:
+        raise ValueError("capacity.headroom_percent must be between 0 and 100")
+
+    return capacity
+
+
+def to_units(resource: str, quantity) -> int:
+    """Quantity as an int in planner units: millicores for cpu, bytes otherwise."""
+    value = parse_quantity(quantity)
+    return int(value * 1000) if resource == "cpu" else int(value)
+
+
+def format_units(resource: str, value: int) -> str:
+    if resource == "cpu":
+        return f"{value}m"
+    return f"{value / GiB:.1f}Gi"
+
+
+def pod_requests(pod) -> Dict[str, Decimal]:
+    """Effective pod requests: the containers' sum or the largest init container, whichever is higher."""
+    def requests(container) -> Dict[str, Decimal]:
+        return {
+            name: parse_quantity(value)
+            for name, value in ((container.resources and container.resources.requests) or {}).items()
+        }
+
+    total: Dict[str, Decimal] = {}
+    for container in pod.spec.containers:
+        for name, value in requests(container).items():
+            total[name] = total.get(name, Decimal(0)) + value
+    for container in pod.spec.init_containers or []:
+        for name, value in requests(container).items():
+            total[name] = max(total.get(name, Decimal(0)), value)
+    return total
+
+
+def query_cluster_capacity(api_client) -> List[dict]:
+    """
+    Allocatable and requested resources of every node
+
+    Requests of virt-launcher pods are kept per VM name so the planner can
+    replace them with the planned shape of the same VM.
+    """
+    core = k8s_client.CoreV1Api(api_client)
+
+    nodes = {}
+    for node in core.list_node().items:
+        taints = [taint for taint in (node.spec.taints or []) if taint.effect in BLOCKING_TAINT_EFFECTS]
+        nodes[node.metadata.name] = {
+            "name": node.metadata.name,
+            "schedulable": not node.spec.unschedulable and not taints,
+            "allocatable": dict(node.status.allocatable or {}),
+            "requested": {},
+            "vms": {},
+        }
+
+    pods = core.list_pod_for_all_namespaces(
+        field_selector="status.phase!=Succeeded,status.phase!=Failed"
+    ).items
+    for pod in pods:
+        node = nodes.get(pod.spec.node_name)
+        if not node:
+            continue
+        vm_name = (pod.metadata.labels or {}).get("vm.kubevirt.io/name")
+        if vm_name:
+            target = node["vms"].setdefault(vm_name, {})
+        else:
+            target = node["requested"]
+        for name, value in pod_requests(pod).items():
+            target[name] = str(Decimal(target.get(name, 0)) + value)
+
+    return list(nodes.values())
+
+
+def load_cluster_capacity(kubeconfig: str, context: str, cache_path: str, cache_ttl: int) -> Optional[List[dict]]:
+    """
+    Node capacity from the API, cached for cache_ttl seconds
+
+    The cache file uses the offline capacity file format. A stale cache is
+    used when the cluster cannot be reached, None when there is neither.
+    """
+    cached = None
+    if os.path.exists(cache_path):
+        with open(cache_path, "r") as f:
+            cached = json.load(f)
+        if cached.get("context") == context and time.time() - cached.get("fetched_at", 0) < cache_ttl:
+            return cached["nodes"]
+
+    try:
+        nodes = query_cluster_capacity(new_api_client(kubeconfig, context))
+    except Exception as e:
+        if cached and cached.get("context") == context:
+            logging.warning(f"Using stale capacity cache {cache_path}: {e}")
+            return cached["nodes"]
+        logging.warning(f"Cannot query node capacity: {e}")
+        return None
+
+    os.makedirs(os.path.dirname(os.path.abspath(cache_path)), exist_ok=True)
+    with open(cache_path, "w") as f:
+        json.dump({"context": context, "fetched_at": time.time(), "nodes": nodes}, f, indent=2)
+    return nodes
+
+
+def load_capacity_file(path: str) -> List[dict]:
+    """
+    Node capacity from an offline YAML or JSON file
+
+    Format, `requested`, `vms` and `storage` are optional:
+
+        nodes:
+          - name: node1
+            allocatable: {cpu: "16", memory: 64Gi, hugepages-2Mi: 8Gi}
+            requested: {cpu: 2500m, memory: 6Gi}
+            storage: {ssd: 900Gi}
+    """
+    with open(path, "r") as f:
+        return yaml.safe_load(f)["nodes"]
+
+
+def inventory_storage(
+    inventory: Optional[Inventory], storage_pools: list, device_classes: List[str], base_path: str
+) -> Dict[str, Dict[str, int]]:
+    """
+    Node local storage capacity per node name and StorageClass
+
+    Derived from the hardware inventory for the hostpath-provisioner pools
+    Inventory.storage_pools creates, whose path is the mountpoint of one
+    disk in Inventory.talos_disk_patches. Other pools live on a filesystem
+    the inventory knows nothing about and are not counted.
+
+    Args:
+        inventory: Hardware inventory, None when not configured
+        storage_pools: Normalized pools from get_storage_pools
+        device_classes: Device classes assigned to hostpath in inventory.disk_roles
+        base_path: hostpath-provisioner default_path the pools are mounted under
+    """
+    storage = {}
+    if not inventory:
+        return storage
+    disks = inventory.hostpath_disks(device_classes)
+    for node in inventory.nodes:
+        for pool in storage_pools:
+            disk = disks.get(node.address, {}).get(pool["name"])
+            if disk and pool["path"] == f"{base_path}/{pool['name']}":
+                storage.setdefault(node.name, {})[pool["storage_class"]] = int(disk.size_gb * 1000 ** 3)
+    return storage
+
+
+@dataclass
+class NodeCapacity:
+    """Free resources of a node after existing requests and headroom."""
+    name: str
+    free: Dict[str, int]
+    storage: Dict[str, int] = field(default_factory=dict)
+
+    def fits(self, demand: "VmDemand", local_classes: set) -> bool:
+        """Resources fit, and node local disks fit a pool this node has."""
+        return all(self.free.get(name, 0) >= value for name, value in demand.resources.items()) and all(
+            self.storage.get(storage_class, 0) >= size
+            for storage_class, size in demand.storage.items()
+            if storage_class in local_classes
+        )
+
+    def reserve(self, demand: "VmDemand"):
+        for name, value in demand.resources.items():
+            self.free[name] = self.free.get(name, 0) - value
+        for storage_class, size in demand.storage.items():
+            if storage_class in self.storage:
+                self.storage[storage_class] -= size
+
+
+@dataclass
+class VmDemand:
+    """Pod requests and node local disks of one VM or DataVolume."""
+    name: str
+    resources: Dict[str, int]
+    storage: Dict[str, int] = field(default_factory=dict)
+
+
+def build_node_capacity(
+        nodes: List[dict],
+        storage: Dict[str, Dict[str, int]],
+        headroom_percent: float,
+        planned_vms: set
+    ) -> List[NodeCapacity]:
+    """
+    Free capacity of every schedulable node
+
+    headroom_percent of allocatable and of each storage pool is held back.
+    Existing virt-launcher pods of planned VMs are not counted as used,
+    their planned shape replaces them.
+    """
+    capacities = []
+    for node in nodes:
+        if not node.get("schedulable", True):
+            continue
+        keep = 1 - headroom_percent / 100
+        free = {
+            name: int(to_units(name, value) * keep)
+            for name, value in node["allocatable"].items()
+            if name == "cpu" or name == "memory" or name.startswith("hugepages-")
+        }
+        used = [node.get("requested") or {}]
+        used += [requests for vm_name, requests in (node.get("vms") or {}).items() if vm_name not in planned_vms]
+        for requests in used:
+            for name, value in requests.items():
+                if name in free:
+                    free[name] -= to_units(name, value)
+
+        node_storage = {
+            storage_class: int(to_units("storage", size) * keep)
+            for storage_class, size in {**storage.get(node["name"], {}), **(node.get("storage") or {})}.items()
+        }
+        capacities.append(NodeCapacity(name=node["name"], free=free, storage=node_storage))
+    return capacities
+
+
+def vm_pod_requests(cpu_cores: int, memory: int, tuning: dict = None, hugepages: str = None, cpu: int = None) -> Dict[str, int]:
+    """
+    virt-launcher pod requests for a VM shape
+
+    Args:
+        cpu_cores: Guest vCPUs
+        memory: Guest memory in bytes
+        tuning: Resolved KubeVirt profile (memory_overcommit, guest_memory_overhead_ratio)
+        hugepages: Hugepage size backing guest memory, e.g. 2Mi
+        cpu: Explicit cpu request in millicores instead of the vCPU share
+    """
+    tuning = tuning or {}
+    overhead = LAUNCHER_MEMORY_OVERHEAD + VCPU_MEMORY_OVERHEAD * cpu_cores + memory // PAGE_TABLE_RATIO
+    if tuning.get("guest_memory_overhead_ratio"):
+        overhead = int(overhead * float(tuning["guest_memory_overhead_ratio"]))
+
+    requests = {"cpu": cpu if cpu is not None else cpu_cores * 1000 // CPU_ALLOCATION_RATIO}
+    if hugepages:
+        requests[f"hugepages-{hugepages}"] = memory
+        requests["memory"] = overhead
+    else:
+        overcommit = int(tuning.get("memory_overcommit") or 100)
+        requests["memory"] = math.ceil(memory * 100 / overcommit) + overhead
+    return requests
+
+
+def talos_pool_demands(vm_config: dict, replicas: int, tuning: dict = None, default_storage_class: str = None, start: int = 0) -> List[VmDemand]:
+    """Demands of Talos VirtualMachinePool members start..replicas-1, see src.vm.talos.get_talos_config."""
+    cpu_cores = int(vm_config["cpu_cores"])
+    resources = vm_pod_requests(cpu_cores, int(float(vm_config["memory_size"]) * GiB), tuning, vm_config.get("hugepages"))
+
+    pool_class = vm_config.get("storage_class") or default_storage_class
+    storage = {}
+
+    def add_disk(storage_class, size_gib):
+        # Live migrating disks are shared RWX volumes, not node local
+        if storage_class and not vm_config.get("live_migrate"):
+            storage[storage_class] = storage.get(storage_class, 0) + int(float(size_gib) * GiB)
+
+    add_disk(pool_class, vm_config["root_disk_size"])
+    if int(vm_config["empty_disk_size"]) > 0:
+        add_disk(pool_class, vm_config["empty_disk_size"])
+    for disk in vm_config.get("disks") or []:
+        disk = disk if isinstance(disk, dict) else {"size": disk}
+        add_disk(disk.get("storage_class") or pool_class, disk["size"])
+
+    return [
+        VmDemand(name=f"{vm_config['vm_pool_name']}-{index}", resources=dict(resources), storage=dict(storage))
+        for index in range(start, replicas)
+    ]
+
+
+def golden_image_demands(golden_images: list, default_storage_class: str = None) -> List[VmDemand]:
+    """DataVolumes kept by the CDI golden image DataImportCrons, see cdi.golden_images."""
+    demands = []
+    for image in golden_images:
+        storage_class = image.get("storage_class") or default_storage_class
+        if not storage_class:
+            continue
+        size = int(float(image.get("size") or 32) * GiB) * int(image.get("imports_to_keep") or 2)
+        demands.append(VmDemand(name=f"golden-image-{image['name']}", resources={}, storage={storage_class: size}))
+    return demands
+
+
+def pack(capacities: List[NodeCapacity], demands: List[VmDemand]) -> Tuple[Dict[str, str], List[VmDemand]]:
+    """
+    Place demands largest first onto the fitting node with the most free memory
+
+    Spreading mirrors the scheduler's default least-allocated scoring, so
+    the result is close to where the VMs will actually land.
+
+    Returns:
+        Placements by demand name and the demands that fit nowhere
+    """
+    # Classes without capacity data (shared storage, unknown pools) are not checked
+    local_classes = {storage_class for capacity in capacities for storage_class in capacity.storage}
+    placements = {}
+    unplaced = []
+    ordered = sorted(
+        demands,
+        key=lambda demand: (
+            sum(value for name, value in demand.resources.items() if name != "cpu"),
+            demand.resources.get("cpu", 0),
+            sum(demand.storage.values()),
+        ),
+        reverse=True,
+    )
+    for demand in ordered:
+        candidates = [capacity for capacity in capacities if capacity.fits(demand, local_classes)]
+        if not candidates:
+            unplaced.append(demand)
+            continue
+        target = max(candidates, key=lambda capacity: (capacity.free.get("memory", 0), capacity.name))
+        target.reserve(demand)
+        placements[demand.name] = target.name
+    return placements, unplaced
+
+
+def headroom_report(capacities: List[NodeCapacity]) -> Dict[str, Dict[str, str]]:
+    """Free resources left on every node after placement."""
+    return {
+        capacity.name: {
+            **{name: format_units(name, value) for name, value in sorted(capacity.free.items())},
+            **{f"storage/{name}": format_units("storage", value) for name, value in sorted(capacity.storage.items())},
+        }
+        for capacity in capacities
+    }
+
+
+def check_vm_capacity(
+        capacity: dict,
+        nodes: List[dict],
+        storage: Dict[str, Dict[str, int]],
+        talos_configs: List[dict],
+        ubuntu_vm: Optional[dict],
+        golden_images: list,
+        tuning: dict = None,
+        default_storage_class: str = None
+    ) -> dict:
+    """
+    Bin-pack all requested VMs and DataVolumes onto the nodes
+
+    Args:
+        capacity: Normalized config from get_capacity_config
+        nodes: Node capacity from load_cluster_capacity or load_capacity_file
+        storage: Node local storage from inventory_storage
+        talos_configs: Talos pool configs from src.vm.talos (controlplane and workers)
+        ubuntu_vm: Ubuntu VM config when `vm` is enabled
+        golden_images: `cdi.golden_images` entries
+        tuning: Resolved KubeVirt profile
+        default_storage_class: Node local StorageClass that is the cluster default
+
+    Returns:
+        Plan with placements, unplaced demands and per node headroom
+
+    Raises:
+        ValueError: When capacity.enforce is set and the plan does not fit
+    """
+    demands = []
+    autoscale_demands = []
+    for vm_config in talos_configs:
+        demands += talos_pool_demands(vm_config, vm_config["replicas"], tuning, default_storage_class)
+        if vm_config.get("autoscaled"):
+            autoscale_demands += talos_pool_demands(
+                vm_config, vm_config["max_replicas"], tuning, default_storage_class, start=vm_config["replicas"]
+            )
+    if ubuntu_vm:
+        # Limits only, so KubeVirt requests the limits
+        memory = to_units("memory", VM_MEMORY)
+        demands.append(VmDemand(
+            name=ubuntu_vm.get("instance_name", "ubuntu"),
+            resources=vm_pod_requests(VM_CPU_CORES, memory, {**(tuning or {}), "memory_overcommit": 100}, cpu=VM_CPU_CORES * 1000),
+        ))
+    demands += golden_image_demands(golden_images, default_storage_class)
+
+    capacities = build_node_capacity(
+        nodes, storage, capacity["headroom_percent"], {demand.name for demand in demands + autoscale_demands}
+    )
+    placements, unplaced = pack(capacities, demands)
+    report = headroom_report(capacities)
+
+    for node_name, free in report.items():
+        pulumi.log.info(f"Capacity headroom on {node_name}: " + ", ".join(f"{name} {value}" for name, value in free.items()))
+
+    if autoscale_demands and not unplaced:
+        _, autoscale_unplaced = pack(capacities, autoscale_demands)
+        if autoscale_unplaced:
+            pulumi.log.warn(
+                f"Autoscaled Talos pools cannot reach max_replicas, {len(autoscale_unplaced)} members do not fit: "
+                + ", ".join(demand.name for demand in autoscale_unplaced)
+            )
+
+    plan = {
+        "placements": placements,
+        "unplaced": [demand.name for demand in unplaced],
+        "headroom": report,
+    }
+
+    if unplaced:
+        details = "; ".join(
+            f"{demand.name} needs "
+            + ", ".join(f"{name} {format_units(name, value)}" for name, value in demand.resources.items())
+            + "".join(f", {name} {format_units('storage', value)}" for name, value in demand.storage.items())
+            for demand in unplaced
+        )
+        msg = f"{len(unplaced)} of {len(demands)} VMs and DataVolumes do not fit on {len(capacities)} schedulable nodes: {details}"
+        if capacity["enforce"]:
+            raise ValueError(msg)
+        pulumi.log.warn(msg)
+
+    return plan
@@ -0,0 +1,40 @@
+# Interface bindings supported for secondary multus networks
+VM_NETWORK_BINDINGS = ("bridge", "macvtap")
+
+
+def gen_secondary_networks(networks: list, prefix: str, model: str = None):
+    """
+    Generate VM interfaces and networks for secondary multus networks.
+
+    Each entry is either a network name ("name" or "namespace/name") attached
+    with bridge binding, or a dict with `name` and `binding` (bridge, macvtap).
+    Interfaces are named {prefix}1, {prefix}2, ...
+
+    Returns:
+        Tuple of (interfaces, networks) lists for the VMI spec
+    """
+    interfaces = []
+    vm_networks = []
+    for index, network in enumerate(networks or [], start=1):
+        if isinstance(network, str):
+            network = {"name": network}
+
+        binding = network.get("binding", "bridge")
+        if binding not in VM_NETWORK_BINDINGS:
+            raise ValueError(f"Unsupported VM network binding: {binding}")
+
+        interface = {"name": f"{prefix}{index}"}
+        if model:
+            interface["model"] = model
+        if binding == "macvtap":
+            # macvtap is a network binding plugin registered in the KubeVirt CR
+            interface["binding"] = {"name": "macvtap"}
+        else:
+            interface["bridge"] = {}
+
+        interfaces.append(interface)
+        vm_networks.append(
+            {"name": f"{prefix}{index}", "multus": {"networkName": network["name"]}}
+        )
+
+    return interfaces, vm_networks
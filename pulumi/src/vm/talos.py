@@ -1,23 +1,56 @@
+import os
+import json
+import hashlib
 import pulumi
 import pulumi_kubernetes as k8s
+from src.vm.networks import gen_secondary_networks
+from src.kubevirt.deploy import validate_migratable_storage
+from src.vm.talos_bootstrap import bootstrap_talos_cluster
+from src.registry_cache.deploy import mirror_image
 
 def deploy_talos_cluster(
         config_talos: dict,
         k8s_provider: k8s.Provider,
         depends_on: pulumi.Output[list],
-        parent
+        parent,
+        rwo_storage_classes: list = None,
+        bootstrap: dict = None,
+        kubeconfig: str = None,
+        kubernetes_context: str = None,
+        registry_cache: dict = None
     ):
     """
     Deploy the Talos controlplane and worker VirtualMachinePools based on the provided configuration.
+
+    rwo_storage_classes lists storage classes that cannot back live migrating VMs.
+    With bootstrap (see get_bootstrap_config) the pools are configured and
+    bootstrapped into a nested cluster, using kubeconfig/kubernetes_context
+    to look up the VM addresses. With registry_cache (see
+    get_registry_cache_config) root disks import through the cache.
     """
 
-    # Get configurations for controlplane and workers, with defaults applied
+    # Get configurations for controlplane and worker pools, with defaults applied
     controlplane_config = get_talos_config(config_talos.get("controlplane", {}), "controlplane")
-    worker_config = get_talos_config(config_talos.get("workers", {}), "workers")
+    worker_configs = get_worker_pool_configs(config_talos)
 
-    # Apply the running flag to both configurations
-    controlplane_config["running"] = config_talos.get("running", True)
-    worker_config["running"] = config_talos.get("running", True)
+    # Apply the running flag to all configurations
+    for vm_config in (controlplane_config, *worker_configs):
+        vm_config["running"] = config_talos.get("running", True)
+        vm_config["image"] = mirror_image(vm_config["image"], registry_cache)
+        if vm_config["live_migrate"]:
+            validate_migratable_storage(
+                vm_config["vm_pool_name"],
+                vm_config["storage_class"],
+                rwo_storage_classes or [],
+            )
+
+    # Autoscaled members boot from the {pool}-machineconfig Secret only the bootstrap creates,
+    # and from a machine config rendered before any address is known
+    if any(worker_config["autoscaled"] for worker_config in worker_configs):
+        if not bootstrap:
+            raise ValueError("Autoscaled Talos worker pools require talos.bootstrap.enabled")
+        if not bootstrap["endpoint"]:
+            raise ValueError("Autoscaled Talos worker pools require talos.bootstrap.endpoint")
 
     # Deploy the Talos controlplane
     controlplane_vm_pool = deploy_talos_cluster_controlplane(
@@ -27,35 +60,95 @@ def deploy_talos_cluster(
         parent=parent
     )
 
-    # Deploy the Talos workers (if replicas > 0)
-    worker_vm_pool = None
-    if worker_config["replicas"] > 0:
+    # Deploy the Talos worker pools (if replicas > 0 or autoscaled)
+    worker_vm_pools = []
+    for worker_config in worker_configs:
         worker_vm_pool = deploy_talos_cluster_workers(
             config_vm=worker_config,
             k8s_provider=k8s_provider,
             depends_on=depends_on,
             parent=parent
         )
+        if worker_vm_pool:
+            worker_vm_pools.append(worker_vm_pool)
+
+    talos_bootstrap = None
+    if bootstrap:
+        talos_bootstrap = bootstrap_talos_cluster(
+            bootstrap,
+            controlplane_config,
+            worker_configs,
+            kubeconfig,
+            kubernetes_context,
+            [controlplane_vm_pool, *worker_vm_pools],
+        )
+
+        autoscaler_config = config_talos.get("autoscaler") or {}
+        if str(autoscaler_config.get("enabled")).lower() == "true":
+            deploy_talos_autoscaler(
+                autoscaler_config,
+                controlplane_config["namespace"],
+                worker_configs,
+                talos_bootstrap,
+                k8s_provider,
+            )
 
-    return controlplane_vm_pool, worker_vm_pool
+    return controlplane_vm_pool, worker_vm_pools, talos_bootstrap
+
+def get_worker_pool_configs(config_talos: dict) -> list:
+    """
+    Worker pool configs from `talos.worker_pools`, or the single legacy `talos.workers` pool.
+
+    Each pool has its own shape, disks and nested node labels, and is
+    autoscaled between min_replicas and max_replicas when they differ.
+    """
+    config_pools = config_talos.get("worker_pools")
+    if not config_pools:
+        return [get_talos_config(config_talos.get("workers", {}), "workers")]
+
+    worker_configs = []
+    for config_pool in config_pools:
+        if not config_pool.get("name"):
+            raise ValueError(f"Talos worker pool requires a name: {config_pool}")
+        worker_configs.append(get_talos_config(config_pool, "workers", config_pool["name"]))
+
+    vm_pool_names = [worker_config["vm_pool_name"] for worker_config in worker_configs]
+    if len(set(vm_pool_names)) != len(vm_pool_names):
+        raise ValueError("Talos worker pool names must be unique")
+
+    return worker_configs
 
 def get_talos_config(
         config_talos_cluster: dict,
-        node_type: str
+        node_type: str,
+        pool_name: str = None
     ) -> dict:
     """
     Generate the Talos cluster configuration by merging common default values with node-specific config.
+
+    pool_name names an additional worker pool, the VirtualMachinePool becomes kargo-dev-<pool_name>.
     """
     # Common default configuration for both controlplane and workers
     common_talos_defaults = {
         "namespace": "default",
         "image": config_talos_cluster.get("image", "docker.io/containercraft/talos:1.7.6"),
-        "network_name": "br0",  # Default network
+        "network_name": config_talos_cluster.get("network_name", "br0"),  # Default network
+        "networks": config_talos_cluster.get("networks", []),  # Secondary multus networks
+        "data_source": config_talos_cluster.get("data_source"),  # CDI golden image DataSource
+        "storage_class": config_talos_cluster.get("storage_class"),  # Disk StorageClass, cluster default if unset
+        "live_migrate": str(config_talos_cluster.get("live_migrate")).lower() == "true",  # RWX disks + LiveMigrate eviction
+        "disks": config_talos_cluster.get("disks", []),  # Extra blank disks: size in GiB or {size, storage_class}
+        "node_labels": config_talos_cluster.get("node_labels", {}),  # Nested cluster node labels
+        "hugepages": config_talos_cluster.get("hugepages"),  # Guest memory hugepage size, e.g. 2Mi
+        "autoscaled": False,
         "running": True  # Default running state
     }
 
     # Set vm_pool_name for controlplane and workers
-    vm_pool_name = f"kargo-dev-{node_type}"
+    vm_pool_name = f"kargo-dev-{pool_name or node_type}"
+
+    if common_talos_defaults["hugepages"] not in (None, "2Mi", "1Gi"):
+        raise ValueError(f"{vm_pool_name}: hugepages must be 2Mi or 1Gi")
 
     # Handle controlplane configuration
     if node_type == "controlplane":
@@ -83,8 +176,17 @@ def get_talos_config(
 
     # Handle worker configuration
     elif node_type == "workers":
+        replicas = int(config_talos_cluster.get("replicas", 0))
+        min_replicas = int(config_talos_cluster.get("min_replicas", replicas))
+        max_replicas = int(config_talos_cluster.get("max_replicas", max(replicas, min_replicas)))
+        if not 0 <= min_replicas <= max_replicas:
+            raise ValueError(f"{vm_pool_name}: expected 0 <= min_replicas <= max_replicas")
+
         worker_defaults = {
-            "replicas": config_talos_cluster.get("replicas", 0),  # Worker replicas
+            "replicas": min(max(replicas, min_replicas), max_replicas),  # Worker replicas
+            "min_replicas": min_replicas,
+            "max_replicas": max_replicas,
+            "autoscaled": max_replicas > min_replicas,
             "cpu_cores": config_talos_cluster.get("cpu_cores", 2),  # Worker CPU cores
             "memory_size": config_talos_cluster.get("memory_size", "2"),  # Worker memory in GiB
             "root_disk_size": config_talos_cluster.get("root_disk_size", "32"),  # Root disk size in GiB
@@ -115,7 +217,12 @@ def deploy_talos_cluster_controlplane(
         empty_disk_size=config_vm["empty_disk_size"],
         image_address=config_vm["image"],
         network_name=config_vm["network_name"],
-        running=config_vm["running"]
+        running=config_vm["running"],
+        extra_networks=config_vm["networks"],
+        data_source=config_vm["data_source"],
+        storage_class=config_vm["storage_class"],
+        live_migrate=config_vm["live_migrate"],
+        hugepages=config_vm["hugepages"]
     )
 
     controlplane_vm_pool = k8s.apiextensions.CustomResource(
@@ -145,7 +252,7 @@ def deploy_talos_cluster_workers(
     """
     Deploy the Talos workers with their specific configuration.
     """
-    if config_vm["replicas"] > 0:
+    if config_vm["replicas"] > 0 or config_vm["autoscaled"]:
         worker_vm_pool_spec = generate_talos_vmpool_spec(
             vm_pool_name=config_vm["vm_pool_name"],
             namespace=config_vm["namespace"],
@@ -156,11 +263,26 @@ def deploy_talos_cluster_workers(
             empty_disk_size=config_vm["empty_disk_size"],
             image_address=config_vm["image"],
             network_name=config_vm["network_name"],
-            running=config_vm["running"]
+            running=config_vm["running"],
+            extra_networks=config_vm["networks"],
+            data_source=config_vm["data_source"],
+            storage_class=config_vm["storage_class"],
+            live_migrate=config_vm["live_migrate"],
+            hugepages=config_vm["hugepages"],
+            disks=config_vm["disks"],
+            userdata_secret=(
+                f"{config_vm['vm_pool_name']}-machineconfig" if config_vm["autoscaled"] else None
+            )
         )
 
+        # Keep the legacy resource name for the default worker pool to avoid a replace
+        if config_vm["vm_pool_name"] == "kargo-dev-workers":
+            resource_name = f"{config_vm['vm_pool_name']}-workers"
+        else:
+            resource_name = config_vm["vm_pool_name"]
+
         worker_vm_pool = k8s.apiextensions.CustomResource(
-            f"{config_vm['vm_pool_name']}-workers",
+            resource_name,
             api_version="pool.kubevirt.io/v1alpha1",
             kind="VirtualMachinePool",
             metadata=k8s.meta.v1.ObjectMetaArgs(
@@ -171,7 +293,9 @@ def deploy_talos_cluster_workers(
             opts=pulumi.ResourceOptions(
                 provider=k8s_provider,
                 #depends_on=depends_on,
-                parent=parent
+                parent=parent,
+                # The autoscaler owns replicas of autoscaled pools
+                ignore_changes=["spec.replicas"] if config_vm["autoscaled"] else None
             )
         )
     else:
@@ -189,10 +313,32 @@ def generate_talos_vmpool_spec(
         empty_disk_size: str,
         image_address: str,
         network_name: str,
-        running: bool
+        running: bool,
+        extra_networks: list = None,
+        data_source: str = None,
+        storage_class: str = None,
+        live_migrate: bool = False,
+        hugepages: str = None,
+        disks: list = None,
+        userdata_secret: str = None
     ) -> dict:
     """
     Generate the VirtualMachinePool spec for Talos VMs.
+
+    extra_networks is a list of multus networks (see gen_secondary_networks)
+    attached as eth1, eth2, ... after the primary network on eth0.
+
+    data_source clones the root disk from a CDI DataSource ("name" or
+    "namespace/name") such as a golden image instead of importing image_address.
+
+    live_migrate requests ReadWriteMany disks and evicts VMs by live migration.
+
+    hugepages backs guest memory with pages of that size (2Mi or 1Gi)
+    reserved on the host, see node_prep.hugepages.
+
+    disks adds blank data disks (size in GiB or {size, storage_class}).
+    userdata_secret boots members with their machine config as NoCloud
+    user-data, so members added by the autoscaler join without talosctl.
     """
     # Ensure the correct image is passed here
     docker_image_address = f"docker://{image_address}"
@@ -291,6 +437,25 @@ def generate_talos_vmpool_spec(
         }
     }
 
+    # Clone the root disk from an in-cluster golden image when configured
+    if data_source:
+        data_source_namespace, _, data_source_name = data_source.rpartition("/")
+        source_ref = {"kind": "DataSource", "name": data_source_name}
+        if data_source_namespace:
+            source_ref["namespace"] = data_source_namespace
+        root_dv_spec = spec["virtualMachineTemplate"]["spec"]["dataVolumeTemplates"][0]["spec"]
+        del root_dv_spec["source"]
+        root_dv_spec["sourceRef"] = source_ref
+
+    # Attach secondary multus networks, e.g. jumbo frame storage and migration links
+    vm_spec = spec["virtualMachineTemplate"]["spec"]["template"]["spec"]
+    extra_interfaces, extra_vm_networks = gen_secondary_networks(extra_networks, "eth")
+    vm_spec["domain"]["devices"]["interfaces"].extend(extra_interfaces)
+    vm_spec["networks"].extend(extra_vm_networks)
+
+    if hugepages:
+        vm_spec["domain"]["memory"] = {"hugepages": {"pageSize": hugepages}}
+
     # If the empty disk size is greater than 0, add the empty disk to the spec
     if int(empty_disk_size) > 0:
         spec["virtualMachineTemplate"]["spec"]["template"]["spec"]["domain"]["devices"]["disks"].append(
@@ -333,4 +498,195 @@ def generate_talos_vmpool_spec(
             }
         )
 
+    # Additional blank data disks
+    for index, disk in enumerate(disks or [], start=1):
+        disk = disk if isinstance(disk, dict) else {"size": disk}
+        disk_name = f"talos-data-disk-{index}"
+        vm_spec["domain"]["devices"]["disks"].append({"name": disk_name, "disk": {"bus": "virtio"}})
+        vm_spec["volumes"].append({"name": disk_name, "dataVolume": {"name": f"{vm_pool_name}-data-{index}-dv"}})
+        disk_storage = {
+            "accessModes": ["ReadWriteOnce"],
+            "resources": {"requests": {"storage": f"{disk['size']}Gi"}},
+        }
+        if disk.get("storage_class"):
+            disk_storage["storageClassName"] = disk["storage_class"]
+        spec["virtualMachineTemplate"]["spec"]["dataVolumeTemplates"].append({
+            "metadata": {"name": f"{vm_pool_name}-data-{index}-dv"},
+            "spec": {"storage": disk_storage, "source": {"blank": {}}},
+        })
+
+    if userdata_secret:
+        vm_spec["domain"]["devices"]["disks"].append({"name": "talos-machineconfig", "disk": {"bus": "virtio"}})
+        vm_spec["volumes"].append({
+            "name": "talos-machineconfig",
+            "cloudInitNoCloud": {"secretRef": {"name": userdata_secret}},
+        })
+
+    # Live migration needs shared (RWX) disks on both source and target node
+    for dv_template in spec["virtualMachineTemplate"]["spec"]["dataVolumeTemplates"]:
+        if storage_class:
+            dv_template["spec"]["storage"].setdefault("storageClassName", storage_class)
+        if live_migrate:
+            dv_template["spec"]["storage"]["accessModes"] = ["ReadWriteMany"]
+    if live_migrate:
+        vm_spec["evictionStrategy"] = "LiveMigrate"
+
     return spec
+
+def deploy_talos_autoscaler(
+        autoscaler_config: dict,
+        namespace: str,
+        worker_configs: list,
+        talos_bootstrap,
+        k8s_provider: k8s.Provider
+    ):
+    """
+    Deploy the pending-pods autoscaler (src.vm.autoscaler_controller) for autoscaled worker pools.
+
+    The controller runs in the hosting cluster, watches the nested cluster
+    through the bootstrap kubeconfig and scales VirtualMachinePool replicas
+    within min_replicas/max_replicas.
+    """
+    pools = [
+        {
+            "name": worker_config["vm_pool_name"],
+            "min": worker_config["min_replicas"],
+            "max": worker_config["max_replicas"],
+            "node_labels": worker_config["node_labels"],
+        }
+        for worker_config in worker_configs
+        if worker_config["autoscaled"]
+    ]
+    if not pools:
+        pulumi.log.warn("talos.autoscaler is enabled but no worker pool sets max_replicas above min_replicas")
+        return None
+
+    # The controller source comes from the ConfigMap, the image provides python and the kubernetes client
+    image = autoscaler_config.get("image")
+    if not image:
+        raise ValueError(
+            "talos.autoscaler.image is required, build it from .github/docker/talos-autoscaler/Dockerfile"
+        )
+
+    settings = {
+        "namespace": namespace,
+        "interval": int(autoscaler_config.get("interval") or 30),
+        "cooldown": int(autoscaler_config.get("cooldown") or 120),
+        "scale_down_delay": int(autoscaler_config.get("scale_down_delay") or 600),
+        "pools": pools,
+    }
+    with open(os.path.join(os.path.dirname(__file__), "autoscaler_controller.py"), "r") as f:
+        controller_source = f.read()
+
+    name = "talos-autoscaler"
+    labels = {"app": name, "app.kubernetes.io/managed-by": "pulumi"}
+    opts = pulumi.ResourceOptions(provider=k8s_provider, depends_on=[talos_bootstrap])
+
+    kubeconfig_secret = k8s.core.v1.Secret(
+        f"{name}-nested-kubeconfig",
+        metadata=k8s.meta.v1.ObjectMetaArgs(name=f"{name}-nested-kubeconfig", namespace=namespace, labels=labels),
+        string_data={"kubeconfig": talos_bootstrap.nested_kubeconfig},
+        opts=opts,
+    )
+
+    config_map = k8s.core.v1.ConfigMap(
+        name,
+        metadata=k8s.meta.v1.ObjectMetaArgs(name=name, namespace=namespace, labels=labels),
+        data={
+            "autoscaler_controller.py": controller_source,
+            "config.json": json.dumps(settings, indent=2),
+        },
+        opts=opts,
+    )
+
+    service_account = k8s.core.v1.ServiceAccount(
+        name,
+        metadata=k8s.meta.v1.ObjectMetaArgs(name=name, namespace=namespace, labels=labels),
+        opts=opts,
+    )
+
+    role = k8s.rbac.v1.Role(
+        name,
+        metadata=k8s.meta.v1.ObjectMetaArgs(name=name, namespace=namespace, labels=labels),
+        rules=[
+            k8s.rbac.v1.PolicyRuleArgs(
+                api_groups=["pool.kubevirt.io"],
+                resources=["virtualmachinepools"],
+                resource_names=[pool["name"] for pool in pools],
+                verbs=["get", "patch"],
+            ),
+            # Scale in deletes the VM of the drained node, checked to be owned by the pool
+            k8s.rbac.v1.PolicyRuleArgs(
+                api_groups=["kubevirt.io"],
+                resources=["virtualmachineinstances"],
+                verbs=["list"],
+            ),
+            k8s.rbac.v1.PolicyRuleArgs(
+                api_groups=["kubevirt.io"],
+                resources=["virtualmachines"],
+                verbs=["get", "delete"],
+            ),
+        ],
+        opts=opts,
+    )
+
+    role_binding = k8s.rbac.v1.RoleBinding(
+        name,
+        metadata=k8s.meta.v1.ObjectMetaArgs(name=name, namespace=namespace, labels=labels),
+        role_ref=k8s.rbac.v1.RoleRefArgs(api_group="rbac.authorization.k8s.io", kind="Role", name=name),
+        subjects=[k8s.rbac.v1.SubjectArgs(kind="ServiceAccount", name=name, namespace=namespace)],
+        opts=pulumi.ResourceOptions(provider=k8s_provider, parent=role),
+    )
+
+    deployment = k8s.apps.v1.Deployment(
+        name,
+        metadata=k8s.meta.v1.ObjectMetaArgs(name=name, namespace=namespace, labels=labels),
+        spec={
+            "replicas": 1,
+            "strategy": {"type": "Recreate"},
+            "selector": {"matchLabels": {"app": name}},
+            "template": {
+                "metadata": {
+                    "labels": labels,
+                    # Restart the controller when its source or settings change
+                    "annotations": {
+                        "kargo.ccio.io/config-hash": hashlib.sha256(
+                            (controller_source + json.dumps(settings, sort_keys=True)).encode()
+                        ).hexdigest()[:10],
+                    },
+                },
+                "spec": {
+                    "serviceAccountName": name,
+                    "containers": [
+                        {
+                            "name": "autoscaler",
+                            "image": image,
+                            "command": ["python", "/opt/autoscaler/autoscaler_controller.py"],
+                            "env": [
+                                {"name": "AUTOSCALER_CONFIG", "value": "/opt/autoscaler/config.json"},
+                                {"name": "NESTED_KUBECONFIG", "value": "/etc/nested/kubeconfig"},
+                            ],
+                            "resources": {
+                                "requests": {"cpu": "10m", "memory": "64Mi"},
+                                "limits": {"memory": "256Mi"},
+                            },
+                            "volumeMounts": [
+                                {"name": "controller", "mountPath": "/opt/autoscaler"},
+                                {"name": "nested-kubeconfig", "mountPath": "/etc/nested", "readOnly": True},
+                            ],
+                        }
+                    ],
+                    "volumes": [
+                        {"name": "controller", "configMap": {"name": name}},
+                        {"name": "nested-kubeconfig", "secret": {"secretName": f"{name}-nested-kubeconfig"}},
+                    ],
+                },
+            },
+        },
+        opts=pulumi.ResourceOptions(
+            provider=k8s_provider,
+            depends_on=[kubeconfig_secret, config_map, service_account, role_binding],
+        ),
+    )
+
+    return deployment
@@ -0,0 +1,329 @@
+import os
+import json
+import time
+import logging
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List
+import pulumi
+from pulumi.dynamic import CreateResult, ResourceProvider, UpdateResult
+from kubernetes import client as k8s_client
+from src.lib.kube_client import new_api_client
+
+# Nested cluster node label naming the VirtualMachinePool a node belongs to
+POOL_LABEL = "kargo.ccio.io/pool"
+
+
+def get_bootstrap_config(config_bootstrap: dict, project_name: str) -> dict:
+    """
+    Normalize the `talos.bootstrap` stack config
+
+    Args:
+        config_bootstrap: `talos.bootstrap` stack config
+        project_name: Pulumi project name, used for the default cluster name
+
+    Returns:
+        Normalized bootstrap config
+    """
+    return {
+        "cluster_name": config_bootstrap.get("cluster_name") or f"{project_name}-nested",
+        "endpoint": config_bootstrap.get("endpoint"),
+        "talos_dir": os.path.abspath(config_bootstrap.get("talos_dir") or "../.talos/nested"),
+        "talos_version": config_bootstrap.get("talos_version"),
+        "kubernetes_version": config_bootstrap.get("kubernetes_version"),
+        "install_disk": config_bootstrap.get("install_disk") or "/dev/vda",
+        "patches": [os.path.abspath(patch) for patch in config_bootstrap.get("patches") or []],
+        "timeout": int(config_bootstrap.get("timeout") or 900),
+    }
+
+
+def talosctl(args: List[str], cwd: str) -> str:
+    result = subprocess.run(["talosctl", *args], cwd=cwd, check=True, capture_output=True, text=True)
+    return result.stdout
+
+
+def retry(action, timeout: int, interval: int = 5):
+    """Call action until it stops raising or timeout seconds have passed."""
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            return action()
+        except (subprocess.CalledProcessError, ValueError) as e:
+            if time.monotonic() >= deadline:
+                raise
+            logging.info(f"Retrying in {interval}s: {getattr(e, 'stderr', None) or e}")
+            time.sleep(interval)
+
+
+def get_pool_addresses(api_client, namespace: str, pool_name: str, replicas: int) -> List[str]:
+    """
+    eth0 addresses of the VirtualMachinePool members, ordered by VMI name
+
+    KubeVirt reports addresses on bridge bound interfaces through the guest
+    agent, so the Talos image needs the qemu-guest-agent extension.
+    """
+    vmis = k8s_client.CustomObjectsApi(api_client).list_namespaced_custom_object(
+        "kubevirt.io", "v1", namespace, "virtualmachineinstances",
+        label_selector=f"kubevirt.io/vmpool={pool_name}",
+    )["items"]
+
+    addresses = []
+    for vmi in sorted(vmis, key=lambda vmi: vmi["metadata"]["name"]):
+        for interface in vmi.get("status", {}).get("interfaces", []):
+            if interface.get("name") == "eth0" and interface.get("ipAddress"):
+                addresses.append(interface["ipAddress"])
+    if len(addresses) < replicas:
+        raise ValueError(f"{len(addresses)}/{replicas} {pool_name} VMs report an address")
+    return addresses
+
+
+def apply_config(address: str, config_file: str, talosconfig: str, cwd: str):
+    """Apply a machine config, in maintenance mode on first boot, authenticated afterwards."""
+    try:
+        talosctl(["apply-config", "--insecure", "--nodes", address, "--file", config_file], cwd)
+    except subprocess.CalledProcessError:
+        talosctl([
+            "apply-config", "--talosconfig", talosconfig,
+            "--nodes", address, "--endpoints", address, "--file", config_file,
+        ], cwd)
+
+
+def store_userdata_secret(api_client, namespace: str, name: str, config_file: str):
+    """Store a machine config as the NoCloud user-data Secret autoscaled pool members boot with."""
+    with open(config_file, "r") as f:
+        body = k8s_client.V1Secret(
+            metadata=k8s_client.V1ObjectMeta(name=name, namespace=namespace),
+            string_data={"userdata": f.read()},
+        )
+    core = k8s_client.CoreV1Api(api_client)
+    try:
+        core.replace_namespaced_secret(name, namespace, body)
+    except k8s_client.exceptions.ApiException as e:
+        if e.status != 404:
+            raise
+        core.create_namespaced_secret(namespace, body)
+
+
+def delete_userdata_secret(api_client, namespace: str, name: str):
+    try:
+        k8s_client.CoreV1Api(api_client).delete_namespaced_secret(name, namespace)
+    except k8s_client.exceptions.ApiException as e:
+        if e.status != 404:
+            raise
+
+
+class TalosBootstrapProvider(ResourceProvider):
+    """
+    Generates secrets and machine configs, configures every pool member,
+    bootstraps etcd on the first controlplane and reads back the kubeconfig.
+    Updates re-apply configs so pool scale-ups join the cluster. Deletes
+    remove the user-data Secrets and the files written to talos_dir, so a
+    recreated cluster gets a new PKI.
+    """
+
+    def bootstrap(self, props: Dict) -> Dict:
+        talos_dir = props["talos_dir"]
+        timeout = int(props["timeout"])
+        namespace = props["namespace"]
+        os.makedirs(talos_dir, exist_ok=True)
+        talosconfig = os.path.join(talos_dir, "talosconfig")
+
+        api_client = new_api_client(props.get("kubeconfig"), props.get("context"))
+
+        def pool_addresses(pool_name: str, replicas: int):
+            return retry(lambda: get_pool_addresses(api_client, namespace, pool_name, replicas), timeout)
+
+        # Without a fixed endpoint the first controlplane address is the endpoint
+        controlplanes = []
+        endpoint = props.get("endpoint")
+        if not endpoint:
+            controlplanes = pool_addresses(props["controlplane_pool"], int(props["controlplane_replicas"]))
+            endpoint = controlplanes[0]
+
+        # Secrets are generated once and reused so re-renders keep the same PKI
+        secrets = os.path.join(talos_dir, "secrets.yaml")
+        if not os.path.exists(secrets):
+            talosctl(["gen", "secrets", "--output-file", secrets], talos_dir)
+
+        gen_config = [
+            "gen", "config", props["cluster_name"], f"https://{endpoint}:6443",
+            "--with-secrets", secrets,
+            "--install-disk", props["install_disk"],
+            "--additional-sans", ",".join([endpoint, *controlplanes]),
+            "--output", talos_dir,
+            "--force",
+        ]
+        if props.get("talos_version"):
+            gen_config.extend(["--talos-version", props["talos_version"]])
+        if props.get("kubernetes_version"):
+            gen_config.extend(["--kubernetes-version", props["kubernetes_version"]])
+        for patch in props.get("patches") or []:
+            gen_config.extend(["--config-patch", f"@{patch}"])
+        talosctl(gen_config, talos_dir)
+
+        # One worker config per pool carrying the pool node labels
+        for pool in props["worker_pools"]:
+            pool_config = os.path.join(talos_dir, f"{pool['pool']}.yaml")
+            talosctl([
+                "machineconfig", "patch", os.path.join(talos_dir, "worker.yaml"),
+                "--patch", json.dumps({"machine": {"nodeLabels": pool["node_labels"]}}),
+                "--output", pool_config,
+            ], talos_dir)
+            if pool.get("userdata_secret"):
+                store_userdata_secret(api_client, namespace, pool["userdata_secret"], pool_config)
+
+        if not controlplanes:
+            controlplanes = pool_addresses(props["controlplane_pool"], int(props["controlplane_replicas"]))
+        talosctl(["config", "endpoint", *controlplanes, "--talosconfig", talosconfig], talos_dir)
+        talosctl(["config", "node", controlplanes[0], "--talosconfig", talosconfig], talos_dir)
+
+        members = [(address, "controlplane.yaml") for address in controlplanes]
+        workers = []
+        for pool in props["worker_pools"]:
+            if int(pool["replicas"]) > 0:
+                pool_members = pool_addresses(pool["pool"], int(pool["replicas"]))
+                workers.extend(pool_members)
+                members += [(address, f"{pool['pool']}.yaml") for address in pool_members]
+
+        # Configure all members at once, each VM installs and reboots independently
+        with ThreadPoolExecutor(max_workers=len(members)) as executor:
+            list(executor.map(
+                lambda member: retry(
+                    lambda: apply_config(member[0], os.path.join(talos_dir, member[1]), talosconfig, talos_dir),
+                    timeout,
+                ),
+                members,
+            ))
+
+        def bootstrap_etcd():
+            try:
+                talosctl(["bootstrap", "--talosconfig", talosconfig, "--nodes", controlplanes[0]], talos_dir)
+            except subprocess.CalledProcessError as e:
+                # Re-runs hit an already bootstrapped etcd
+                if "alreadyexists" not in (e.stderr or "").lower().replace(" ", ""):
+                    raise
+
+        retry(bootstrap_etcd, timeout)
+
+        kubeconfig_path = os.path.join(talos_dir, "kubeconfig")
+        retry(
+            lambda: talosctl([
+                "kubeconfig", kubeconfig_path, "--force",
+                "--talosconfig", talosconfig, "--nodes", controlplanes[0],
+            ], talos_dir),
+            timeout,
+        )
+        with open(kubeconfig_path, "r") as f:
+            nested_kubeconfig = f.read()
+
+        return {
+            **props,
+            "controlplane_addresses": controlplanes,
+            "worker_addresses": workers,
+            "talosconfig_path": talosconfig,
+            "nested_kubeconfig": nested_kubeconfig,
+        }
+
+    def create(self, props):
+        return CreateResult(id_=props["cluster_name"], outs=self.bootstrap(props))
+
+    def update(self, id, olds, news):
+        return UpdateResult(outs=self.bootstrap(news))
+
+    def delete(self, id, props):
+        # The VMs and their disks go away with the VirtualMachinePools
+        api_client = new_api_client(props.get("kubeconfig"), props.get("context"))
+        pool_files = []
+        for pool in props.get("worker_pools") or []:
+            pool_files.append(f"{pool['pool']}.yaml")
+            if pool.get("userdata_secret"):
+                delete_userdata_secret(api_client, props["namespace"], pool["userdata_secret"])
+
+        talos_dir = props["talos_dir"]
+        for name in ["secrets.yaml", "controlplane.yaml", "worker.yaml", "talosconfig", "kubeconfig", *pool_files]:
+            path = os.path.join(talos_dir, name)
+            if os.path.exists(path):
+                os.remove(path)
+        if os.path.isdir(talos_dir) and not os.listdir(talos_dir):
+            os.rmdir(talos_dir)
+
+
+class TalosBootstrap(pulumi.dynamic.Resource):
+    nested_kubeconfig: pulumi.Output[str]
+    controlplane_addresses: pulumi.Output[list]
+    worker_addresses: pulumi.Output[list]
+
+    def __init__(self, name: str, props: dict, opts: pulumi.ResourceOptions = None):
+        super().__init__(
+            TalosBootstrapProvider(),
+            name,
+            {
+                **props,
+                "nested_kubeconfig": None,
+                "controlplane_addresses": None,
+                "worker_addresses": None,
+                "talosconfig_path": None,
+            },
+            pulumi.ResourceOptions.merge(
+                opts, pulumi.ResourceOptions(additional_secret_outputs=["nested_kubeconfig", "kubeconfig"])
+            ),
+        )
+
+
+def bootstrap_talos_cluster(
+        bootstrap: dict,
+        controlplane_config: dict,
+        worker_configs: list,
+        kubeconfig: str,
+        kubernetes_context: str,
+        depends_on: list
+    ) -> TalosBootstrap:
+    """
+    Turn the Talos VirtualMachinePools into a running nested cluster
+
+    Args:
+        bootstrap: Normalized config from get_bootstrap_config
+        controlplane_config: Controlplane pool config from get_talos_config
+        worker_configs: Worker pool configs from get_worker_pool_configs
+        kubeconfig: Kubeconfig of the hosting cluster
+        kubernetes_context: Kubeconfig context of the hosting cluster
+        depends_on: The VirtualMachinePools
+
+    Returns:
+        TalosBootstrap resource exposing the nested kubeconfig
+    """
+    talos_bootstrap = TalosBootstrap(
+        f"{bootstrap['cluster_name']}-bootstrap",
+        {
+            **bootstrap,
+            "namespace": controlplane_config["namespace"],
+            "controlplane_pool": controlplane_config["vm_pool_name"],
+            "controlplane_replicas": controlplane_config["replicas"],
+            "worker_pools": [
+                {
+                    "pool": worker_config["vm_pool_name"],
+                    "replicas": worker_config["replicas"],
+                    "node_labels": {
+                        **worker_config["node_labels"],
+                        POOL_LABEL: worker_config["vm_pool_name"],
+                    },
+                    "userdata_secret": (
+                        f"{worker_config['vm_pool_name']}-machineconfig" if worker_config["autoscaled"] else None
+                    ),
+                }
+                for worker_config in worker_configs
+            ],
+            # Kubeconfig content carries credentials, keep it encrypted in the state
+            "kubeconfig": pulumi.Output.secret(kubeconfig) if kubeconfig else None,
+            "context": kubernetes_context,
+        },
+        opts=pulumi.ResourceOptions(
+            depends_on=depends_on,
+            custom_timeouts=pulumi.CustomTimeouts(create="30m", update="30m"),
+        ),
+    )
+
+    pulumi.export("talos_nested_kubeconfig", talos_bootstrap.nested_kubeconfig)
+    pulumi.export("talos_nested_controlplane_addresses", talos_bootstrap.controlplane_addresses)
+
+    return talos_bootstrap
@@ -1,6 +1,11 @@
 import os
 import pulumi
 import pulumi_kubernetes as k8s
+from src.vm.networks import gen_secondary_networks
+
+# Resource limits of the Ubuntu VM, also used by the capacity planner
+VM_CPU_CORES = 2
+VM_MEMORY = "4Gi"
 
 
 def deploy_ubuntu_vm(config_vm, k8s_provider: k8s.Provider, depends_on: list = []):
@@ -12,6 +17,7 @@ def deploy_ubuntu_vm(config_vm, k8s_provider: k8s.Provider, depends_on: list = [
     ssh_user = config_vm.get("ssh_user", "kc2")
     ssh_password = config_vm.get("ssh_password", "kc2")
     ssh_pub_key = config_vm.get("ssh_pub_key", "")
+    networks = config_vm.get("networks", [])  # Secondary multus networks
     app_name = "kc2"
 
     # Create Secret `kc2-pubkey` from public key string
@@ -92,6 +98,11 @@ def deploy_ubuntu_vm(config_vm, k8s_provider: k8s.Provider, depends_on: list = [
         dhcp-identifier: mac
     """
 
+    # Pod network on enp1s0 plus secondary multus networks
+    extra_interfaces, extra_vm_networks = gen_secondary_networks(networks, "net", "virtio")
+    vm_interfaces = [{"name": "enp1s0", "model": "virtio", "bridge": {}}, *extra_interfaces]
+    vm_networks = [{"name": "enp1s0", "pod": {}}, *extra_vm_networks]
+
     # Define the VirtualMachine
     ubuntu_vm = k8s.apiextensions.CustomResource(
         "ubuntu",
@@ -122,7 +133,7 @@ def deploy_ubuntu_vm(config_vm, k8s_provider: k8s.Provider, depends_on: list = [
                             "dedicatedCpuPlacement": False,
                             "isolateEmulatorThread": False,
                         },
-                        "resources": {"limits": {"memory": "4Gi", "cpu": 2}},
+                        "resources": {"limits": {"memory": VM_MEMORY, "cpu": VM_CPU_CORES}},
                         "devices": {
                             "rng": {},
                             "autoattachPodInterface": False,
@@ -137,13 +148,11 @@ def deploy_ubuntu_vm(config_vm, k8s_provider: k8s.Provider, depends_on: list = [
                                 },
                                 {"name": "cloudinitdisk", "disk": {"bus": "virtio"}},
                             ],
-                            "interfaces": [
-                                {"name": "enp1s0", "model": "virtio", "bridge": {}}
-                            ],
+                            "interfaces": vm_interfaces,
                         },
                         "machine": {"type": "q35"},
                     },
-                    "networks": [{"name": "enp1s0", "pod": {}}],
+                    "networks": vm_networks,
                     "terminationGracePeriodSeconds": 0,
                     "accessCredentials": [
                         {
@@ -164,7 +173,7 @@ def deploy_ubuntu_vm(config_vm, k8s_provider: k8s.Provider, depends_on: list = [
                             "name": "containerdisk",
                             "containerDisk": {
                                 "image": image_name,
-                                "imagePullPolicy": "Always",
+                                "imagePullPolicy": "IfNotPresent",
                             },
                         },
                         {
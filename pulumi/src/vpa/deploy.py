@@ -0,0 +1,229 @@
+from typing import Dict, List, Optional
+import pulumi
+import pulumi_kubernetes as k8s
+from pulumi_kubernetes.apiextensions import CustomResource
+from src.lib.namespace import create_namespace
+from src.lib.helm_chart_versions import get_latest_helm_chart_version
+from src.lib.placement import node_placement
+
+# Label marking the VerticalPodAutoscalers read back by src.vpa.recommend
+VPA_LABEL = "kargo.ccio.io/vpa"
+
+
+def kube_prometheus_stack_fullname(release: str) -> str:
+    """The chart's fullname helper, the release name and chart name truncated to 26 characters."""
+    return f"{release}-kube-prometheus-stack"[:26].rstrip("-")
+
+
+# Workloads each module deploys as (namespace, kind, key, name). Chart
+# workloads are named after the Helm release, so their name is a function
+# of the release name; the key names the VerticalPodAutoscaler.
+MODULE_WORKLOADS = {
+    "cilium": [
+        ("kube-system", "DaemonSet", "cilium", "cilium"),
+        ("kube-system", "Deployment", "cilium-operator", "cilium-operator"),
+        ("kube-system", "Deployment", "hubble-relay", "hubble-relay"),
+    ],
+    "metrics_server": [
+        ("kube-system", "Deployment", "metrics-server", lambda release: release),
+    ],
+    "node_local_dns": [
+        ("kube-system", "DaemonSet", "node-local-dns", "node-local-dns"),
+    ],
+    "cert_manager": [
+        ("cert-manager", "Deployment", "cert-manager", lambda release: release),
+        ("cert-manager", "Deployment", "cert-manager-cainjector", lambda release: f"{release}-cainjector"),
+        ("cert-manager", "Deployment", "cert-manager-webhook", lambda release: f"{release}-webhook"),
+    ],
+    "kubevirt": [
+        ("kubevirt", "Deployment", "virt-operator", "virt-operator"),
+        ("kubevirt", "Deployment", "virt-api", "virt-api"),
+        ("kubevirt", "Deployment", "virt-controller", "virt-controller"),
+        ("kubevirt", "DaemonSet", "virt-handler", "virt-handler"),
+    ],
+    "multus": [
+        ("kube-system", "DaemonSet", "kube-multus-ds", "kube-multus-ds"),
+    ],
+    "hostpath_provisioner": [
+        ("hostpath-provisioner", "Deployment", "hostpath-provisioner-operator", "hostpath-provisioner-operator"),
+        ("hostpath-provisioner", "DaemonSet", "hostpath-provisioner-csi", "hostpath-provisioner-csi"),
+    ],
+    "registry_cache": [
+        ("registry-cache", "Deployment", "registry-cache", "registry-cache"),
+    ],
+    "cdi": [
+        ("cdi", "Deployment", "cdi-operator", "cdi-operator"),
+        ("cdi", "Deployment", "cdi-deployment", "cdi-deployment"),
+        ("cdi", "Deployment", "cdi-apiserver", "cdi-apiserver"),
+        ("cdi", "Deployment", "cdi-uploadproxy", "cdi-uploadproxy"),
+    ],
+    "prometheus": [
+        (
+            "monitoring", "StatefulSet", "prometheus",
+            lambda release: f"prometheus-{kube_prometheus_stack_fullname(release)}-prometheus",
+        ),
+        (
+            "monitoring", "Deployment", "prometheus-operator",
+            lambda release: f"{kube_prometheus_stack_fullname(release)}-operator",
+        ),
+        ("monitoring", "Deployment", "kube-state-metrics", lambda release: f"{release}-kube-state-metrics"),
+        ("monitoring", "DaemonSet", "node-exporter", lambda release: f"{release}-prometheus-node-exporter"),
+        ("monitoring", "Deployment", "grafana", lambda release: f"{release}-grafana"),
+    ],
+    "kubernetes_dashboard": [
+        ("kubernetes-dashboard", "Deployment", f"kubernetes-dashboard-{component}",
+         lambda release, component=component: f"{release}-{component}")
+        for component in ("api", "web", "auth", "metrics-scraper")
+    ],
+    "ingress_nginx": [
+        ("ingress-nginx", "Deployment", "ingress-nginx-controller", lambda release: f"{release}-controller"),
+    ],
+    # The operator names the auth proxy after the orchestra release
+    "openunison": [
+        ("openunison", "Deployment", "openunison-orchestra", lambda release: f"openunison-{release}".strip("-")),
+    ],
+}
+
+
+def get_vpa_config(config_vpa: dict) -> dict:
+    """
+    Normalize the `vpa` stack config
+
+    Args:
+        config_vpa: `vpa` stack config
+
+    Returns:
+        Normalized VPA config
+    """
+    modules = config_vpa.get("modules") or list(MODULE_WORKLOADS)
+    unknown = set(modules) - set(MODULE_WORKLOADS)
+    if unknown:
+        raise ValueError(f"Unknown vpa modules: {', '.join(sorted(unknown))}. Expected: {', '.join(MODULE_WORKLOADS)}")
+    return {
+        "namespace": config_vpa.get("namespace") or "vpa",
+        "version": config_vpa.get("version"),
+        "modules": modules,
+    }
+
+
+def list_workloads(
+    releases: Dict[str, Optional[pulumi.Resource]],
+    modules: List[str],
+    namespaces: Dict[str, str] = None,
+) -> List[dict]:
+    """
+    Deployments, StatefulSets and DaemonSets of the modules deployed by this program
+
+    The workloads come from MODULE_WORKLOADS rather than the cluster, so a
+    preview and the first run plan the same VPAs as every later run.
+
+    Args:
+        releases: Module name to the resource deploying it, the Helm release
+            for charts; disabled modules are absent or None
+        modules: Modules whose workloads get a VPA, from get_vpa_config
+        namespaces: Module name to its namespace where it is configurable
+
+    Returns:
+        Workloads with their namespace, kind, VPA key, name and deploying resource
+    """
+    workloads = []
+    for module in modules:
+        release = releases.get(module)
+        if release is None:
+            continue
+        for namespace, kind, key, name in MODULE_WORKLOADS[module]:
+            workloads.append({
+                "namespace": (namespaces or {}).get(module) or namespace,
+                "kind": kind,
+                "key": key,
+                "name": release.name.apply(name) if callable(name) else name,
+                "resource": release,
+            })
+    return workloads
+
+
+def deploy_vpa(
+    depends,
+    vpa: dict,
+    workloads: List[dict],
+    k8s_provider: k8s.Provider,
+    placement: dict = None,
+):
+    """
+    Deploy the Vertical Pod Autoscaler recommender and recommendation-only VPAs
+
+    The updater and admission controller are disabled, so pods are never
+    evicted or mutated. Every workload gets a VerticalPodAutoscaler with
+    updateMode Off whose status holds the recommendation, read back into
+    sizing overrides with `python -m src.vpa.recommend`.
+
+    Args:
+        depends: List of resources this deployment depends on
+        vpa: Normalized config from get_vpa_config
+        workloads: Workloads from list_workloads
+        k8s_provider: Kubernetes provider instance
+        placement: Node placement from get_placement_config, infra for the recommender
+
+    Returns:
+        Tuple containing:
+        - VPA chart version deployed
+        - VPA Helm release
+    """
+    ns_name = vpa["namespace"]
+    namespace = create_namespace(depends, ns_name, False, False, k8s_provider)
+
+    chart_name = "vpa"
+    chart_url = "https://charts.fairwinds.com/stable"
+    version = vpa["version"]
+    if version is None:
+        version = get_latest_helm_chart_version(f"{chart_url}/index.yaml", chart_name)
+        pulumi.log.info(f"Setting helm release version to latest: {chart_name}/{version}")
+    else:
+        pulumi.log.info(f"Using helm release version: {chart_name}/{version}")
+
+    release = k8s.helm.v3.Release(
+        "vpa",
+        k8s.helm.v3.ReleaseArgs(
+            chart=chart_name,
+            version=version,
+            namespace=ns_name,
+            skip_await=False,
+            repository_opts=k8s.helm.v3.RepositoryOptsArgs(repo=chart_url),
+            values={
+                "recommender": {"enabled": True, **node_placement(placement, "infra")},
+                # Recommendation only
+                "updater": {"enabled": False},
+                "admissionController": {"enabled": False},
+            },
+        ),
+        opts=pulumi.ResourceOptions(
+            provider=k8s_provider,
+            parent=namespace,
+            depends_on=depends,
+            custom_timeouts=pulumi.CustomTimeouts(create="8m", update="4m", delete="4m"),
+        ),
+    )
+
+    for workload in workloads:
+        key = workload["key"]
+        CustomResource(
+            f"vpa-{workload['namespace']}-{workload['kind'].lower()}-{key}",
+            api_version="autoscaling.k8s.io/v1",
+            kind="VerticalPodAutoscaler",
+            metadata={
+                "name": f"{key}-{workload['kind'].lower()}"[:63].rstrip("-"),
+                "namespace": workload["namespace"],
+                "labels": {VPA_LABEL: "recommend", "app.kubernetes.io/managed-by": "pulumi"},
+            },
+            spec={
+                "targetRef": {"apiVersion": "apps/v1", "kind": workload["kind"], "name": workload["name"]},
+                "updatePolicy": {"updateMode": "Off"},
+            },
+            opts=pulumi.ResourceOptions(
+                provider=k8s_provider, parent=release, depends_on=[release, workload["resource"]]
+            ),
+        )
+
+    pulumi.export("vpa_workloads", len(workloads))
+
+    return version, release
@@ -0,0 +1,154 @@
+"""
+Write Vertical Pod Autoscaler recommendations back as sizing overrides.
+
+Reads the recommendation-only VPAs deployed by src.vpa.deploy, maps each
+container to its sizing component and stores the recommended target, which
+already carries the recommender's 15% margin, as
+`overrides.<component>.requests` in the sizing policy file. Limits follow from the policy's limit multiples on the next
+`pulumi up`. Containers that are not sized (cainjector, webhooks, CDI,
+hostpath-provisioner) are listed for reference only. A DaemonSet gets
+one recommendation from the usage of all its pods.
+
+Usage:
+    python -m src.vpa.recommend --policy-file sizing-policy.yaml
+    pulumi config set --path sizing.policy_file sizing-policy.yaml
+
+    # Show the overrides without writing them
+    python -m src.vpa.recommend --policy-file sizing-policy.yaml --dry-run
+"""
+import os
+import sys
+import logging
+import argparse
+from decimal import Decimal
+from typing import Dict, List
+import yaml
+from kubernetes import client as k8s_client
+from kubernetes.utils import parse_quantity
+from src.lib.kube_client import new_api_client
+from src.lib.sizing import format_quantity
+from src.vpa.deploy import VPA_LABEL
+
+# (namespace, container) of each sized component, "*" matches every container
+COMPONENT_CONTAINERS = {
+    ("cert-manager", "cert-manager-controller"): "cert_manager",
+    ("kube-system", "cilium-agent"): "cilium_agent",
+    ("kube-system", "cilium-operator"): "cilium_operator",
+    ("kube-system", "hubble-relay"): "hubble_relay",
+    ("kube-system", "kube-multus"): "multus",
+    ("kube-system", "node-cache"): "node_local_dns",
+    ("kube-system", "metrics-server"): "metrics_server",
+    ("kubevirt", "virt-handler"): "virt_handler",
+    ("monitoring", "prometheus"): "prometheus",
+    ("monitoring", "kube-state-metrics"): "kube_state_metrics",
+    ("registry-cache", "*"): "registry_cache",
+    ("ingress-nginx", "controller"): "ingress_nginx",
+    ("kubernetes-dashboard", "kubernetes-dashboard-api"): "dashboard_api",
+    ("kubernetes-dashboard", "kubernetes-dashboard-web"): "dashboard_web",
+}
+
+
+def component_for(namespace: str, container: str):
+    return COMPONENT_CONTAINERS.get((namespace, container)) or COMPONENT_CONTAINERS.get((namespace, "*"))
+
+
+def read_recommendations(api_client) -> List[dict]:
+    """Target recommendation of every container of the Kargo VPAs."""
+    vpas = k8s_client.CustomObjectsApi(api_client).list_cluster_custom_object(
+        "autoscaling.k8s.io", "v1", "verticalpodautoscalers", label_selector=VPA_LABEL,
+    )["items"]
+
+    recommendations = []
+    for vpa in vpas:
+        container_recommendations = (vpa.get("status", {}).get("recommendation") or {}).get("containerRecommendations") or []
+        if not container_recommendations:
+            logging.info(f"{vpa['metadata']['namespace']}/{vpa['metadata']['name']}: no recommendation yet")
+        for recommendation in container_recommendations:
+            recommendations.append({
+                "namespace": vpa["metadata"]["namespace"],
+                "workload": vpa["spec"]["targetRef"]["name"],
+                "container": recommendation["containerName"],
+                "target": recommendation.get("target") or {},
+            })
+    return recommendations
+
+
+def recommended_requests(recommendations: List[dict], margin_percent: float) -> Dict[str, Dict[str, str]]:
+    """
+    Component requests from the container recommendations
+
+    Components running several containers (the registry cache) take the
+    largest recommendation per resource.
+    """
+    targets: Dict[str, Dict[str, Decimal]] = {}
+    for recommendation in recommendations:
+        component = component_for(recommendation["namespace"], recommendation["container"])
+        if not component:
+            continue
+        requests = targets.setdefault(component, {})
+        for resource in ("cpu", "memory"):
+            if resource in recommendation["target"]:
+                value = parse_quantity(recommendation["target"][resource])
+                requests[resource] = max(requests.get(resource, Decimal(0)), value)
+
+    factor = Decimal(str(1 + margin_percent / 100))
+    return {
+        component: {resource: format_quantity(resource, value * factor) for resource, value in requests.items()}
+        for component, requests in targets.items()
+    }
+
+
+def write_overrides(policy_file: str, requests: Dict[str, Dict[str, str]]) -> dict:
+    """Merge the requests into the policy file overrides, keeping its components, limits and replicas."""
+    policy = {}
+    if os.path.exists(policy_file):
+        with open(policy_file, "r") as f:
+            policy = yaml.safe_load(f) or {}
+
+    overrides = policy.setdefault("overrides", {})
+    for component, component_requests in sorted(requests.items()):
+        overrides.setdefault(component, {})["requests"] = component_requests
+
+    with open(policy_file, "w") as f:
+        yaml.safe_dump(policy, f, sort_keys=True)
+    return policy
+
+
+def main(argv: List[str] = None) -> int:
+    parser = argparse.ArgumentParser(description="Write VPA recommendations back as sizing overrides")
+    parser.add_argument("--policy-file", required=True, help="Sizing policy file, set as sizing.policy_file")
+    parser.add_argument("--kubeconfig", help="Kubeconfig path (default: KUBECONFIG or ~/.kube/config)")
+    parser.add_argument("--context", help="Kubeconfig context")
+    parser.add_argument("--margin", type=float, default=0, help="Extra percent added to the recommended target")
+    parser.add_argument("--dry-run", action="store_true", help="Print the overrides without writing them")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(message)s")
+
+    recommendations = read_recommendations(new_api_client(args.kubeconfig, args.context))
+    for recommendation in recommendations:
+        component = component_for(recommendation["namespace"], recommendation["container"]) or "(not sized)"
+        target = ", ".join(f"{key}={value}" for key, value in sorted(recommendation["target"].items()))
+        logging.info(
+            f"{recommendation['namespace']}/{recommendation['workload']}/{recommendation['container']} "
+            f"-> {component}: {target}"
+        )
+
+    requests = recommended_requests(recommendations, args.margin)
+    if not requests:
+        logging.error("No recommendations for sized components, the recommender needs some usage history")
+        return 1
+
+    if args.dry_run:
+        print(yaml.safe_dump({"overrides": {name: {"requests": value} for name, value in requests.items()}}))
+        return 0
+
+    write_overrides(args.policy_file, requests)
+    logging.info(f"Wrote {len(requests)} component overrides to {args.policy_file}")
+    # Stack config overrides win over the policy file
+    logging.info("Remove matching sizing.overrides from the stack config for these to apply")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())